@@ -0,0 +1,12 @@
+from django.conf import settings
+
+from chats.apps.api.v1.prometheus.collectors import ChatsTotalsCollector
+from chats.celery import app
+
+
+@app.task(name="refresh_prometheus_totals")
+def refresh_prometheus_totals():
+    """Compute the chats totals gauges, so the prometheus scrapes do not query the database"""
+    if not settings.USE_PROMETHEUS_METRICS:
+        return
+    ChatsTotalsCollector().refresh()
@@ -35,6 +35,8 @@ class UserSerializer(serializers.ModelSerializer):
         return ""
 
     def get_last_interaction(self, user: User):
+        if hasattr(user, "last_message_on"):
+            return user.last_message_on or ""
         return user.last_interaction
 
 
@@ -0,0 +1,163 @@
+import csv
+import itertools
+import tempfile
+
+import xlsxwriter
+from django.conf import settings
+from django.core.files import File
+from django.db.models import QuerySet
+
+from chats.apps.dashboard.models import DashboardExportJob
+from chats.core.excel_storage import ExcelStorage
+
+
+class Echo:
+    """File-like object that returns what is written, so the csv writer can feed a stream"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(headers: list, rows, delimiter: str = ","):
+    """Yields the csv lines of the rows, preceded by the headers"""
+    writer = csv.writer(Echo(), delimiter=delimiter)
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_csv_dicts(headers: list, rows, delimiter: str = ","):
+    """Yields the csv lines of dict rows, preceded by the headers even when there are no rows"""
+    return stream_csv(
+        headers, ([row[header] for header in headers] for row in rows), delimiter
+    )
+
+
+def iterate_rows(rows):
+    """Rows of a queryset are read from a server side cursor, in chunks"""
+    if isinstance(rows, QuerySet):
+        return rows.iterator(chunk_size=settings.DASHBOARD_EXPORT_CHUNK_SIZE)
+    return iter(rows)
+
+
+def csv_file(lines):
+    """
+    Write the csv lines on a temporary file, rewound for the response to read.
+    The rows are fetched while the view runs, on its thread: under ASGI the
+    streamed responses are consumed in the event loop, where the ORM can not run,
+    so the exports above DASHBOARD_EXPORT_MAX_CSV_ROWS go to an export job instead.
+    """
+    output = tempfile.TemporaryFile()
+    for line in lines:
+        output.write(line.encode())
+    output.seek(0)
+    return output
+
+
+ROOMS_EXPORT_HEADERS = [
+    "Queue Name",
+    "Waiting Time",
+    "Response Time",
+    "Interaction Time",
+    "Open",
+]
+
+
+AGENTS_EXPORT_HEADERS = [
+    "first_name",
+    "email",
+    "agent_status",
+    "closed_rooms",
+    "opened_rooms",
+]
+
+DIVISION_EXPORT_HEADERS = ["name", "waiting_time", "response_time", "interact_time"]
+
+
+def dict_table(headers: list, rows):
+    """Yields the headers, then the values of each dict row under them"""
+    yield headers
+    for row in rows:
+        yield [row[header] for header in headers]
+
+
+def dashboard_export_tables(general_data: dict, agents_data, division_data) -> list:
+    """The tables of the dashboard export: the general data, the agents and the sectors or queues"""
+    return [
+        (list(general_data.keys()), [general_data]),
+        (AGENTS_EXPORT_HEADERS, iterate_rows(agents_data)),
+        (DIVISION_EXPORT_HEADERS, iterate_rows(division_data)),
+    ]
+
+
+def export_job_tables(job) -> tuple:
+    """The tables of the job, as lists of rows starting with the headers, and its total rows"""
+    from chats.apps.api.v1.dashboard.presenter import get_export_data
+    from chats.apps.api.v1.dashboard.serializers import (
+        DashboardRawDataSerializer,
+        dashboard_agents_data,
+        dashboard_division_data,
+        dashboard_general_data,
+    )
+
+    project = job.project
+    filters = dict(job.filters)
+    if job.export_type == job.TYPE_ROOMS:
+        dataset = get_export_data(project, filters)
+        rooms = itertools.chain([ROOMS_EXPORT_HEADERS], iterate_rows(dataset))
+        return [rooms], dataset.count()
+
+    filters["user_request"] = job.user
+    general_dataset = dashboard_general_data(context=filters, project=project)
+    raw_dataset = DashboardRawDataSerializer(instance=project, context=filters)
+    userinfo_dataset = dashboard_agents_data(context=filters, project=project)
+    sector_dataset = dashboard_division_data(context=filters, project=project)
+    tables = dashboard_export_tables(
+        {**general_dataset, **raw_dataset.data}, userinfo_dataset, sector_dataset
+    )
+    return [dict_table(headers, rows) for headers, rows in tables], None
+
+
+def write_export_job(job, output):
+    """
+    Write the xlsx of the job on the output file. The workbook is written in constant
+    memory mode, flushing each row to disk, and the progress is saved every chunk.
+    """
+    tables, total = export_job_tables(job)
+    if total is not None:
+        DashboardExportJob.objects.filter(pk=job.pk).update(total=total)
+
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("dashboard_infos")
+    row_index = 1
+    exported = 0
+    for table in tables:
+        for row_number, row in enumerate(table):
+            worksheet.write_row(row_index, 0, row)
+            row_index += 1
+            if row_number == 0:
+                continue
+            exported += 1
+            if exported % settings.DASHBOARD_EXPORT_CHUNK_SIZE == 0:
+                job.update_progress(exported)
+        row_index += 2
+    workbook.close()
+    job.update_progress(exported)
+    return exported
+
+
+def run_export_job(job):
+    """Export the job to a temporary file and upload it to the excel storage"""
+    with tempfile.TemporaryFile() as output:
+        write_export_job(job, output)
+        output.seek(0)
+        file_name = export_job_storage().save(
+            f"{job.export_type}_{job.pk}.xlsx", File(output)
+        )
+    return file_name
+
+
+def export_job_storage():
+    return ExcelStorage(
+        querystring_auth=True, querystring_expire=settings.DASHBOARD_EXPORT_URL_EXPIRE
+    )
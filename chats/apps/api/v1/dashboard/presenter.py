@@ -1,9 +1,13 @@
 import json
 
 import pendulum
-from django.db.models import Avg, Count, F, Q, Sum
+from django.conf import settings
+from django.db.models import Avg, Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from chats.apps.api.v1.dashboard.queries import DashboardRoomsQuery
+from chats.apps.dashboard.models import RoomMetricsRollup
 from chats.apps.projects.models import ProjectPermission
 from chats.apps.queues.models import Queue
 from chats.apps.rooms.models import Room
@@ -50,121 +54,86 @@ def get_export_data(project, filter):
     return export_data
 
 
-def get_general_data(project, filter):
-    tz = project.timezone
-    initial_datetime = (
-        timezone.now().astimezone(tz).replace(hour=0, minute=0, second=0, microsecond=0)
-    )
-    rooms_filter = {}
-
-    rooms_filter_in_progress_chats = {}
-    rooms_filter_in_progress_chats["user__isnull"] = False
-
-    rooms_filter_waiting_service = {}
-    rooms_filter_waiting_service["user__isnull"] = True
-    rooms_filter_waiting_service["is_active"] = True
-
-    rooms_filter_closed = {}
-    rooms_filter_closed["is_active"] = False
-
-    if filter.get("start_date") and filter.get("end_date"):
-        start_time = pendulum.parse(filter.get("start_date")).replace(tzinfo=tz)
-        end_time = pendulum.parse(filter.get("end_date") + " 23:59:59").replace(
-            tzinfo=tz
-        )
-        rooms_filter["created_on__range"] = [
-            start_time,
-            end_time,  # TODO: USE DATETIME IN END DATE
-        ]
-        rooms_filter_in_progress_chats["created_on__range"] = [
-            start_time,
-            end_time,  # TODO: USE DATETIME IN END DATE
-        ]
-        rooms_filter_waiting_service["created_on__range"] = [
-            start_time,
-            end_time,  # TODO: USE DATETIME IN END DATE
-        ]
-        rooms_filter_closed["ended_at__range"] = [
-            start_time,
-            end_time,  # TODO: USE DATETIME IN END DATE
-        ]
-        rooms_filter_in_progress_chats["is_active"] = False
-    else:
-        rooms_filter["created_on__gte"] = initial_datetime
-        rooms_filter_in_progress_chats["is_active"] = True
-        rooms_filter_closed["ended_at__gte"] = initial_datetime
+def get_rollup_rows(project, filter, start_time, end_time):
+    rollup_filter = {}
+    tag_filter = {}
 
     if filter.get("agent"):
-        rooms_filter["user"] = filter.get("agent")
-        rooms_filter_in_progress_chats["user"] = filter.get("agent")
-        rooms_filter_closed["user"] = filter.get("agent")
+        rollup_filter["user"] = filter.get("agent")
 
     if filter.get("sector"):
-        rooms_filter["queue__sector"] = filter.get("sector")
-        rooms_filter_in_progress_chats["queue__sector"] = filter.get("sector")
-        rooms_filter_waiting_service["queue__sector"] = filter.get("sector")
-        rooms_filter_closed["queue__sector"] = filter.get("sector")
+        rollup_filter["sector"] = filter.get("sector")
         if filter.get("tag"):
-            rooms_filter["tags__name"] = filter.get("tag")
-            rooms_filter_in_progress_chats["tags__name"] = filter.get("tag")
-            rooms_filter_closed["tags__name"] = filter.get("tag")
+            tag_filter["tag__name"] = filter.get("tag")
     else:
-        rooms_filter["queue__sector__project"] = project
-        rooms_filter_in_progress_chats["queue__sector__project"] = project
-        rooms_filter_waiting_service["queue__sector__project"] = project
-        rooms_filter_closed["queue__sector__project"] = project
+        rollup_filter["project"] = project
 
-    data = {}
-    metrics_rooms_count = Room.objects.filter(**rooms_filter).count()
+    return RoomMetricsRollup.objects.dashboard_rows(
+        start_time, end_time, **tag_filter
+    ).filter(**rollup_filter)
 
-    # in_progress
-    active_chats = Room.objects.filter(**rooms_filter_in_progress_chats).count()
 
-    # waiting_service
-    queue_rooms = Room.objects.filter(**rooms_filter_waiting_service).count()
-
-    # closed_rooms
-    closed_rooms = Room.objects.filter(**rooms_filter_closed).count()
-
-    # interaction_time
-    interaction_value = Room.objects.filter(**rooms_filter).aggregate(
-        interaction_time=Sum("metric__interaction_time")
+def get_general_data(project, filter):
+    rooms_query = DashboardRoomsQuery(project, filter, tag_field="name")
+    rooms_filter = (
+        rooms_query.period_filter("created_on")
+        & rooms_query.agent_filter()
+        & rooms_query.tag_filter()
     )
-    if interaction_value and metrics_rooms_count > 0:
-        interaction_time = interaction_value["interaction_time"] / metrics_rooms_count
-    else:
-        interaction_time = 0
-
-    # response_time
-    response_time_value = Room.objects.filter(**rooms_filter).aggregate(
-        message_response_time=Sum("metric__message_response_time")
+    in_progress_filter = (
+        Q(user__isnull=False) & rooms_query.agent_filter() & rooms_query.tag_filter()
     )
-    if response_time_value and metrics_rooms_count > 0:
-        response_time = (
-            response_time_value["message_response_time"] / metrics_rooms_count
-        )
+    if rooms_query.is_live:
+        in_progress_filter &= Q(is_active=True)
     else:
-        response_time = 0
-
-    # waiting_time
-    waiting_time_value = Room.objects.filter(**rooms_filter).aggregate(
-        waiting_time=Sum("metric__waiting_time")
+        in_progress_filter &= Q(is_active=False) & rooms_query.period_filter(
+            "created_on"
+        )
+    waiting_service_filter = Q(
+        user__isnull=True, is_active=True
+    ) & rooms_query.period_filter("created_on", live=False)
+    closed_filter = (
+        Q(is_active=False)
+        & rooms_query.period_filter("ended_at")
+        & rooms_query.agent_filter()
+        & rooms_query.tag_filter()
     )
-    if waiting_time_value and metrics_rooms_count > 0:
-        waiting_time = waiting_time_value["waiting_time"] / metrics_rooms_count
-    else:
-        waiting_time = 0
 
-    data = {
-        "active_chats": active_chats,
-        "queue_rooms": queue_rooms,
-        "closed_rooms": closed_rooms,
-        "interaction_time": interaction_time,
-        "response_time": response_time,
-        "waiting_time": waiting_time,
-    }
+    if settings.USE_DASHBOARD_ROLLUP and not rooms_query.is_live:
+        rollup_rows = get_rollup_rows(
+            project, filter, rooms_query.start_time, rooms_query.end_time
+        )
+        totals = rollup_rows.aggregate(
+            **RoomMetricsRollup.sum_aggregates(),
+            active_chats=Coalesce(Sum("rooms", filter=Q(user__isnull=False)), 0),
+        )
+        averages = RoomMetricsRollup.averages(totals)
+        return {
+            "active_chats": totals["active_chats"],
+            "queue_rooms": rooms_query.rooms().filter(waiting_service_filter).count(),
+            "closed_rooms": totals["rooms"],
+            "interaction_time": averages["interact_time"] or 0,
+            "response_time": averages["response_time"] or 0,
+            "waiting_time": averages["waiting_time"] or 0,
+        }
+
+    metrics = rooms_query.rooms().aggregate(
+        metrics_rooms_count=Count("pk", filter=rooms_filter),
+        active_chats=Count("pk", filter=in_progress_filter),
+        queue_rooms=Count("pk", filter=waiting_service_filter),
+        closed_rooms=Count("pk", filter=closed_filter),
+        interaction_time=Sum("metric__interaction_time", filter=rooms_filter),
+        response_time=Sum("metric__message_response_time", filter=rooms_filter),
+        waiting_time=Sum("metric__waiting_time", filter=rooms_filter),
+    )
+    metrics_rooms_count = metrics.pop("metrics_rooms_count")
+    for time_metric in ("interaction_time", "response_time", "waiting_time"):
+        if metrics[time_metric] and metrics_rooms_count > 0:
+            metrics[time_metric] = metrics[time_metric] / metrics_rooms_count
+        else:
+            metrics[time_metric] = 0
 
-    return data
+    return metrics
 
 
 def get_agents_data(project, filter):
@@ -208,6 +177,23 @@ def get_agents_data(project, filter):
     else:
         rooms_filter["user__rooms__queue__sector__project"] = project
         closed_rooms["user__rooms__queue__sector__project"] = project
+    if settings.USE_DASHBOARD_ROLLUP and filter.get("start_date"):
+        rollup_rooms = (
+            get_rollup_rows(project, filter, start_time, end_time)
+            .filter(user=OuterRef("user"))
+            .order_by()
+            .values("user")
+            .annotate(rooms=Sum("rooms"))
+            .values("rooms")
+        )
+        closed_rooms_count = Coalesce(Subquery(rollup_rooms), 0)
+    else:
+        closed_rooms_count = Count(
+            "user__rooms",
+            filter=Q(**closed_rooms),
+            distinct=True,
+        )
+
     queue_auth = (
         ProjectPermission.objects.filter(**permission_filter)
         .exclude(user__email__icontains="weni")
@@ -218,11 +204,7 @@ def get_agents_data(project, filter):
                 filter=Q(**rooms_filter),
                 distinct=True,
             ),
-            closed_rooms=Count(
-                "user__rooms",
-                filter=Q(**closed_rooms),
-                distinct=True,
-            ),
+            closed_rooms=closed_rooms_count,
         )
     )
 
@@ -264,6 +246,32 @@ def get_sector_data(project, filter):
             start_time,
             end_time,  # TODO: USE DATETIME IN END DATE
         ]
+        if settings.USE_DASHBOARD_ROLLUP:
+            rollup_filter = {
+                "metrics_rollups__hour__gte": start_time,
+                "metrics_rollups__hour__lte": end_time,
+            }
+            if filter.get("sector") and filter.get("tag"):
+                rollup_filter["metrics_rollups__tag__name"] = filter.get("tag")
+            else:
+                rollup_filter["metrics_rollups__tag__isnull"] = True
+            if filter.get("agent"):
+                rollup_filter["metrics_rollups__user"] = filter.get("agent")
+
+            divisions = (
+                model.objects.filter(**model_filter)
+                .values("name")
+                .annotate(
+                    **RoomMetricsRollup.sum_aggregates(
+                        prefix="metrics_rollups__", filter=Q(**rollup_filter)
+                    )
+                )
+            )
+            results = [
+                {"name": division["name"], **RoomMetricsRollup.averages(division)}
+                for division in divisions
+            ]
+            return json.dumps(results)
     else:
         rooms_filter[f"{rooms_filter_prefix}rooms__created_on__gte"] = initial_datetime
     results = (
@@ -0,0 +1,108 @@
+import pendulum
+from django.db.models import Q
+from django.utils import timezone
+
+from chats.apps.projects.models import ProjectPermission
+from chats.apps.rooms.models import Room
+
+
+class DashboardRoomsQuery:
+    """
+    Dashboard params parsed once per request.
+
+    The endpoints compute all their metrics in a single aggregate over the
+    rooms of the project (or sector), each metric with its own conditions
+    built from the methods below, instead of one query per metric.
+    """
+
+    def __init__(
+        self,
+        project,
+        params: dict,
+        user_request=None,
+        tag_field: str = "uuid",
+        permission=None,
+    ):
+        self.project = project
+        tz = project.timezone
+        self.initial_datetime = (
+            timezone.now()
+            .astimezone(tz)
+            .replace(hour=0, minute=0, second=0, microsecond=0)
+        )
+        self.start_time = None
+        self.end_time = None
+        if params.get("start_date") and params.get("end_date"):
+            self.start_time = pendulum.parse(params.get("start_date")).replace(
+                tzinfo=tz
+            )
+            self.end_time = pendulum.parse(
+                params.get("end_date") + " 23:59:59"
+            ).replace(tzinfo=tz)
+
+        self.sector = params.get("sector")
+        self.tag = params.get("tag") if self.sector else None
+        self.queue = params.get("queue") if self.sector else None
+        self.agent = params.get("agent")
+        self.tag_field = tag_field
+
+        self.permission = permission
+        if permission is None and user_request is not None:
+            self.permission = ProjectPermission.objects.select_related("project").get(
+                user=user_request, project=project
+            )
+
+    @property
+    def is_live(self) -> bool:
+        return self.start_time is None
+
+    def cache_params(self) -> dict:
+        """The params that identify the aggregates of this query on the dashboard cache"""
+        scope = "all"
+        if self.permission and not self.permission.is_admin:
+            scope = self.permission.pk
+        return {
+            "scope": scope,
+            "sector": self.sector or "",
+            "tag": self.tag or "",
+            "queue": self.queue or "",
+            "agent": self.agent or "",
+            "start_time": self.start_time or self.initial_datetime,
+            "end_time": self.end_time or "",
+        }
+
+    def rooms(self):
+        """Rooms of the project or sector, limited to the sectors the user manages"""
+        if self.sector:
+            rooms = Room.objects.filter(queue__sector=self.sector)
+        else:
+            rooms = Room.objects.filter(queue__sector__project=self.project)
+        if self.permission:
+            rooms = rooms.filter(queue__sector__in=self.permission.manager_sectors())
+        return rooms
+
+    def period_filter(self, field: str, live: bool = True) -> Q:
+        """
+        Rooms whose date field is in the requested range, or in the current day
+        when there is no range. Pass live=False to not filter the current day.
+        """
+        if not self.is_live:
+            return Q(**{f"{field}__range": [self.start_time, self.end_time]})
+        if live:
+            return Q(**{f"{field}__gte": self.initial_datetime})
+        return Q()
+
+    def agent_filter(self) -> Q:
+        return Q(user=self.agent) if self.agent else Q()
+
+    def queue_filter(self) -> Q:
+        return Q(queue=self.queue) if self.queue else Q()
+
+    def tag_filter(self) -> Q:
+        # a subquery instead of a join, so rooms with many tags are not repeated on the aggregates
+        if not self.tag:
+            return Q()
+        tagged_rooms = Room.objects.filter(
+            **{f"tags__{self.tag_field}": self.tag}
+        ).values("pk")
+        return Q(pk__in=tagged_rooms)
@@ -1,106 +1,130 @@
-import json
-from urllib import parse
-
 import pendulum
 from django.conf import settings
 from django.db.models import Avg, Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django_redis import get_redis_connection
+from django.utils.functional import cached_property
 from rest_framework import serializers
 
 from chats.apps.accounts.models import User
-from chats.apps.dashboard.models import RoomMetrics
+from chats.apps.api.v1.dashboard.exports import export_job_storage
+from chats.apps.api.v1.dashboard.queries import DashboardRoomsQuery
+from chats.apps.dashboard.cache import DashboardCache
+from chats.apps.dashboard.models import (
+    DashboardExportJob,
+    RoomMetrics,
+    RoomMetricsRollup,
+)
 from chats.apps.projects.models import ProjectPermission
 from chats.apps.rooms.models import Room
 
 
 def dashboard_general_data(context: dict, project):
-    DASHBOARD_ROOMS_CACHE_KEY = "dashboard:{filter}:{metric}"
-    redis_connection = get_redis_connection()
-
-    tz = project.timezone
-    initial_datetime = (
-        timezone.now().astimezone(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    """
+    Average times and active chats of the project or sector. With USE_DASHBOARD_ROLLUP
+    the p50/p90/p99 of the times are added, from the sketches of the rooms closed
+    up to the last refresh_dashboard_rollup run.
+    """
+    rooms_query = DashboardRoomsQuery(
+        project,
+        context,
+        context.get("user_request"),
+        permission=context.get("user_permission"),
     )
-    rooms_filter = {}
-    active_chat_filter = {}
-    rooms_filter["user__isnull"] = False
+    if settings.USE_DASHBOARD_ROLLUP and not rooms_query.is_live:
+        return rollup_general_data(
+            context,
+            project,
+            rooms_query.permission,
+            rooms_query.start_time,
+            rooms_query.end_time,
+        )
 
-    user_request = ProjectPermission.objects.get(
-        user=context.get("user_request"), project=project
+    rooms_filter = (
+        Q(user__isnull=False) & rooms_query.agent_filter() & rooms_query.tag_filter()
     )
-    rooms_query = Room.objects
+    if rooms_query.is_live:
+        # live active chats do not use the created on filter, as rooms can be delayed from older
+        active_chats_filter = rooms_filter & Q(is_active=True)
+    else:
+        active_chats_filter = (
+            rooms_filter & Q(is_active=False) & rooms_query.period_filter("created_on")
+        )
+    active_chats_agg = Count("pk", filter=active_chats_filter)
+    rooms_filter &= rooms_query.period_filter("created_on")
 
-    if context.get("start_date") and context.get("end_date"):
-        start_time = pendulum.parse(context.get("start_date")).replace(tzinfo=tz)
-        end_time = pendulum.parse(context.get("end_date") + " 23:59:59").replace(
-            tzinfo=tz
+    live_chats = {}
+
+    def compute_general_time():
+        general_data = rooms_query.rooms().aggregate(
+            interact_time=Avg("metric__interaction_time", filter=rooms_filter),
+            response_time=Avg("metric__message_response_time", filter=rooms_filter),
+            waiting_time=Avg("metric__waiting_time", filter=rooms_filter),
+            active_chats=active_chats_agg,
         )
+        live_chats["active_chats"] = general_data.pop("active_chats")
+        if settings.USE_DASHBOARD_ROLLUP:
+            # the sketches are kept on the rollup, the percentiles are left out without it
+            general_data.update(
+                dashboard_rollup_rows(
+                    context,
+                    project,
+                    rooms_query.permission,
+                    rooms_query.start_time or rooms_query.initial_datetime,
+                    rooms_query.end_time or timezone.now(),
+                )
+                .filter(user__isnull=False)
+                .percentiles()
+            )
+        return general_data
 
-        rooms_filter["created_on__range"] = [
-            start_time,
-            end_time,  # TODO: USE DATETIME IN END DATE
-        ]
-        active_chat_filter["is_active"] = False
-        active_chat_filter["user__isnull"] = False
+    if settings.USE_DASHBOARD_CACHE:
+        general_data = DashboardCache().get_or_compute(
+            "general_time",
+            {**rooms_query.cache_params(), "rollup": settings.USE_DASHBOARD_ROLLUP},
+            compute_general_time,
+            project.pk,
+            rooms_query.sector,
+        )
     else:
-        rooms_filter["created_on__gte"] = initial_datetime
-        # live active_chat_filter does not use the created on filter, as rooms can be delayed from older
-        active_chat_filter["user__isnull"] = False
-        active_chat_filter["is_active"] = True
+        general_data = compute_general_time()
+    if not live_chats:
+        live_chats = rooms_query.rooms().aggregate(active_chats=active_chats_agg)
+    general_data.update(live_chats)
+    return general_data
+
 
+def dashboard_rollup_rows(context, project, user_request, start_time, end_time):
+    """Rollup rows of the period, filtered by the same params of the dashboard endpoints"""
+    rollup_filter = {}
     if context.get("agent"):
-        rooms_filter["user"] = context.get("agent")
+        rollup_filter["user"] = context.get("agent")
 
+    tag_filter = {}
     if context.get("sector"):
-        rooms_filter["queue__sector"] = context.get("sector")
-        # rooms_query = Room.objects
+        rollup_filter["sector"] = context.get("sector")
         if context.get("tag"):
-            rooms_filter["tags__uuid"] = context.get("tag")
+            tag_filter["tag"] = context.get("tag")
     else:
-        rooms_filter["queue__sector__project"] = project
+        rollup_filter["project"] = project
 
-    if user_request:
-        rooms_query = rooms_query.filter(
-            queue__sector__in=user_request.manager_sectors()
-        )
-
-    interact_time_agg = Avg("metric__interaction_time")
-    message_response_time_agg = Avg("metric__message_response_time")
-    waiting_time_agg = Avg("metric__waiting_time")
-
-    rooms_filter_general_time_key = DASHBOARD_ROOMS_CACHE_KEY.format(
-        filter=parse.urlencode(rooms_filter), metric="general_time"
+    rollup_query = RoomMetricsRollup.objects.dashboard_rows(
+        start_time, end_time, **tag_filter
     )
-    redis_general_time_value = redis_connection.get(rooms_filter_general_time_key)
-
-    if redis_general_time_value:
-        if rooms_filter.get("created_on__gte"):
-            rooms_filter.pop("created_on__gte")
-        rooms_filter.update(active_chat_filter)
-        active_chats_count = rooms_query.filter(**rooms_filter).count()
-        # Maybe separate the active_chats_agg count into a subquery
-        general_data = json.loads(redis_general_time_value)
-        general_data["active_chats"] = active_chats_count
-        return general_data
+    if user_request:
+        rollup_query = rollup_query.filter(sector__in=user_request.manager_sectors())
+    return rollup_query.filter(**rollup_filter)
 
-    general_data = rooms_query.filter(**rooms_filter).aggregate(
-        interact_time=interact_time_agg,
-        response_time=message_response_time_agg,
-        waiting_time=waiting_time_agg,
-    )
 
-    redis_connection.set(
-        rooms_filter_general_time_key,
-        json.dumps(general_data),
-        settings.CHATS_CACHE_TIME,
+def rollup_general_data(context, project, user_request, start_time, end_time):
+    totals, percentiles = (
+        dashboard_rollup_rows(context, project, user_request, start_time, end_time)
+        .filter(user__isnull=False)
+        .summary()
     )
-    if rooms_filter.get("created_on__gte"):
-        rooms_filter.pop("created_on__gte")
-    rooms_filter.update(active_chat_filter)
-    active_chats_count = rooms_query.filter(**rooms_filter).count()
-    # Maybe separate the active_chats_agg count into a subquery
-    general_data["active_chats"] = active_chats_count
+    general_data = RoomMetricsRollup.averages(totals)
+    general_data.update(percentiles)
+    general_data["active_chats"] = totals["rooms"]
     return general_data
 
 
@@ -122,6 +146,9 @@ def dashboard_agents_data(context, project):
             tzinfo=tz
         )
 
+        if settings.USE_DASHBOARD_ROLLUP:
+            return rollup_agents_data(context, project, start_time, end_time)
+
         rooms_filter["rooms__created_on__range"] = [start_time, end_time]
         rooms_filter["rooms__is_active"] = False
         closed_rooms["rooms__ended_at__range"] = [start_time, end_time]
@@ -139,6 +166,19 @@ def dashboard_agents_data(context, project):
         if context.get("tag"):
             rooms_filter["rooms__tags__uuid"] = context.get("tag")
 
+    agents_query = (
+        project_agents_query(context, project)
+        .annotate(
+            closed_rooms=Count("rooms", filter=Q(**closed_rooms, **rooms_filter)),
+            opened_rooms=Count("rooms", filter=Q(**opened_rooms, **rooms_filter)),
+        )
+        .values("first_name", "email", "agent_status", "closed_rooms", "opened_rooms")
+    )
+
+    return agents_query
+
+
+def project_agents_query(context, project):
     project_permission_subquery = ProjectPermission.objects.filter(
         project_id=project,
         user_id=OuterRef("email"),
@@ -148,18 +188,30 @@ def dashboard_agents_data(context, project):
     if not context.get("is_weni_admin"):
         agents_query = agents_query.exclude(email__endswith="weni.ai")
 
-    agents_query = (
-        agents_query.filter(project_permissions__project=project, is_active=True)
+    return agents_query.filter(
+        project_permissions__project=project, is_active=True
+    ).annotate(agent_status=Subquery(project_permission_subquery))
+
+
+def rollup_agents_data(context, project, start_time, end_time):
+    rooms_subquery = (
+        dashboard_rollup_rows(context, project, None, start_time, end_time)
+        .filter(user=OuterRef("email"))
+        .order_by()
+        .values("user")
+        .annotate(rooms=Sum("rooms"))
+        .values("rooms")
+    )
+    return (
+        project_agents_query(context, project)
         .annotate(
-            agent_status=Subquery(project_permission_subquery),
-            closed_rooms=Count("rooms", filter=Q(**closed_rooms, **rooms_filter)),
-            opened_rooms=Count("rooms", filter=Q(**opened_rooms, **rooms_filter)),
+            opened_rooms=Coalesce(Subquery(rooms_subquery), 0),
+            # the rollup does not know when the rooms ended, see RoomMetricsRollup
+            closed_rooms=F("opened_rooms"),
         )
         .values("first_name", "email", "agent_status", "closed_rooms", "opened_rooms")
     )
 
-    return agents_query
-
 
 # Maybe separate each serializer in it's own serializer module/file
 
@@ -172,9 +224,11 @@ def dashboard_division_data(context, project=None):
     rooms_filter = {}
     division_level = "room__queue__sector"
 
-    user_request = ProjectPermission.objects.get(
-        user=context.get("user_request"), project=project
-    )
+    user_request = context.get("user_permission")
+    if user_request is None:
+        user_request = ProjectPermission.objects.select_related("project").get(
+            user=context.get("user_request"), project=project
+        )
     room_metric_query = RoomMetrics.objects
 
     if context.get("sector"):
@@ -194,6 +248,10 @@ def dashboard_division_data(context, project=None):
         end_time = pendulum.parse(context.get("end_date") + " 23:59:59").replace(
             tzinfo=tz
         )
+        if settings.USE_DASHBOARD_ROLLUP:
+            return rollup_division_data(
+                context, project, user_request, start_time, end_time
+            )
         rooms_filter["created_on__range"] = [start_time, end_time]
     else:
         rooms_filter["created_on__gte"] = initial_datetime
@@ -216,6 +274,23 @@ def dashboard_division_data(context, project=None):
     )
 
 
+def rollup_division_data(context, project, user_request, start_time, end_time):
+    division_level = "queue" if context.get("sector") else "sector"
+    divisions = (
+        dashboard_rollup_rows(context, project, user_request, start_time, end_time)
+        .filter(user__isnull=False)
+        .order_by()
+        .values(f"{division_level}__uuid")
+        .annotate(
+            name=F(f"{division_level}__name"), **RoomMetricsRollup.sum_aggregates()
+        )
+    )
+    return [
+        {"name": division["name"], **RoomMetricsRollup.averages(division)}
+        for division in divisions
+    ]
+
+
 class DashboardRawDataSerializer(serializers.ModelSerializer):
     closed_rooms = serializers.SerializerMethodField()
     transfer_count = serializers.SerializerMethodField()
@@ -225,135 +300,74 @@ class DashboardRawDataSerializer(serializers.ModelSerializer):
         model = Room
         fields = ["closed_rooms", "transfer_count", "queue_rooms"]
 
-    def get_closed_rooms(self, project):
-        tz = project.timezone
-        initial_datetime = (
-            timezone.now()
-            .astimezone(tz)
-            .replace(hour=0, minute=0, second=0, microsecond=0)
+    @cached_property
+    def raw_data(self) -> dict:
+        rooms_query = DashboardRoomsQuery(
+            self.instance,
+            self.context,
+            self.context.get("user_request"),
+            permission=self.context.get("user_permission"),
         )
-
-        user_request = ProjectPermission.objects.get(
-            user=self.context.get("user_request"), project=project
+        return rooms_query.rooms().aggregate(
+            closed_rooms=Count(
+                "pk",
+                filter=Q(is_active=False)
+                & rooms_query.period_filter("ended_at")
+                & rooms_query.tag_filter()
+                & rooms_query.queue_filter()
+                & rooms_query.agent_filter(),
+            ),
+            transfer_count=Sum(
+                "metric__transfer_count",
+                filter=rooms_query.period_filter("created_on")
+                & rooms_query.tag_filter(),
+            ),
+            queue_rooms=Count(
+                "pk",
+                filter=Q(user__isnull=True, is_active=True)
+                & rooms_query.period_filter("created_on", live=False),
+            ),
         )
-        rooms_query = Room.objects
-
-        rooms_filter = {}
-        rooms_filter["is_active"] = False
 
-        if self.context.get("start_date") and self.context.get("end_date"):
-            start_time = pendulum.parse(self.context.get("start_date")).replace(
-                tzinfo=tz
-            )
-            end_time = pendulum.parse(
-                self.context.get("end_date") + " 23:59:59"
-            ).replace(tzinfo=tz)
-            rooms_filter["ended_at__range"] = [start_time, end_time]
-        else:
-            rooms_filter["ended_at__gte"] = initial_datetime
-
-        if self.context.get("sector"):
-            rooms_filter["queue__sector"] = self.context.get("sector")
-            if self.context.get("tag"):
-                rooms_filter["tags__uuid"] = self.context.get("tag")
-            if self.context.get("queue"):
-                rooms_filter["queue"] = self.context.get("queue")
-        else:
-            rooms_filter["queue__sector__project"] = project
-
-        if self.context.get("agent"):
-            rooms_filter["user"] = self.context.get("agent")
-
-        if user_request:
-            rooms_query = rooms_query.filter(
-                queue__sector__in=user_request.manager_sectors()
-            )
-
-        closed_rooms = rooms_query.filter(**rooms_filter).count()
-
-        return closed_rooms
+    def get_closed_rooms(self, project):
+        return self.raw_data["closed_rooms"]
 
     def get_transfer_count(self, project):
-        tz = project.timezone
-
-        tz = project.timezone
-        initial_datetime = (
-            timezone.now()
-            .astimezone(tz)
-            .replace(hour=0, minute=0, second=0, microsecond=0)
-        )
-        rooms_filter = {}
-
-        user_request = ProjectPermission.objects.get(
-            user=self.context.get("user_request"), project=project
-        )
-        rooms_query = Room.objects
-
-        if self.context.get("start_date") and self.context.get("end_date"):
-            start_time = pendulum.parse(self.context.get("start_date")).replace(
-                tzinfo=tz
-            )
-            end_time = pendulum.parse(
-                self.context.get("end_date") + " 23:59:59"
-            ).replace(tzinfo=tz)
-            rooms_filter["created_on__range"] = [
-                start_time,
-                end_time,
-            ]
-        else:
-            rooms_filter["created_on__gte"] = initial_datetime
-
-        if self.context.get("sector"):
-            rooms_filter["queue__sector"] = self.context.get("sector")
-            if self.context.get("tag"):
-                rooms_filter["tags__uuid"] = self.context.get("tag")
-        else:
-            rooms_filter["queue__sector__project"] = project
-
-        if user_request:
-            rooms_query = rooms_query.filter(
-                queue__sector__in=user_request.manager_sectors()
-            )
-
-        transfer_metric = rooms_query.filter(**rooms_filter).aggregate(
-            count=Sum("metric__transfer_count")
-        )
-
-        return transfer_metric["count"]
+        return self.raw_data["transfer_count"]
 
     def get_queue_rooms(self, project):
-        tz = project.timezone
-        rooms_filter = {}
-        rooms_filter["user__isnull"] = True
-        rooms_filter["is_active"] = True
+        return self.raw_data["queue_rooms"]
 
-        user_request = ProjectPermission.objects.get(
-            user=self.context.get("user_request"), project=project
-        )
-        rooms_query = Room.objects
 
-        if self.context.get("start_date") and self.context.get("end_date"):
-            start_time = pendulum.parse(self.context.get("start_date")).replace(
-                tzinfo=tz
-            )
-            end_time = pendulum.parse(
-                self.context.get("end_date") + " 23:59:59"
-            ).replace(tzinfo=tz)
-            rooms_filter["created_on__range"] = [
-                start_time,
-                end_time,
-            ]
-
-        if self.context.get("sector"):
-            rooms_filter["queue__sector"] = self.context.get("sector")
-        else:
-            rooms_filter["queue__sector__project"] = project
-
-        if user_request:
-            rooms_query = rooms_query.filter(
-                queue__sector__in=user_request.manager_sectors()
-            )
+class DashboardExportJobSerializer(serializers.ModelSerializer):
+    filter_fields = ["start_date", "end_date", "sector", "tag", "agent", "queue"]
 
-        queue_rooms_metric = rooms_query.filter(**rooms_filter).count()
+    url = serializers.SerializerMethodField()
 
-        return queue_rooms_metric
+    class Meta:
+        model = DashboardExportJob
+        fields = [
+            "uuid",
+            "export_type",
+            "filters",
+            "status",
+            "progress",
+            "total",
+            "created_on",
+            "url",
+        ]
+        read_only_fields = ["status", "progress", "total"]
+
+    def validate_filters(self, filters):
+        if not isinstance(filters, dict):
+            raise serializers.ValidationError("Filters must be an object")
+        return {
+            field: str(filters[field])
+            for field in self.filter_fields
+            if filters.get(field)
+        }
+
+    def get_url(self, job):
+        if job.status != DashboardExportJob.STATUS_DONE or not job.file_name:
+            return None
+        return export_job_storage().url(job.file_name)
@@ -1,22 +1,31 @@
-import io
-import json
+import itertools
 
-import pandas
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import FileResponse
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
+from chats.apps.api.v1.dashboard.exports import (
+    ROOMS_EXPORT_HEADERS,
+    csv_file,
+    dashboard_export_tables,
+    iterate_rows,
+    stream_csv,
+    stream_csv_dicts,
+)
 from chats.apps.api.v1.dashboard.presenter import get_export_data
 from chats.apps.api.v1.dashboard.serializers import (
+    DashboardExportJobSerializer,
     DashboardRawDataSerializer,
     dashboard_agents_data,
     dashboard_division_data,
     dashboard_general_data,
 )
 from chats.apps.api.v1.permissions import HasDashboardAccess
+from chats.apps.dashboard.models import DashboardExportJob
 from chats.apps.projects.models import Project
-from chats.core.excel_storage import ExcelStorage
 
 
 class DashboardLiveViewset(viewsets.GenericViewSet):
@@ -33,10 +42,15 @@ class DashboardLiveViewset(viewsets.GenericViewSet):
         url_name="general",
     )
     def general(self, request, *args, **kwargs):
-        """General metrics for the project or the sector"""
+        """
+        General metrics for the project or the sector. The time percentiles
+        (waiting_time_p50, ...) are only returned with USE_DASHBOARD_ROLLUP and
+        lag the closed rooms by up to DASHBOARD_ROLLUP_REFRESH_INTERVAL.
+        """
         project = self.get_object()
         context = request.query_params.dict()
         context["user_request"] = request.user
+        context["user_permission"] = self.dashboard_permission
         serialized_data = dashboard_general_data(
             project=project,
             context=context,
@@ -73,6 +87,7 @@ class DashboardLiveViewset(viewsets.GenericViewSet):
         project = self.get_object()
         context = request.query_params.dict()
         context["user_request"] = request.user
+        context["user_permission"] = self.dashboard_permission
         serialized_data = dashboard_division_data(
             project=project,
             context=context,
@@ -90,6 +105,7 @@ class DashboardLiveViewset(viewsets.GenericViewSet):
         project = self.get_object()
         context = request.query_params.dict()
         context["user_request"] = request.user
+        context["user_permission"] = self.dashboard_permission
         serialized_data = self.get_serializer(
             instance=project,
             context=context,
@@ -104,58 +120,23 @@ class DashboardLiveViewset(viewsets.GenericViewSet):
     def export(self, request, *args, **kwargs):
         """
         Can return data to be export in csv on project and sector level (list of sector or list of queues)
+        The xls export, or above DASHBOARD_EXPORT_MAX_CSV_ROWS rooms, the export job
+        that writes them is returned instead
         """
         project = self.get_object()
         filter = request.query_params
         dataset = get_export_data(project, filter)
-        data_frame_rooms = pandas.DataFrame(dataset)
 
         filename = "dashboard_rooms_export_data"
 
-        if "xls" in filter:
-            excel_rooms_buffer = io.BytesIO()
-            with pandas.ExcelWriter(excel_rooms_buffer, engine="xlsxwriter") as writer:
-                data_frame_rooms.to_excel(
-                    writer,
-                    sheet_name="rooms_infos",
-                    startrow=1,
-                    startcol=0,
-                    index=False,
-                )
-            excel_rooms_buffer.seek(0)  # Move o cursor para o início do buffer
-            storage = ExcelStorage()
-
-            bytes_archive = excel_rooms_buffer.getvalue()
-
-            with storage.open(filename + ".xlsx", "wb") as up_file:
-                up_file.write(bytes_archive)
-                file_url = storage.url(up_file.name)
-
-            data = {"path_file": file_url}
-
-            return HttpResponse(
-                json.dumps(data),
-                content_type="application/javascript; charset=utf8",
-            )
-        else:
-            response = HttpResponse(content_type="text/csv")
-            response["Content-Disposition"] = (
-                'attachment; filename="' + filename + ".csv"
-            )
-
-            table = pandas.DataFrame(dataset)
-            table.rename(
-                columns={
-                    0: "Queue Name",
-                    1: "Waiting Time",
-                    2: "Response Time",
-                    3: "Interaction Time",
-                    4: "Open",
-                },
-                inplace=True,
-            )
-            table.to_csv(response, encoding="utf-8", index=False)
-            return response
+        if "xls" in filter or dataset.count() > settings.DASHBOARD_EXPORT_MAX_CSV_ROWS:
+            return self.start_export_job(project, DashboardExportJob.TYPE_ROOMS, filter)
+        return FileResponse(
+            csv_file(stream_csv(ROOMS_EXPORT_HEADERS, iterate_rows(dataset))),
+            as_attachment=True,
+            filename=filename + ".csv",
+            content_type="text/csv",
+        )
 
     @action(
         detail=True,
@@ -164,11 +145,18 @@ class DashboardLiveViewset(viewsets.GenericViewSet):
     )
     def export_dashboard(self, request, *args, **kwargs):
         """
-        Can return data from dashboard to be export in csv/xls on project
-        and sector level (list of sector, list of queues and list of agents online)
+        Can return data from dashboard to be export in csv on project
+        and sector level (list of sector, list of queues and list of agents online).
+        The xls export is written by an export job, which is returned instead
         """
         project = self.get_object()
-        filter = request.query_params
+        if "xls" in request.query_params:
+            return self.start_export_job(
+                project, DashboardExportJob.TYPE_DASHBOARD, request.query_params
+            )
+        filter = request.query_params.dict()
+        filter["user_request"] = request.user
+        filter["user_permission"] = self.dashboard_permission
 
         user_info_context = {}
         user_info_context["filters"] = request.query_params
@@ -185,58 +173,74 @@ class DashboardLiveViewset(viewsets.GenericViewSet):
 
         filename = "dashboard_export_data"
 
-        data_frame = pandas.DataFrame([combined_dataset])
-        data_frame_1 = pandas.DataFrame(userinfo_dataset)
-        data_frame_2 = pandas.DataFrame(sector_dataset)
-
-        if "xls" in filter:
-            excel_buffer = io.BytesIO()
-            with pandas.ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
-                data_frame.to_excel(
-                    writer,
-                    sheet_name="dashboard_infos",
-                    startrow=1,
-                    startcol=0,
-                    index=False,
-                )
-                data_frame_1.to_excel(
-                    writer,
-                    sheet_name="dashboard_infos",
-                    startrow=4 + len(data_frame.index),
-                    startcol=0,
-                    index=False,
-                )
-                data_frame_2.to_excel(
-                    writer,
-                    sheet_name="dashboard_infos",
-                    startrow=8 + len(data_frame_1.index),
-                    startcol=0,
-                    index=False,
-                )
-            excel_buffer.seek(0)  # Move o cursor para o início do buffer
-            storage = ExcelStorage()
-
-            bytes_archive = excel_buffer.getvalue()
-
-            with storage.open(filename + ".xlsx", "wb") as up_file:
-                up_file.write(bytes_archive)
-                file_url = storage.url(up_file.name)
-
-            data = {"path_file": file_url}
-
-            return HttpResponse(
-                json.dumps(data),
-                content_type="application/javascript; charset=utf8",
-            )
+        tables = dashboard_export_tables(
+            combined_dataset, userinfo_dataset, sector_dataset
+        )
+        lines = itertools.chain.from_iterable(
+            stream_csv_dicts(headers, rows, delimiter=";") for headers, rows in tables
+        )
+        return FileResponse(
+            csv_file(lines),
+            as_attachment=True,
+            filename=filename + ".csv",
+            content_type="text/csv",
+        )
 
-        else:
-            response = HttpResponse(content_type="text/csv")
-            response["Content-Disposition"] = (
-                'attachment; filename="' + filename + ".csv"
-            )
+    @action(
+        detail=True,
+        methods=["POST"],
+        url_name="export_jobs",
+        url_path="export_jobs",
+        serializer_class=DashboardExportJobSerializer,
+    )
+    def create_export_job(self, request, *args, **kwargs):
+        """
+        Start a background xlsx export of the rooms or of the dashboard.
+        The same export requested again within a few minutes returns the existing job.
+        """
+        project = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job, created = DashboardExportJob.request(
+            project=project,
+            user=request.user,
+            export_type=serializer.validated_data.get(
+                "export_type", DashboardExportJob.TYPE_ROOMS
+            ),
+            filters=serializer.validated_data.get("filters", {}),
+        )
+        return Response(
+            self.get_serializer(job).data,
+            status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
-            data_frame.to_csv(response, index=False, sep=";")
-            data_frame_1.to_csv(response, index=False, mode="a", sep=";")
-            data_frame_2.to_csv(response, index=False, mode="a", sep=";")
+    def start_export_job(self, project, export_type: str, filters):
+        """Answer an export too large for the request with the export job that writes it"""
+        serializer = DashboardExportJobSerializer(
+            data={"export_type": export_type, "filters": dict(filters.items())}
+        )
+        serializer.is_valid(raise_exception=True)
+        job, _ = DashboardExportJob.request(
+            project=project,
+            user=self.request.user,
+            export_type=export_type,
+            filters=serializer.validated_data["filters"],
+        )
+        return Response(
+            DashboardExportJobSerializer(job).data, status.HTTP_202_ACCEPTED
+        )
 
-            return response
+    @action(
+        detail=True,
+        methods=["GET"],
+        url_name="export_job",
+        url_path=r"export_jobs/(?P<job_uuid>[^/.]+)",
+        serializer_class=DashboardExportJobSerializer,
+    )
+    def export_job(self, request, job_uuid=None, *args, **kwargs):
+        """Status and progress of an export job, with the file url once it is done"""
+        project = self.get_object()
+        job = get_object_or_404(
+            DashboardExportJob, uuid=job_uuid, project=project, user=request.user
+        )
+        return Response(self.get_serializer(job).data, status.HTTP_200_OK)
@@ -70,7 +70,7 @@ def get_room_user(
 
     # Online user on the queue
     if not user:
-        return queue.available_agents.first() or None
+        return queue.get_available_agent()
     permission = project.permissions.filter(user=user, status="ONLINE").exists()
 
     return user if permission else None
@@ -1,7 +1,6 @@
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db import IntegrityError
-from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -11,9 +10,9 @@ from chats.apps.accounts.authentication.drf.authorization import (
 )
 from chats.apps.api.v1.external.permissions import IsAdminPermission
 from chats.apps.api.v1.external.rooms.serializers import RoomFlowSerializer
-from chats.apps.dashboard.models import RoomMetrics
 from chats.apps.rooms.models import Room
 from chats.apps.rooms.views import (
+    assign_queued_room,
     close_room,
     create_room_feedback_message,
     create_transfer_json,
@@ -172,27 +171,7 @@ class RoomUserExternalViewSet(viewsets.ViewSet):
                 },
                 status.HTTP_404_NOT_FOUND,
             )
-        modified_on = room.modified_on
-        room.user = agent_permission.user
-
-        feedback = create_transfer_json(
-            action="forward",
-            from_="",
-            to=room.user,
-        )
-        room.transfer_history = feedback
-        room.save()
-
-        room.notify_user("update", user=None)
-        room.notify_queue("update")
-
-        create_room_feedback_message(room, feedback, method="rt")
-
-        time = timezone.now() - modified_on
-        room_metric = RoomMetrics.objects.get_or_create(room=room)[0]
-        room_metric.waiting_time += time.total_seconds()
-        room_metric.queued_count += 1
-        room_metric.save()
+        assign_queued_room(room, agent_permission.user)
 
         return Response(
             {"Detail": f"Agent {agent} successfully attributed to the ticket {pk}"},
@@ -273,6 +273,8 @@ class HasDashboardAccess(permissions.BasePermission):
                 project_permission.role == 1
                 or project_permission.sector_authorizations.exists()
             ):
+                # reused by the dashboard queries, which scope the rooms by it
+                view.dashboard_permission = project_permission
                 return True
         except ProjectPermission.DoesNotExist:
             return False
@@ -0,0 +1,32 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from chats.core.profiling import list_profiles, read_profile
+
+
+class ProfileListView(APIView):
+    """The newest stored request and consumer profiles, for the staff users"""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 100)), 1000))
+        except ValueError:
+            limit = 100
+        return Response({"results": list_profiles(limit=limit)})
+
+
+class ProfileDetailView(APIView):
+    """A stored profile, its metadata and its collapsed stacks"""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, name: str, *args, **kwargs):
+        try:
+            return Response(read_profile(name))
+        except FileNotFoundError:
+            return Response(
+                {"detail": "Profile not found"}, status=status.HTTP_404_NOT_FOUND
+            )
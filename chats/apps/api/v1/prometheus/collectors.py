@@ -0,0 +1,273 @@
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils import timezone
+from prometheus_client.core import GaugeMetricFamily
+
+WINDOWS = {
+    "last_month": relativedelta(months=-1),
+    "last_3_months": relativedelta(months=-3),
+    "last_6_months": relativedelta(months=-6),
+    "last_year": relativedelta(years=-1),
+}
+
+# (name, documentation, label name, label value, totals key)
+GAUGES = [
+    (
+        "chats_total_contacts",
+        "The number of contacts created in chats",
+        "total_contacts",
+        "total_contacts",
+        "contacts",
+    ),
+    (
+        "chats_online_contacts",
+        "The number of contacts online",
+        "online_contact",
+        "online_contacts",
+        "contacts_online",
+    ),
+    (
+        "chats_offline_contacts",
+        "The number of contacts offline",
+        "offline_contact",
+        "offline_contacts",
+        "contacts_offline",
+    ),
+    (
+        "chats_total_contacts_last_month",
+        "The number of contacts created last month in chats",
+        "total_contacts_last_month",
+        "total_contacts_last_month",
+        "contacts_last_month",
+    ),
+    (
+        "chats_total_contacts_last_3_months",
+        "The number of contacts created last 3 months in chats",
+        "total_contacts_last_3_month",
+        "total_contacts_last_3_month",
+        "contacts_last_3_months",
+    ),
+    (
+        "chats_total_contacts_last_6_months",
+        "The number of contacts created last 6 months in chats",
+        "total_contacts_last_6_months",
+        "total_contacts_last_6_months",
+        "contacts_last_6_months",
+    ),
+    (
+        "chats_total_contacts_last_1_year",
+        "The number of contacts created last year in chats",
+        "total_contacts_last_1_year",
+        "total_contacts_last_1_year",
+        "contacts_last_year",
+    ),
+    (
+        "chats_total_rooms",
+        "The number of rooms created in chats",
+        "total_rooms",
+        "total_rooms",
+        "rooms",
+    ),
+    (
+        "chats_opened_rooms",
+        "The number of rooms opened in chats",
+        "opened_rooms",
+        "opened_rooms",
+        "rooms_opened",
+    ),
+    (
+        "chats_closed_rooms",
+        "The number of rooms closed in chats",
+        "closed_rooms",
+        "closed_rooms",
+        "rooms_closed",
+    ),
+    (
+        "chats_total_rooms_last_month",
+        "The number of rooms created last month in chats",
+        "total_rooms_last_month",
+        "total_rooms_last_month",
+        "rooms_last_month",
+    ),
+    (
+        "chats_total_rooms_last_3_months",
+        "The number of rooms created last 3 months in chats",
+        "total_rooms_last_3_months",
+        "total_rooms_last_3_months",
+        "rooms_last_3_months",
+    ),
+    (
+        "chats_total_rooms_last_6_months",
+        "The number of rooms created last 6 months in chats",
+        "total_rooms_last_6_months",
+        "total_rooms_last_6_months",
+        "rooms_last_6_months",
+    ),
+    (
+        "chats_total_rooms_last_year",
+        "The number of rooms created last year in chats",
+        "total_rooms_last_year",
+        "total_rooms_last_year",
+        "rooms_last_year",
+    ),
+    (
+        "chats_total_message",
+        "The number of messages created in chats",
+        "total_message",
+        "total_message",
+        "msgs",
+    ),
+    (
+        "chats_total_msgs_last_month",
+        "The number of msgs created last month in chats",
+        "total_msgs_last_month",
+        "total_msgs_last_month",
+        "msgs_last_month",
+    ),
+    (
+        "chats_total_msgs_last_3_months",
+        "The number of msgs created last 3 months in chats",
+        "total_msgs_last_3_months",
+        "total_msgs_last_3_months",
+        "msgs_last_3_months",
+    ),
+    (
+        "chats_total_msgs_last_6_months",
+        "The number of msgs created last 6 months in chats",
+        "total_msgs_last_6_months",
+        "total_msgs_last_6_months",
+        "msgs_last_6_months",
+    ),
+    (
+        "chats_total_msgs_last_year",
+        "The number of msgs created last year in chats",
+        "total_msgs_last_year",
+        "total_msgs_last_year",
+        "msgs_last_year",
+    ),
+    (
+        "chats_total_agents",
+        "The number of agents created in chats",
+        "total_agents",
+        "total_agents",
+        "agents",
+    ),
+    (
+        "chats_total_agents_last_month",
+        "The number of agents created last month in chats",
+        "total_msgs_last_month",
+        "total_agents_last_month",
+        "agents_last_month",
+    ),
+    (
+        "chats_total_agents_last_3_months",
+        "The number of agents created last 3 months in chats",
+        "total_msgs_last_3_months",
+        "total_agents_last_3_months",
+        "agents_last_3_months",
+    ),
+    (
+        "chats_total_agents_last_6_months",
+        "The number of agents created last 6 months in chats",
+        "total_msgs_last_6_months",
+        "total_agents_last_6_months",
+        "agents_last_6_months",
+    ),
+    (
+        "chats_total_agents_last_year",
+        "The number of agents created last year in chats",
+        "total_msgs_last_year",
+        "total_agents_last_year",
+        "agents_last_year",
+    ),
+]
+
+
+def estimated_count(model) -> int:
+    """
+    Rows of the model table from the postgres planner statistics,
+    which does not scan the table. Falls back to a count elsewhere.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+    return model.objects.count()
+
+
+def window_counts(queryset, prefix: str) -> dict:
+    """Rows created on each rolling window, counted on a single range scan"""
+    now = timezone.now()
+    starts = {window: now + delta for window, delta in WINDOWS.items()}
+    return queryset.filter(created_on__gte=min(starts.values())).aggregate(
+        **{
+            f"{prefix}_{window}": Count("pk", filter=Q(created_on__gte=start))
+            for window, start in starts.items()
+        }
+    )
+
+
+class ChatsTotalsCollector:
+    """
+    Chats totals, computed by the refresh_prometheus_totals beat task instead of
+    on every save or scrape. The scrapes only read the values the task stored
+    on the shared cache, the table totals are postgres estimates.
+    """
+
+    cache_key = "prometheus:chats_totals"
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        totals = cache.get(self.cache_key)
+        if totals is None:
+            # not refreshed yet, or the beat stopped and the values expired
+            return
+
+        for name, documentation, label_name, label_value, key in GAUGES:
+            gauge = GaugeMetricFamily(name, documentation, labels=[label_name])
+            gauge.add_metric([label_value], totals[key])
+            yield gauge
+
+    def refresh(self) -> dict:
+        """Compute the totals and store them until three refresh intervals have passed"""
+        totals = self.totals()
+        cache.set(
+            self.cache_key, totals, settings.PROMETHEUS_TOTALS_REFRESH_INTERVAL * 3
+        )
+        return totals
+
+    def totals(self) -> dict:
+        from chats.apps.contacts.models import Contact
+        from chats.apps.msgs.models import Message
+        from chats.apps.queues.models import QueueAuthorization
+        from chats.apps.rooms.models import Room
+
+        totals = {
+            "contacts": estimated_count(Contact),
+            "rooms": estimated_count(Room),
+            "msgs": estimated_count(Message),
+            "agents": estimated_count(QueueAuthorization),
+        }
+        totals.update(
+            Contact.objects.aggregate(
+                contacts_online=Count("pk", filter=Q(status="online")),
+                contacts_offline=Count("pk", filter=Q(status="offline")),
+            )
+        )
+        totals["rooms_opened"] = Room.objects.filter(ended_at__isnull=True).count()
+        totals["rooms_closed"] = max(totals["rooms"] - totals["rooms_opened"], 0)
+        totals.update(window_counts(Contact.objects.all(), "contacts"))
+        totals.update(window_counts(Room.objects.all(), "rooms"))
+        totals.update(window_counts(Message.objects.all(), "msgs"))
+        totals.update(window_counts(QueueAuthorization.objects.all(), "agents"))
+        return totals
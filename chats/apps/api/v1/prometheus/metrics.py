@@ -1,145 +1,148 @@
-from prometheus_client import Gauge
+from django.conf import settings
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
 
-chats_total_contacts = Gauge(
-    name="chats_total_contacts",
-    documentation="The number of contacts created in chats",
-    labelnames=["total_contacts"],
+from chats.apps.api.v1.prometheus.collectors import ChatsTotalsCollector
+
+# The totals gauges (chats_total_rooms, chats_total_msgs_last_month...) are computed
+# by the refresh_prometheus_totals task and served by ChatsTotalsCollector,
+# save paths only increment the counters
+
+if settings.USE_PROMETHEUS_METRICS:
+    REGISTRY.register(ChatsTotalsCollector())
+
+chats_rooms_created = Counter(
+    name="chats_rooms_created",
+    documentation="The rooms created by this process",
 )
 
-chats_online_contacts = Gauge(
-    name="chats_online_contacts",
-    documentation="The number of contacts online",
-    labelnames=["online_contact"],
+chats_rooms_closed = Counter(
+    name="chats_rooms_closed",
+    documentation="The rooms closed by this process",
 )
 
-chats_total_contacts_last_month = Gauge(
-    name="chats_total_contacts_last_month",
-    documentation="The number of contacts created last month in chats",
-    labelnames=["total_contacts_last_month"],
+chats_messages_created = Counter(
+    name="chats_messages_created",
+    documentation="The messages created by this process",
 )
 
-chats_total_contacts_last_3_months = Gauge(
-    name="chats_total_contacts_last_3_months",
-    documentation="The number of contacts created last 3 months in chats",
-    labelnames=["total_contacts_last_3_month"],
+chats_contacts_created = Counter(
+    name="chats_contacts_created",
+    documentation="The contacts created by this process",
 )
 
-chats_total_contacts_last_6_months = Gauge(
-    name="chats_total_contacts_last_6_months",
-    documentation="The number of contacts created last 6 months in chats",
-    labelnames=["total_contacts_last_6_months"],
+chats_agents_created = Counter(
+    name="chats_agents_created",
+    documentation="The queue authorizations created by this process",
 )
 
-chats_total_contacts_last_1_year = Gauge(
-    name="chats_total_contacts_last_1_year",
-    documentation="The number of contacts created last year in chats",
-    labelnames=["total_contacts_last_1_year"],
+chats_dashboard_cache_requests = Counter(
+    name="chats_dashboard_cache_requests",
+    documentation="The dashboard cache lookups, by metric and result (hit, stale or miss)",
+    labelnames=["metric", "result"],
 )
 
-chats_offline_contacts = Gauge(
-    name="chats_offline_contacts",
-    documentation="The number of contacts offline",
-    labelnames=["offline_contact"],
+chats_dashboard_cache_recompute_seconds = Histogram(
+    name="chats_dashboard_cache_recompute_seconds",
+    documentation="The time spent recomputing a dashboard metric on a cache miss",
+    labelnames=["metric"],
 )
 
-chats_total_rooms = Gauge(
-    name="chats_total_rooms",
-    documentation="The number of rooms created in chats",
-    labelnames=["total_rooms"],
+chats_http_request_duration_seconds = Histogram(
+    name="chats_http_request_duration_seconds",
+    documentation="The time spent handling a request, by view and action",
+    labelnames=["endpoint", "method"],
 )
 
-chats_opened_rooms = Gauge(
-    name="chats_opened_rooms",
-    documentation="The number of rooms opened in chats",
-    labelnames=["opened_rooms"],
+chats_http_request_db_queries = Histogram(
+    name="chats_http_request_db_queries",
+    documentation="The SQL queries run while handling a request, by view and action",
+    labelnames=["endpoint"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")),
 )
 
-chats_closed_rooms = Gauge(
-    name="chats_closed_rooms",
-    documentation="The number of rooms closed in chats",
-    labelnames=["closed_rooms"],
+chats_http_request_db_seconds = Histogram(
+    name="chats_http_request_db_seconds",
+    documentation="The time spent on SQL queries while handling a request, by view and action",
+    labelnames=["endpoint"],
 )
 
-chats_total_message = Gauge(
-    name="chats_total_message",
-    documentation="The number of messages created in chats",
-    labelnames=["total_message"],
+chats_http_response_size_bytes = Histogram(
+    name="chats_http_response_size_bytes",
+    documentation="The size of the non streaming responses, by view and action",
+    labelnames=["endpoint"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, float("inf")),
 )
 
-chats_total_agents = Gauge(
-    name="chats_total_agents",
-    documentation="The number of agents created in chats",
-    labelnames=["total_agents"],
+chats_http_requests = Counter(
+    name="chats_http_requests",
+    documentation="The handled requests, by view, action and status class (2xx, 4xx, 5xx)",
+    labelnames=["endpoint", "method", "status"],
 )
 
-chats_total_rooms_last_month = Gauge(
-    name="chats_total_rooms_last_month",
-    documentation="The number of rooms created last month in chats",
-    labelnames=["total_rooms_last_month"],
+chats_http_request_errors = Counter(
+    name="chats_http_request_errors",
+    documentation="The requests that raised an unhandled exception, by view and action",
+    labelnames=["endpoint"],
 )
 
-chats_total_rooms_last_3_months = Gauge(
-    name="chats_total_rooms_last_3_months",
-    documentation="The number of rooms created last 3 months in chats",
-    labelnames=["total_rooms_last_3_months"],
+chats_ws_connects = Counter(
+    name="chats_ws_connects",
+    documentation="The websocket handshakes, by consumer and result (accepted or rejected)",
+    labelnames=["consumer", "result"],
 )
 
-chats_total_rooms_last_6_months = Gauge(
-    name="chats_total_rooms_last_6_months",
-    documentation="The number of rooms created last 6 months in chats",
-    labelnames=["total_rooms_last_6_months"],
+chats_ws_disconnects = Counter(
+    name="chats_ws_disconnects",
+    documentation="The accepted websocket connections that were closed, by consumer",
+    labelnames=["consumer"],
 )
 
-chats_total_rooms_last_year = Gauge(
-    name="chats_total_rooms_last_year",
-    documentation="The number of rooms created last year in chats",
-    labelnames=["total_rooms_last_year"],
+chats_ws_active_connections = Gauge(
+    name="chats_ws_active_connections",
+    documentation="The websocket connections open on this process, by consumer and project",
+    labelnames=["consumer", "project"],
 )
 
-chats_total_msgs_last_month = Gauge(
-    name="chats_total_msgs_last_month",
-    documentation="The number of msgs created last month in chats",
-    labelnames=["total_msgs_last_month"],
+chats_ws_send_seconds = Histogram(
+    name="chats_ws_send_seconds",
+    documentation="The time spent encoding and sending a frame to a websocket, by consumer",
+    labelnames=["consumer"],
 )
 
-chats_total_msgs_last_3_months = Gauge(
-    name="chats_total_msgs_last_3_months",
-    documentation="The number of msgs created last 3 months in chats",
-    labelnames=["total_msgs_last_3_months"],
+chats_ws_db_seconds = Histogram(
+    name="chats_ws_db_seconds",
+    documentation="The time spent on the database helpers of the consumers, by consumer and helper",
+    labelnames=["consumer", "helper"],
 )
 
-chats_total_msgs_last_6_months = Gauge(
-    name="chats_total_msgs_last_6_months",
-    documentation="The number of msgs created last 6 months in chats",
-    labelnames=["total_msgs_last_6_months"],
+chats_channels_group_send_seconds = Histogram(
+    name="chats_channels_group_send_seconds",
+    documentation="The time spent publishing a batch of group messages to the channel layer",
 )
 
-chats_total_msgs_last_year = Gauge(
-    name="chats_total_msgs_last_year",
-    documentation="The number of msgs created last year in chats",
-    labelnames=["total_msgs_last_year"],
+chats_channels_group_send_failures = Counter(
+    name="chats_channels_group_send_failures",
+    documentation="The group messages that the channel layer failed to publish, retries included",
 )
 
-chats_total_agents_last_month = Gauge(
-    name="chats_total_agents_last_month",
-    documentation="The number of agents created last month in chats",
-    labelnames=["total_msgs_last_month"],
+chats_channels_group_send_retries = Counter(
+    name="chats_channels_group_send_retries",
+    documentation="The retries of group messages that the channel layer failed to publish",
 )
 
-chats_total_agents_last_3_months = Gauge(
-    name="chats_total_agents_last_3_months",
-    documentation="The number of agents created last 3 months in chats",
-    labelnames=["total_msgs_last_3_months"],
+chats_channels_group_send_dropped = Counter(
+    name="chats_channels_group_send_dropped",
+    documentation="The group messages dropped after the retries were exhausted",
 )
 
-chats_total_agents_last_6_months = Gauge(
-    name="chats_total_agents_last_6_months",
-    documentation="The number of agents created last 6 months in chats",
-    labelnames=["total_msgs_last_6_months"],
+chats_db_slow_queries = Counter(
+    name="chats_db_slow_queries",
+    documentation="The queries slower than SLOW_QUERY_THRESHOLD, by fingerprint and call site",
+    labelnames=["fingerprint", "callsite"],
 )
 
-chats_total_agents_last_year = Gauge(
-    name="chats_total_agents_last_year",
-    documentation="The number of agents created last year in chats",
-    labelnames=["total_msgs_last_year"],
+chats_db_slow_query_seconds = Counter(
+    name="chats_db_slow_query_seconds",
+    documentation="The time spent on the slow queries, by fingerprint and call site",
+    labelnames=["fingerprint", "callsite"],
 )
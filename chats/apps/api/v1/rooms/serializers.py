@@ -1,4 +1,5 @@
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from django.db.models import Exists, OuterRef, Prefetch, Subquery
 from rest_framework import serializers
 
 from chats.apps.accounts.models import User
@@ -6,6 +7,8 @@ from chats.apps.api.v1.accounts.serializers import UserSerializer
 from chats.apps.api.v1.contacts.serializers import ContactRelationsSerializer
 from chats.apps.api.v1.queues.serializers import QueueSerializer
 from chats.apps.api.v1.sectors.serializers import DetailSectorTagSerializer
+from chats.apps.msgs.models import Message
+from chats.apps.projects.models import FlowStart, LinkContact
 from chats.apps.queues.models import Queue
 from chats.apps.rooms.models import Room
 
@@ -25,7 +28,6 @@ class RoomSerializer(serializers.ModelSerializer):
     contact = ContactRelationsSerializer(many=False, read_only=True)
     queue = QueueSerializer(many=False, read_only=True)
     tags = DetailSectorTagSerializer(many=True, read_only=True)
-    unread_msgs = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
     is_waiting = serializers.SerializerMethodField()
     linked_user = serializers.SerializerMethodField()
@@ -36,7 +38,13 @@ class RoomSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Room
-        fields = "__all__"
+        exclude = [
+            "last_message_text",
+            "last_message_at",
+            "last_contact_message_at",
+            "first_contact_message_at",
+            "first_agent_reply_at",
+        ]
         read_only_fields = [
             "created_on",
             "ended_at",
@@ -46,16 +54,61 @@ class RoomSerializer(serializers.ModelSerializer):
             "is_24h_valid",
             "last_interaction",
             "can_edit_custom_fields",
+            "unread_msgs",
         ]
 
+    @staticmethod
+    def annotate_batch_data(queryset):
+        """
+        Load everything the serializer needs for a page of rooms in a fixed number of queries.
+        The serializer methods fall back to per room queries when the annotations are missing.
+        """
+        room_messages = Message.objects.filter(room=OuterRef("pk")).order_by()
+        user_last_interaction = (
+            Message.objects.filter(user=OuterRef("email"))
+            .order_by("-created_on")
+            .values("created_on")[:1]
+        )
+
+        return (
+            queryset.select_related("contact", "queue__sector")
+            .prefetch_related(
+                "tags",
+                Prefetch(
+                    "user",
+                    queryset=User.objects.annotate(
+                        last_message_on=Subquery(user_last_interaction)
+                    ),
+                ),
+                Prefetch(
+                    "contact__linked_users",
+                    queryset=LinkContact.objects.select_related("user"),
+                    to_attr="project_linked_users",
+                ),
+                Prefetch(
+                    "flowstarts",
+                    queryset=FlowStart.objects.filter(is_deleted=False),
+                    to_attr="active_flowstarts",
+                ),
+            )
+            .annotate(
+                has_contact_msgs=Exists(room_messages.filter(contact__isnull=False)),
+            )
+        )
+
     def get_is_24h_valid(self, room: Room) -> bool:
         return room.is_24h_valid
 
     def get_flowstart_data(self, room: Room) -> bool:
-        try:
-            flowstart = room.flowstarts.get(is_deleted=False)
-        except (ObjectDoesNotExist, MultipleObjectsReturned):
-            return {}
+        if hasattr(room, "active_flowstarts"):
+            if len(room.active_flowstarts) != 1:
+                return {}
+            flowstart = room.active_flowstarts[0]
+        else:
+            try:
+                flowstart = room.flowstarts.get(is_deleted=False)
+            except (ObjectDoesNotExist, MultipleObjectsReturned):
+                return {}
         return {
             "name": flowstart.name,
             "is_deleted": flowstart.is_deleted,
@@ -64,24 +117,26 @@ class RoomSerializer(serializers.ModelSerializer):
 
     def get_linked_user(self, room: Room):
         try:
+            if hasattr(room.contact, "project_linked_users"):
+                project_id = room.queue.sector.project_id
+                linked_user = next(
+                    linked_user
+                    for linked_user in room.contact.project_linked_users
+                    if linked_user.project_id == project_id
+                )
+                return linked_user.full_name
             return room.contact.get_linked_user(room.queue.sector.project).full_name
-        except AttributeError:
+        except (AttributeError, StopIteration):
             return ""
 
     def get_is_waiting(self, room: Room):
-        return room.get_is_waiting()
-
-    def get_unread_msgs(self, room: Room):
-        return room.messages.filter(seen=False).count()
+        if not hasattr(room, "has_contact_msgs"):
+            return room.get_is_waiting()
+        check_messages = room.is_waiting or not room.has_contact_msgs
+        return check_messages or bool(room.active_flowstarts)
 
     def get_last_message(self, room: Room):
-        last_message = (
-            room.messages.order_by("-created_on")
-            .exclude(user__isnull=True, contact__isnull=True)
-            .exclude(text="")
-            .first()
-        )
-        return "" if last_message is None else last_message.text
+        return room.last_message_text
 
     def get_can_edit_custom_fields(self, room: Room):
         return room.queue.sector.can_edit_custom_fields
@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.db.models import Max
+from django.db.models import F
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, mixins, permissions, status
@@ -26,6 +26,7 @@ from chats.apps.rooms.views import (
     update_flows_custom_fields,
     create_transfer_json,
     create_room_feedback_message,
+    update_room_waiting_time,
 )
 
 
@@ -60,7 +61,10 @@ class RoomViewset(
         if self.action != "list":
             self.filterset_class = None
         qs = super().get_queryset()
-        return qs.annotate(last_interaction=Max("messages__created_on"))
+        qs = qs.annotate(last_interaction=F("last_message_at"))
+        if self.action == "list":
+            qs = RoomSerializer.annotate_batch_data(qs)
+        return qs
 
     def get_serializer_class(self):
         if "update" in self.action:
@@ -86,13 +90,18 @@ class RoomViewset(
         serializer.is_valid(raise_exception=True)
         serialized_data = serializer.validated_data
 
-        message_filter = {"seen": not serialized_data.get("seen")}
+        seen = serialized_data.get("seen")
+        message_filter = {"seen": not seen}
         if request.data.get("messages", []):
             message_filter["pk__in"] = request.data.get("messages")
 
-        room.messages.filter(**message_filter).update(
-            modified_on=timezone.now(), seen=serialized_data.get("seen")
+        updated_msgs = room.messages.filter(**message_filter).update(
+            modified_on=timezone.now(), seen=seen
         )
+        if seen and "pk__in" not in message_filter:
+            room.reset_unread_msgs()
+        elif updated_msgs:
+            room.update_unread_msgs(-updated_msgs if seen else updated_msgs)
         room.notify_user("update")
         return Response(
             {"detail": "All the given messages have been marked as read"},
@@ -142,16 +151,11 @@ class RoomViewset(
         # Create transfer object based on whether it's a user or a queue transfer and add it to the history
         if user:
             if old_instance.user is None:
-                time = timezone.now() - old_instance.modified_on
-                room_metric = RoomMetrics.objects.get_or_create(room=instance)[0]
-                room_metric.waiting_time += time.total_seconds()
-                room_metric.queued_count += 1
-                room_metric.save()
+                update_room_waiting_time(instance, old_instance.modified_on)
             else:
-                # Get the room metric from instance and update the transfer_count value.
-                room_metric = RoomMetrics.objects.get_or_create(room=instance)[0]
-                room_metric.transfer_count += 1
-                room_metric.save()
+                RoomMetrics.update_room(
+                    instance, transfer_count=F("transfer_count") + 1
+                )
 
             action = "transfer" if self.request.user.email != user else "pick"
             feedback = create_transfer_json(
@@ -172,9 +176,7 @@ class RoomViewset(
             ):  # if it is only a queue transfer from a user, need to reset the user field
                 instance.user = None
 
-            room_metric = RoomMetrics.objects.get_or_create(room=instance)[0]
-            room_metric.transfer_count += 1
-            room_metric.save()
+            RoomMetrics.update_room(instance, transfer_count=F("transfer_count") + 1)
 
         instance.transfer_history = feedback
         instance.save()
@@ -0,0 +1,18 @@
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from chats.core.slow_queries import SlowQueryLog
+
+
+class SlowQueryListView(APIView):
+    """The slow queries aggregated by fingerprint, the most time consuming first"""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 50)), 500))
+        except ValueError:
+            limit = 50
+        return Response({"results": SlowQueryLog().top(limit=limit)})
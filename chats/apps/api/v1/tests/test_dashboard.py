@@ -1,11 +1,22 @@
+import io
 import time
+from datetime import timedelta
+from unittest.mock import Mock, patch
 
+import openpyxl
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
 from chats.apps.accounts.models import User
-from chats.apps.dashboard.models import RoomMetrics
+from chats.apps.dashboard.models import DashboardExportJob, RoomMetrics
+from chats.apps.dashboard.tasks import (
+    run_dashboard_export,
+    run_dashboard_export_in_background,
+)
+from chats.apps.projects.models import Project
 from chats.apps.queues.models import Queue
 from chats.apps.rooms.models import Room
 
@@ -209,3 +220,214 @@ class DashboardTests(APITestCase):
         room_metric = RoomMetrics.objects.get(room__queue__uuid=data["queue_uuid"])
 
         self.assertEqual(room_metric.__str__(), "FRONTEND")
+
+
+class DashboardExportTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self) -> None:
+        self.project = Project.objects.get(pk="34a93b52-231e-11ed-861d-0242ac120002")
+        self.user = User.objects.get(email="brucebanner@chats.weni.ai")
+        self.login_token = Token.objects.get_or_create(user=self.user)[0]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.login_token.key)
+
+    def test_export_streams_rooms_csv(self):
+        url = f"/v1/dashboard/{self.project.pk}/export/"
+        start_date = Room.objects.order_by("created_on").first().created_on.date()
+        response = self.client.get(
+            url,
+            {"start_date": str(start_date), "end_date": str(timezone.now().date())},
+        )
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="dashboard_rooms_export_data.csv"',
+        )
+        with self.assertNumQueries(0):
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0], "Queue Name,Waiting Time,Response Time,Interaction Time,Open"
+        )
+        self.assertEqual(
+            len(lines) - 1,
+            Room.objects.filter(queue__sector__project=self.project).count(),
+        )
+
+    @override_settings(DASHBOARD_EXPORT_MAX_CSV_ROWS=1)
+    def test_large_rooms_export_starts_an_export_job(self):
+        url = f"/v1/dashboard/{self.project.pk}/export/"
+        params = {"start_date": "2022-01-01", "end_date": str(timezone.now().date())}
+        with patch("chats.apps.dashboard.models.DashboardExportJob.enqueue"):
+            response = self.client.get(url, params)
+
+        self.assertEqual(response.status_code, 202)
+        job = DashboardExportJob.objects.get(uuid=response.json()["uuid"])
+        self.assertEqual(job.export_type, DashboardExportJob.TYPE_ROOMS)
+        self.assertEqual(job.filters, params)
+
+    def export_dashboard_lines(self, params=None):
+        url = f"/v1/dashboard/{self.project.pk}/export_dashboard/"
+        response = self.client.get(url, params or {})
+
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(0):
+            return b"".join(response.streaming_content).decode().splitlines()
+
+    def export_dashboard_header(self):
+        return self.export_dashboard_lines()[0].split(";")
+
+    def test_export_dashboard_writes_the_headers_of_empty_tables(self):
+        lines = self.export_dashboard_lines(
+            {"start_date": "2000-01-01", "end_date": "2000-01-01"}
+        )
+
+        self.assertEqual(lines[-1], "name;waiting_time;response_time;interact_time")
+
+    def test_export_dashboard_streams_each_table_csv(self):
+        self.assertEqual(
+            self.export_dashboard_header(),
+            [
+                "interact_time",
+                "response_time",
+                "waiting_time",
+                "active_chats",
+                "closed_rooms",
+                "transfer_count",
+                "queue_rooms",
+            ],
+        )
+
+    @override_settings(USE_DASHBOARD_ROLLUP=True)
+    def test_export_dashboard_has_the_percentiles_of_the_rollup(self):
+        self.assertEqual(
+            self.export_dashboard_header()[3:12],
+            [
+                "waiting_time_p50",
+                "waiting_time_p90",
+                "waiting_time_p99",
+                "response_time_p50",
+                "response_time_p90",
+                "response_time_p99",
+                "interact_time_p50",
+                "interact_time_p90",
+                "interact_time_p99",
+            ],
+        )
+
+
+class DashboardExportJobTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self) -> None:
+        self.project = Project.objects.get(pk="34a93b52-231e-11ed-861d-0242ac120002")
+        self.user = User.objects.get(email="brucebanner@chats.weni.ai")
+        self.login_token = Token.objects.get_or_create(user=self.user)[0]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.login_token.key)
+        self.url = f"/v1/dashboard/{self.project.pk}/export_jobs/"
+        self.data = {
+            "export_type": "rooms",
+            "filters": {"start_date": "2022-01-01", "end_date": "2030-01-01"},
+        }
+        self.uploaded = {}
+        storage_patch = patch(
+            "chats.apps.api.v1.dashboard.exports.export_job_storage",
+            return_value=Mock(save=self.save_file),
+        )
+        storage_patch.start()
+        self.addCleanup(storage_patch.stop)
+        # the exports thread runs the jobs inline, on the test transaction
+        executor_patch = patch(
+            "chats.apps.dashboard.tasks.exports_executor",
+            Mock(submit=lambda function, job_pk: run_dashboard_export(job_pk)),
+        )
+        executor_patch.start()
+        self.addCleanup(executor_patch.stop)
+
+    def save_file(self, name, content):
+        self.uploaded[name] = content.read()
+        return name
+
+    def test_export_job_writes_rooms_workbook(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, 201)
+
+        job = DashboardExportJob.objects.get(pk=response.data["uuid"])
+        rooms_count = Room.objects.filter(queue__sector__project=self.project).count()
+        self.assertEqual(job.status, DashboardExportJob.STATUS_DONE)
+        self.assertEqual((job.progress, job.total), (rooms_count, rooms_count))
+
+        workbook = openpyxl.load_workbook(io.BytesIO(self.uploaded[job.file_name]))
+        rows = list(workbook["dashboard_infos"].iter_rows(values_only=True))
+        self.assertEqual(rows[1][0], "Queue Name")
+        self.assertEqual(len(rows), rooms_count + 2)
+
+    def test_repeated_export_returns_the_same_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first_response = self.client.post(self.url, self.data, format="json")
+            second_response = self.client.post(self.url, self.data, format="json")
+
+        self.assertEqual(second_response.status_code, 200)
+        self.assertEqual(first_response.data["uuid"], second_response.data["uuid"])
+        self.assertEqual(DashboardExportJob.objects.count(), 1)
+
+    def test_export_job_runs_off_the_request(self):
+        with patch("chats.apps.dashboard.tasks.exports_executor") as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, self.data, format="json")
+
+        self.assertEqual(response.data["status"], DashboardExportJob.STATUS_PENDING)
+        executor.submit.assert_called_once_with(
+            run_dashboard_export_in_background, str(response.data["uuid"])
+        )
+
+    def test_running_job_is_returned_after_the_dedup_window(self):
+        with patch("chats.apps.dashboard.tasks.exports_executor"):
+            with self.captureOnCommitCallbacks(execute=True):
+                job_uuid = self.client.post(self.url, self.data, format="json").data[
+                    "uuid"
+                ]
+        DashboardExportJob.objects.filter(uuid=job_uuid).update(
+            status=DashboardExportJob.STATUS_RUNNING,
+            created_on=timezone.now() - timedelta(minutes=6),
+        )
+
+        response = self.client.post(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["uuid"], job_uuid)
+
+        DashboardExportJob.objects.filter(uuid=job_uuid).update(
+            status=DashboardExportJob.STATUS_DONE
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, self.data, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_xls_exports_start_an_export_job(self):
+        for action, export_type in (
+            ("export", DashboardExportJob.TYPE_ROOMS),
+            ("export_dashboard", DashboardExportJob.TYPE_DASHBOARD),
+        ):
+            url = f"/v1/dashboard/{self.project.pk}/{action}/"
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(url, {"xls": "1"})
+
+            self.assertEqual(response.status_code, 202)
+            job = DashboardExportJob.objects.get(uuid=response.data["uuid"])
+            self.assertEqual(job.export_type, export_type)
+            self.assertEqual(job.status, DashboardExportJob.STATUS_DONE)
+
+    def test_export_job_status(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job_uuid = self.client.post(self.url, self.data, format="json").data["uuid"]
+
+        with patch(
+            "chats.apps.api.v1.dashboard.serializers.export_job_storage"
+        ) as storage:
+            storage.return_value.url.return_value = "https://signed.url"
+            response = self.client.get(f"{self.url}{job_uuid}/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], DashboardExportJob.STATUS_DONE)
+        self.assertEqual(response.data["url"], "https://signed.url")
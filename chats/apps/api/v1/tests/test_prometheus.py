@@ -0,0 +1,76 @@
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from chats.apps.api.tasks import refresh_prometheus_totals
+from chats.apps.api.v1.prometheus.collectors import GAUGES, ChatsTotalsCollector
+from chats.apps.msgs.models import Message
+from chats.apps.rooms.models import Room
+
+
+@override_settings(USE_PROMETHEUS_METRICS=True)
+class ChatsTotalsCollectorTests(TestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.collector = ChatsTotalsCollector()
+        cache.delete(self.collector.cache_key)
+
+    def collected(self) -> dict:
+        refresh_prometheus_totals()
+        return self.scraped()
+
+    def scraped(self) -> dict:
+        return {
+            family.name: (family.samples[0].labels, family.samples[0].value)
+            for family in self.collector.collect()
+        }
+
+    def test_gauges_keep_their_names_and_labels(self):
+        collected = self.collected()
+
+        self.assertEqual(len(collected), len(GAUGES))
+        self.assertEqual(
+            collected["chats_total_agents_last_month"][0],
+            {"total_msgs_last_month": "total_agents_last_month"},
+        )
+        self.assertEqual(collected["chats_total_rooms"][1], Room.objects.count())
+        self.assertEqual(
+            collected["chats_opened_rooms"][1],
+            Room.objects.filter(ended_at__isnull=True).count(),
+        )
+
+    def test_rolling_windows_are_counted(self):
+        Message.objects.create(room=Room.objects.filter(is_active=True).first())
+        Message.objects.filter(pk__in=Message.objects.all()[:1]).update(
+            created_on=timezone.now() + relativedelta(months=-2)
+        )
+
+        collected = self.collected()
+
+        now = timezone.now()
+        for window, delta in (("month", -1), ("3_months", -3)):
+            self.assertEqual(
+                collected[f"chats_total_msgs_last_{window}"][1],
+                Message.objects.filter(
+                    created_on__gte=now + relativedelta(months=delta)
+                ).count(),
+            )
+
+    def test_scrapes_only_read_the_refreshed_totals(self):
+        refresh_prometheus_totals()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.scraped()), len(GAUGES))
+
+    def test_nothing_is_served_before_the_first_refresh(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scraped(), {})
+
+    @override_settings(USE_PROMETHEUS_METRICS=False)
+    def test_totals_are_not_refreshed_when_metrics_are_disabled(self):
+        with self.assertNumQueries(0):
+            refresh_prometheus_totals()
+
+        self.assertIsNone(cache.get(self.collector.cache_key))
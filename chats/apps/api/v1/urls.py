@@ -1,9 +1,14 @@
 from django.urls import include, path
 
+from chats.apps.api.v1.profiles.views import ProfileDetailView, ProfileListView
 from chats.apps.api.v1.prometheus.views import metrics_view
 from chats.apps.api.v1.routers import router
+from chats.apps.api.v1.slow_queries.views import SlowQueryListView
 
 urlpatterns = [
     path("", include(router.urls)),
     path("metrics/", metrics_view, name="metrics_view"),
+    path("profiles/", ProfileListView.as_view(), name="profile_list"),
+    path("profiles/<path:name>", ProfileDetailView.as_view(), name="profile_detail"),
+    path("slow-queries/", SlowQueryListView.as_view(), name="slow_query_list"),
 ]
@@ -1,17 +1,29 @@
 import json
 
-from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 
+from chats.apps.projects.presence import AgentPresence
+from chats.apps.projects.tasks import restore_agent_status, sync_agents_presence
+from chats.core.websockets.metrics import (
+    ConsumerMetricsMixin,
+    timed_database_sync_to_async,
+)
+from chats.core.websockets.profiling import ConsumerProfilerMixin
 
-class AgentRoomConsumer(AsyncJsonWebsocketConsumer):
+
+class AgentRoomConsumer(
+    ConsumerMetricsMixin, ConsumerProfilerMixin, AsyncJsonWebsocketConsumer
+):
     """
     Agent side of the chat
     """
 
+    # Whether the connection keeps the agent of the permission online
+    track_presence = True
+
     async def connect(self, *args, **kwargs):
         """
         Called when the websocket is handshaking as part of initial connection.
@@ -43,6 +55,8 @@ class AgentRoomConsumer(AsyncJsonWebsocketConsumer):
                 await self.load_queues()
                 await self.load_user()
                 self.last_ping = timezone.now()
+                if self.track_presence:
+                    await self.presence_connect()
 
     async def disconnect(self, *args, **kwargs):
         for group in set(self.added_groups):
@@ -51,10 +65,8 @@ class AgentRoomConsumer(AsyncJsonWebsocketConsumer):
             except AssertionError:
                 pass
 
-        if self.permission:
-            await self.set_user_status(
-                "OFFLINE"
-            )  # What if the user has two or more channels connected?
+        if self.permission and self.track_presence:
+            await self.presence_disconnect()
 
     async def receive_json(self, payload):
         """
@@ -71,6 +83,8 @@ class AgentRoomConsumer(AsyncJsonWebsocketConsumer):
             await command(payload["content"])
         elif command_name == "ping":
             self.last_ping = timezone.now()
+            if self.track_presence:
+                await self.presence_heartbeat()
             await self.send_json({"type": "pong"})
 
     # METHODS
@@ -145,17 +159,42 @@ class AgentRoomConsumer(AsyncJsonWebsocketConsumer):
 
     # SYNC HELPER FUNCTIONS
 
-    @database_sync_to_async
-    def set_user_status(self, status: str):
-        self.permission.status = status
-        self.permission.save()
-        self.permission.notify_user("update", "system")
+    @timed_database_sync_to_async
+    def presence_connect(self):
+        AgentPresence().connect(
+            self.permission.project_id, self.permission.pk, self.channel_name
+        )
+
+    @timed_database_sync_to_async
+    def presence_heartbeat(self):
+        """
+        A socket that pings after being expired is registered again,
+        as the only connection of the agent it restores the status it had
+        """
+        presence = AgentPresence()
+        registered, connections = presence.heartbeat(
+            self.permission.project_id, self.permission.pk, self.channel_name
+        )
+        if registered and connections == 1:
+            restore_agent_status(self.permission, presence)
+
+    @timed_database_sync_to_async
+    def presence_disconnect(self):
+        """
+        The agent is set offline only when its last connection is closed,
+        the status is written in batches by the sync_agents_presence task
+        """
+        connections = AgentPresence().disconnect(
+            self.permission.project_id, self.permission.pk, self.channel_name
+        )
+        if connections <= 0 and not settings.USE_CELERY:
+            sync_agents_presence()
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def get_permission(self):
         return self.user.project_permissions.get(project__uuid=self.project)
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def get_queues(self, *args, **kwargs):
         """ """
         self.queues = self.permission.queue_ids
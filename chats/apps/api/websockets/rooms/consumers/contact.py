@@ -1,11 +1,15 @@
 import json
 
-from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.core.serializers.json import DjangoJSONEncoder
 
 from chats.apps.api.v1.msgs.serializers import MessageWSSerializer
 from chats.apps.rooms.models import Room
+from chats.core.websockets.metrics import (
+    ConsumerMetricsMixin,
+    timed_database_sync_to_async,
+)
+from chats.core.websockets.profiling import ConsumerProfilerMixin
 
 
 # TODO Use this on the agent consumer and move it to another place
@@ -15,7 +19,9 @@ class BaseWebsocketConsumer(AsyncJsonWebsocketConsumer):
         return json.dumps(content, cls=DjangoJSONEncoder)
 
 
-class ContactRoomConsumer(AsyncJsonWebsocketConsumer):
+class ContactRoomConsumer(
+    ConsumerMetricsMixin, ConsumerProfilerMixin, AsyncJsonWebsocketConsumer
+):
     async def connect(self):
         self.contact = None
         self.room = self.scope["url_route"]["kwargs"]["room"]
@@ -51,13 +57,17 @@ class ContactRoomConsumer(AsyncJsonWebsocketConsumer):
     async def notify(self, event):
         await self.send_json(json.dumps(event["content"]))
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def get_room(self):
-        self.room = Room.objects.get(pk=self.room)
+        self.room = Room.objects.select_related("queue__sector").get(pk=self.room)
         self.contact = self.room.contact
         return self.room
 
-    @database_sync_to_async
+    def metrics_project(self) -> str:
+        queue = self.room.queue if isinstance(self.room, Room) else None
+        return str(queue.sector.project_id) if queue else ""
+
+    @timed_database_sync_to_async
     def get_msgs(self):
         msgs = self.room.messages.all().order_by(self.order_by)
         self.serialized_messages = MessageWSSerializer(msgs, many=True).data
@@ -73,7 +83,7 @@ class ContactRoomConsumer(AsyncJsonWebsocketConsumer):
             }
         )
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def message_create(self, content):
         msg = self.room.messages.create(contact=self.room.contact, text=content)
         msg.notify_room("create")
@@ -0,0 +1,86 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.core.exceptions import ObjectDoesNotExist
+
+from chats.apps.dashboard.live import dashboard_group_name
+from chats.core.websockets.metrics import (
+    ConsumerMetricsMixin,
+    timed_database_sync_to_async,
+)
+from chats.core.websockets.profiling import ConsumerProfilerMixin
+
+
+class DashboardConsumer(
+    ConsumerMetricsMixin, ConsumerProfilerMixin, AsyncJsonWebsocketConsumer
+):
+    """
+    Live dashboard of a manager, receives the counters changes of the project or sector
+    """
+
+    async def connect(self, *args, **kwargs):
+        """
+        Admins may listen to the whole project, sector managers to the sectors they manage.
+        """
+        self.added_groups = []
+        self.permission = None
+        close = False
+
+        try:
+            self.user = self.scope["user"]
+            self.project = self.scope["query_params"].get("project")[0]
+            self.sector = (self.scope["query_params"].get("sector") or [None])[0]
+        except (KeyError, TypeError):
+            close = True
+
+        if close or self.user.is_anonymous or self.project is None:
+            await self.close()
+            return
+
+        try:
+            self.permission = await self.get_permission()
+            groups = await self.get_dashboard_groups()
+        except ObjectDoesNotExist:
+            groups = []
+        if not groups:
+            await self.close()
+            return
+
+        await self.accept()
+        for group_name in groups:
+            await self.channel_layer.group_add(group_name, self.channel_name)
+            self.added_groups.append(group_name)
+
+    async def disconnect(self, *args, **kwargs):
+        for group in set(self.added_groups):
+            try:
+                await self.channel_layer.group_discard(group, self.channel_name)
+            except AssertionError:
+                pass
+
+    async def receive_json(self, payload):
+        if payload.get("type") == "ping":
+            await self.send_json({"type": "pong"})
+
+    # SUBSCRIPTIONS
+    async def notify(self, event):
+        await self.send_json(event)
+
+    # SYNC HELPER FUNCTIONS
+
+    @timed_database_sync_to_async
+    def get_permission(self):
+        return self.user.project_permissions.get(project__uuid=self.project)
+
+    @timed_database_sync_to_async
+    def get_dashboard_groups(self) -> list:
+        if self.sector:
+            if not self.permission.is_manager(sector=self.sector):
+                return []
+            return [dashboard_group_name(sector_pk=self.sector)]
+        if self.permission.is_admin:
+            return [dashboard_group_name(project_pk=self.permission.project_id)]
+        return [
+            dashboard_group_name(sector_pk=sector_pk)
+            for sector_pk in self.permission.manager_sectors().values_list(
+                "pk", flat=True
+            )
+        ]
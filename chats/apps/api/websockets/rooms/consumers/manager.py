@@ -1,15 +1,18 @@
-from channels.db import database_sync_to_async
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 
 from chats.apps.api.websockets.rooms.consumers.agent import AgentRoomConsumer
+from chats.core.websockets.metrics import timed_database_sync_to_async
 
 
 class ManagerAgentRoomConsumer(AgentRoomConsumer):
     """
-    Agent side of the chat
+    Agent side of the chat, watched by a manager. The manager connection
+    does not count as one of the agent connections on the presence registry.
     """
 
+    track_presence = False
+
     async def connect(self, *args, **kwargs):
         """
         Called when the websocket is handshaking as part of initial connection.
@@ -54,13 +57,6 @@ class ManagerAgentRoomConsumer(AgentRoomConsumer):
                 await self.load_user()
                 self.last_ping = timezone.now()
 
-    async def disconnect(self, *args, **kwargs):
-        for group in set(self.added_groups):
-            try:
-                await self.channel_layer.group_discard(group, self.channel_name)
-            except AssertionError:
-                pass
-
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def check_is_manager(self):
         return self.permission.is_manager(any_sector=True)
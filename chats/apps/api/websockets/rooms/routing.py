@@ -1,10 +1,11 @@
 from django.urls import re_path
 
-from chats.apps.api.websockets.rooms.consumers import agent, contact, manager
+from chats.apps.api.websockets.rooms.consumers import agent, contact, dashboard, manager
 
 websocket_urlpatterns = [
     re_path(r"ws/agent/rooms", agent.AgentRoomConsumer.as_asgi()),
     re_path(r"ws/manager/rooms", manager.ManagerAgentRoomConsumer.as_asgi()),
+    re_path(r"ws/manager/dashboard", dashboard.DashboardConsumer.as_asgi()),
     re_path(
         r"ws/contact/room/(?P<room>[0-9a-f-]+)/$", contact.ContactRoomConsumer.as_asgi()
     ),
@@ -0,0 +1,102 @@
+import json
+from urllib import parse
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+
+from chats.apps.api.v1.prometheus.metrics import (
+    chats_dashboard_cache_recompute_seconds,
+    chats_dashboard_cache_requests,
+)
+from chats.apps.queues.models import Queue
+
+
+class DashboardCache:
+    """
+    Dashboard aggregates cached on redis under a version per project and sector.
+
+    Closing, transferring or updating the metrics of a room bumps the version of
+    its sector and project, so the cached values are invalidated by the events
+    that change them instead of a fixed expiration. An outdated value is still
+    served while a single request, holding a redis lock, recomputes it.
+    """
+
+    def __init__(self, redis_connection=None):
+        self.redis = redis_connection or get_redis_connection()
+
+    def version_key(self, project_pk, sector_pk=None) -> str:
+        if sector_pk:
+            return f"dashboard_version:sector:{sector_pk}"
+        return f"dashboard_version:project:{project_pk}"
+
+    def entry_key(self, metric: str, params: dict, project_pk, sector_pk=None) -> str:
+        params = parse.urlencode(sorted((k, str(v)) for k, v in params.items()))
+        return f"dashboard:{project_pk}:{sector_pk or 'all'}:{metric}:{params}"
+
+    def invalidate_queues(self, queue_pks: list):
+        """Bump the versions of the sectors and projects of the queues"""
+        sectors = Queue.objects.filter(pk__in=queue_pks).values_list(
+            "sector", "sector__project"
+        )
+        pipe = self.redis.pipeline(transaction=False)
+        for sector_pk, project_pk in set(sectors):
+            pipe.incr(self.version_key(project_pk, sector_pk))
+            pipe.incr(self.version_key(project_pk))
+        pipe.execute()
+
+    def get_or_compute(
+        self, metric: str, params: dict, compute, project_pk, sector_pk=None
+    ):
+        version = int(self.redis.get(self.version_key(project_pk, sector_pk)) or 0)
+        key = self.entry_key(metric, params, project_pk, sector_pk)
+        entry = self.redis.get(key)
+        entry = json.loads(entry) if entry else None
+        if entry and entry["version"] == version:
+            chats_dashboard_cache_requests.labels(metric, "hit").inc()
+            return entry["data"]
+
+        lock = self.redis.lock(
+            f"{key}:lock", timeout=settings.DASHBOARD_CACHE_LOCK_TIMEOUT
+        )
+        if entry:
+            if not lock.acquire(blocking=False):
+                # another request is already recomputing it
+                chats_dashboard_cache_requests.labels(metric, "stale").inc()
+                return entry["data"]
+        else:
+            locked = lock.acquire(
+                blocking_timeout=settings.DASHBOARD_CACHE_LOCK_TIMEOUT
+            )
+            if not locked:
+                lock = None
+            entry = self.redis.get(key)
+            entry = json.loads(entry) if entry else None
+            if entry and entry["version"] == version:
+                # computed by the request that held the lock
+                if lock is not None:
+                    self.release(lock)
+                chats_dashboard_cache_requests.labels(metric, "hit").inc()
+                return entry["data"]
+
+        chats_dashboard_cache_requests.labels(metric, "miss").inc()
+        try:
+            with chats_dashboard_cache_recompute_seconds.labels(metric).time():
+                data = compute()
+            self.redis.set(
+                key,
+                json.dumps({"version": version, "data": data}, cls=DjangoJSONEncoder),
+                settings.CHATS_CACHE_TIME,
+            )
+        finally:
+            if lock is not None:
+                self.release(lock)
+        return data
+
+    def release(self, lock):
+        try:
+            lock.release()
+        except LockError:
+            # expired while computing, another request may be holding it now
+            pass
@@ -0,0 +1,83 @@
+from collections import Counter
+
+from chats.apps.queues.models import Queue
+from chats.utils.websockets import notify_channels_group
+
+
+def dashboard_group_name(project_pk=None, sector_pk=None) -> str:
+    if sector_pk:
+        return f"dashboard_sector_{sector_pk}"
+    return f"dashboard_project_{project_pk}"
+
+
+def room_counters(state) -> tuple:
+    """The live dashboard counters a room in the (is_active, user_pk, queue_pk) state counts for"""
+    if state is None:
+        return Counter(), {}
+    is_active, user_pk, _ = state
+    if is_active and user_pk:
+        return Counter(active_chats=1), {user_pk: Counter(opened_rooms=1)}
+    if is_active:
+        return Counter(queue_rooms=1), {}
+    if user_pk:
+        return Counter(closed_rooms=1), {user_pk: Counter(closed_rooms=1)}
+    return Counter(closed_rooms=1), {}
+
+
+def room_deltas(old_state, new_state, sectors: dict) -> dict:
+    """Counters changes of each sector, as {sector_pk: (counters, agents counters)}"""
+    deltas = {}
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None or state[2] not in sectors:
+            continue
+        counters, agents = room_counters(state)
+        sector_counters, sector_agents = deltas.setdefault(
+            sectors[state[2]], (Counter(), {})
+        )
+        for name, value in counters.items():
+            sector_counters[name] += sign * value
+        for user_pk, agent_counters in agents.items():
+            for name, value in agent_counters.items():
+                sector_agents.setdefault(user_pk, Counter())[name] += sign * value
+    return deltas
+
+
+def publish_room_delta(room_pk, old_state, new_state):
+    """
+    Push the counters changes of a room to the live dashboard of its sectors
+    and projects, with the room pk so each change is delivered once.
+    """
+    queue_pks = {state[2] for state in (old_state, new_state) if state and state[2]}
+    queues = Queue.objects.filter(pk__in=queue_pks).values_list(
+        "pk", "sector", "sector__project"
+    )
+    sectors = {queue_pk: sector_pk for queue_pk, sector_pk, _ in queues}
+    projects = {sector_pk: project_pk for _, sector_pk, project_pk in queues}
+
+    for sector_pk, (counters, agents) in room_deltas(
+        old_state, new_state, sectors
+    ).items():
+        if not any(counters.values()) and not any(
+            any(agent.values()) for agent in agents.values()
+        ):
+            continue
+        content = {
+            "room": str(room_pk),
+            "sector": str(sector_pk),
+            **{name: value for name, value in counters.items() if value},
+            "agents": {
+                user_pk: {name: value for name, value in agent.items() if value}
+                for user_pk, agent in agents.items()
+                if any(agent.values())
+            },
+        }
+        for group_name in (
+            dashboard_group_name(sector_pk=sector_pk),
+            dashboard_group_name(project_pk=projects[sector_pk]),
+        ):
+            notify_channels_group(
+                group_name=group_name,
+                call_type="notify",
+                action="dashboard.delta",
+                content=content,
+            )
@@ -0,0 +1,46 @@
+import pendulum
+from django.core.management.base import BaseCommand
+
+from chats.apps.dashboard.models import RoomMetrics, RoomMetricsRollup
+from chats.apps.queues.models import Queue
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly dashboard rollup from the metrics of the closed rooms"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--project",
+            action="append",
+            default=[],
+            help="Only rebuild the queues of this project, may be repeated",
+        )
+        parser.add_argument(
+            "--since",
+            help="Only rebuild the hours from this date on, as YYYY-MM-DD in UTC",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="How many rollup rows are inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        queues = Queue.objects.all()
+        if options["project"]:
+            queues = queues.filter(sector__project__in=options["project"])
+        since = pendulum.parse(options["since"]) if options["since"] else None
+
+        created = 0
+        for queue_pk in queues.order_by("pk").values_list("pk", flat=True).iterator():
+            metrics = RoomMetrics.objects.filter(room__queue=queue_pk)
+            rollups = RoomMetricsRollup.objects.filter(queue=queue_pk)
+            if since:
+                metrics = metrics.filter(room__created_on__gte=since)
+                rollups = rollups.filter(hour__gte=since)
+            created += RoomMetricsRollup.objects.rebuild(
+                metrics, rollups, batch_size=options["batch_size"]
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"{created} rollup rows created"))
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import time
+
+import pendulum
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from chats.apps.dashboard.cache import DashboardCache
+from chats.apps.dashboard.recompute import (
+    METRIC_FIELDS,
+    compute_room_metrics,
+    write_room_metrics,
+)
+from chats.apps.rooms.models import Room
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the metrics of the rooms from their messages, in chunks. "
+        "Interrupted runs resume from the last saved chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--project",
+            action="append",
+            default=[],
+            help="Only recompute the rooms of this project, may be repeated",
+        )
+        parser.add_argument(
+            "--since",
+            help="Only recompute the rooms created from this date on, as YYYY-MM-DD in UTC",
+        )
+        parser.add_argument(
+            "--until",
+            help="Only recompute the rooms created before this date, as YYYY-MM-DD in UTC",
+        )
+        parser.add_argument(
+            "--metric",
+            action="append",
+            choices=list(METRIC_FIELDS),
+            default=[],
+            help="Only recompute this metric, may be repeated. Defaults to all of them",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="How many rooms are read and written per chunk",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the progress of a previous run with the same options",
+        )
+
+    def handle(self, *args, **options):
+        metrics = options["metric"] or list(METRIC_FIELDS)
+        chunk_size = options["chunk_size"]
+
+        rooms = Room.objects.all()
+        if options["project"]:
+            rooms = rooms.filter(queue__sector__project__in=options["project"])
+        if options["since"]:
+            rooms = rooms.filter(created_on__gte=pendulum.parse(options["since"]))
+        if options["until"]:
+            rooms = rooms.filter(created_on__lt=pendulum.parse(options["until"]))
+        rooms = rooms.order_by("pk")
+
+        redis = get_redis_connection()
+        checkpoint_key = self.checkpoint_key(options, metrics)
+        last_pk = None if options["restart"] else redis.get(checkpoint_key)
+        if last_pk:
+            last_pk = last_pk.decode()
+            self.stdout.write(f"Resuming after room {last_pk}")
+
+        processed = updated = 0
+        queue_pks = set()
+        started = time.monotonic()
+        while True:
+            chunk = rooms.filter(pk__gt=last_pk) if last_pk else rooms
+            room_rows = list(
+                chunk.values_list("pk", "created_on", "ended_at", "is_active", "queue")[
+                    :chunk_size
+                ]
+            )
+            if not room_rows:
+                break
+
+            room_metrics = compute_room_metrics(
+                [room_row[:4] for room_row in room_rows], metrics
+            )
+            updated += write_room_metrics(room_metrics, batch_size=chunk_size)
+            queue_pks.update(room_row[4] for room_row in room_rows if room_row[4])
+
+            last_pk = str(room_rows[-1][0])
+            redis.set(checkpoint_key, last_pk)
+            processed += len(room_rows)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{processed} rooms processed, {processed / elapsed:.0f} rooms/s"
+            )
+
+        redis.delete(checkpoint_key)
+        if queue_pks:
+            DashboardCache().invalidate_queues(queue_pks)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{updated} room metrics updated. "
+                "Run rebuild_dashboard_rollup to refresh the dashboard rollup."
+            )
+        )
+
+    def checkpoint_key(self, options: dict, metrics: list) -> str:
+        run_options = {
+            "project": sorted(options["project"]),
+            "since": options["since"],
+            "until": options["until"],
+            "metric": sorted(metrics),
+        }
+        options_hash = hashlib.sha256(
+            json.dumps(run_options, sort_keys=True).encode()
+        ).hexdigest()[:16]
+        return f"recompute_room_metrics:{options_hash}"
@@ -0,0 +1,162 @@
+# Generated by Django 4.1.2 on 2026-10-18 20:46
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("queues", "0005_queue_config"),
+        ("projects", "0019_flowstart_contact_data"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("sectors", "0010_alter_sectortag_options"),
+        ("dashboard", "0003_roommetrics_transfer_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomMetricsRollup",
+            fields=[
+                (
+                    "uuid",
+                    models.UUIDField(
+                        default=uuid.uuid4, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "created_on",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created on"),
+                ),
+                (
+                    "modified_on",
+                    models.DateTimeField(auto_now=True, verbose_name="Modified on"),
+                ),
+                ("hour", models.DateTimeField(verbose_name="Hour")),
+                ("rooms", models.IntegerField(default=0, verbose_name="Rooms count")),
+                (
+                    "waiting_time_sum",
+                    models.BigIntegerField(default=0, verbose_name="Waiting time sum"),
+                ),
+                (
+                    "waiting_time_min",
+                    models.IntegerField(default=0, verbose_name="Waiting time min"),
+                ),
+                (
+                    "waiting_time_max",
+                    models.IntegerField(default=0, verbose_name="Waiting time max"),
+                ),
+                (
+                    "message_response_time_sum",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Messages response time sum"
+                    ),
+                ),
+                (
+                    "message_response_time_min",
+                    models.IntegerField(
+                        default=0, verbose_name="Messages response time min"
+                    ),
+                ),
+                (
+                    "message_response_time_max",
+                    models.IntegerField(
+                        default=0, verbose_name="Messages response time max"
+                    ),
+                ),
+                (
+                    "interaction_time_sum",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Interaction time sum"
+                    ),
+                ),
+                (
+                    "interaction_time_min",
+                    models.IntegerField(default=0, verbose_name="Interaction time min"),
+                ),
+                (
+                    "interaction_time_max",
+                    models.IntegerField(default=0, verbose_name="Interaction time max"),
+                ),
+                (
+                    "transfer_count_sum",
+                    models.IntegerField(default=0, verbose_name="Transfer count sum"),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metrics_rollups",
+                        to="projects.project",
+                        verbose_name="Project",
+                    ),
+                ),
+                (
+                    "queue",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metrics_rollups",
+                        to="queues.queue",
+                        verbose_name="Queue",
+                    ),
+                ),
+                (
+                    "sector",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metrics_rollups",
+                        to="sectors.sector",
+                        verbose_name="Sector",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metrics_rollups",
+                        to="sectors.sectortag",
+                        verbose_name="Tag",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metrics_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                        to_field="email",
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Room Metrics Rollup",
+                "verbose_name_plural": "Rooms Metrics Rollups",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="roommetricsrollup",
+            index=models.Index(
+                fields=["project", "hour"], name="dashboard_r_project_ee303c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="roommetricsrollup",
+            index=models.Index(
+                fields=["sector", "hour"], name="dashboard_r_sector__8c6de2_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="roommetricsrollup",
+            index=models.Index(
+                fields=["queue", "user", "hour"], name="dashboard_r_queue_i_a64e5c_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 4.1.2 on 2026-10-18 20:56
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("projects", "0019_flowstart_contact_data"),
+        ("dashboard", "0004_roommetricsrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardExportJob",
+            fields=[
+                (
+                    "uuid",
+                    models.UUIDField(
+                        default=uuid.uuid4, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "created_on",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created on"),
+                ),
+                (
+                    "modified_on",
+                    models.DateTimeField(auto_now=True, verbose_name="Modified on"),
+                ),
+                (
+                    "export_type",
+                    models.CharField(
+                        choices=[("rooms", "rooms"), ("dashboard", "dashboard")],
+                        default="rooms",
+                        max_length=20,
+                        verbose_name="Export type",
+                    ),
+                ),
+                (
+                    "filters",
+                    models.JSONField(blank=True, default=dict, verbose_name="Filters"),
+                ),
+                (
+                    "filters_hash",
+                    models.CharField(
+                        db_index=True, max_length=64, verbose_name="Filters hash"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "pending"),
+                            ("RUNNING", "running"),
+                            ("DONE", "done"),
+                            ("FAILED", "failed"),
+                        ],
+                        default="PENDING",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "progress",
+                    models.IntegerField(default=0, verbose_name="Exported rows"),
+                ),
+                (
+                    "total",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Total rows"
+                    ),
+                ),
+                (
+                    "file_name",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="File name"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Error")),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dashboard_exports",
+                        to="projects.project",
+                        verbose_name="Project",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dashboard_exports",
+                        to=settings.AUTH_USER_MODEL,
+                        to_field="email",
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Dashboard Export Job",
+                "verbose_name_plural": "Dashboard Export Jobs",
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.2 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0005_dashboardexportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="roommetricsrollup",
+            name="sketches",
+            field=models.JSONField(
+                blank=True, default=dict, verbose_name="Quantile sketches"
+            ),
+        ),
+    ]
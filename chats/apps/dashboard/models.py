@@ -1,8 +1,22 @@
-from django.db import models
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django_redis import get_redis_connection
 
+from chats.apps.dashboard.sketches import QuantileSketch
 from chats.core.models import BaseModel
 
+LOGGER = logging.getLogger(__name__)
+
 
 class RoomMetrics(BaseModel):
     room = models.OneToOneField(
@@ -24,6 +38,483 @@ class RoomMetrics(BaseModel):
     def __str__(self):
         return self.room.queue.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.metrics_changed(self.room)
+
     @property
     def project(self):
         return self.room.project
+
+    @classmethod
+    def update_room(cls, room, **values):
+        """
+        Update the metrics of the room on a single query, values may be F() expressions
+        so concurrent updates are not lost. The metrics are created when missing.
+        """
+        if not cls.objects.filter(room=room).update(**values):
+            cls.objects.get_or_create(room=room)
+            cls.objects.filter(room=room).update(**values)
+        cls.metrics_changed(room)
+
+    @classmethod
+    def metrics_changed(cls, room):
+        """Queryset updates skip save(), so they must refresh the dashboard the same way"""
+        if room.queue_id:
+            room.invalidate_dashboard([room.queue_id])
+        if settings.USE_DASHBOARD_ROLLUP and not room.is_active:
+            cls.update_rollup(room)
+
+    @staticmethod
+    def update_rollup(room):
+        """
+        Queue the hourly rollup bucket of the closed room once the transaction is committed,
+        it is recomputed by the refresh_dashboard_rollup task
+        """
+        if room.queue_id is None:
+            return
+        queue_pk, user_pk = room.queue_id, room.user_id
+        hour = RoomMetricsRollup.truncate_hour(room.created_on)
+        transaction.on_commit(
+            lambda: RoomMetricsRollup.objects.mark_pending(queue_pk, user_pk, hour)
+        )
+
+
+class RoomMetricsRollupQuerySet(models.QuerySet):
+    def dashboard_rows(self, start_time, end_time, **tag_filter):
+        """
+        Rows of the hours between start and end. Each room is counted once on the
+        rows without tag and once more on the row of each of its tags, so the tag
+        rows are only read when filtering by a tag.
+        """
+        rows = self.filter(hour__gte=start_time, hour__lte=end_time)
+        if tag_filter:
+            return rows.filter(**tag_filter)
+        return rows.filter(tag__isnull=True)
+
+    def summary(self) -> tuple:
+        """
+        The totals and the percentiles of the rows, read on a single query.
+        The rows of a period are a few per hour, so they are summed while
+        their sketches are merged instead of aggregating them apart.
+        """
+        columns = RoomMetricsRollup.sum_columns()
+        totals = dict.fromkeys(columns, 0)
+        sketches = {field: QuantileSketch() for field in RoomMetricsRollup.time_fields}
+        for row in self.values(*columns, "sketches").iterator():
+            for column in columns:
+                totals[column] += row[column]
+            for field, sketch in sketches.items():
+                sketch.merge(QuantileSketch.from_dict(row["sketches"].get(field)))
+        return totals, RoomMetricsRollup.percentiles(sketches)
+
+    def percentiles(self) -> dict:
+        """Dashboard percentiles of the rows, merging their sketches"""
+        sketches = {field: QuantileSketch() for field in RoomMetricsRollup.time_fields}
+        for row_sketches in self.values_list("sketches", flat=True).iterator():
+            for field, sketch in sketches.items():
+                sketch.merge(QuantileSketch.from_dict(row_sketches.get(field)))
+        return RoomMetricsRollup.percentiles(sketches)
+
+
+class RoomMetricsRollupManager(models.Manager.from_queryset(RoomMetricsRollupQuerySet)):
+    pending_key = "dashboard_rollup:pending"
+
+    def rollup_rows(self, metrics) -> list:
+        """Aggregate the metrics of the closed rooms into unsaved rollup rows"""
+        aggregates = {
+            "rooms": Count("pk"),
+            "transfer_count_sum": Sum("transfer_count"),
+        }
+        for field in RoomMetricsRollup.time_fields:
+            aggregates[f"{field}_sum"] = Sum(field)
+            aggregates[f"{field}_min"] = Min(field)
+            aggregates[f"{field}_max"] = Max(field)
+
+        bucket = (
+            "room__queue__sector__project",
+            "room__queue__sector",
+            "room__queue",
+            "room__user",
+            "hour",
+        )
+        metrics = (
+            metrics.filter(room__is_active=False, room__queue__isnull=False)
+            .annotate(hour=TruncHour("room__created_on", tzinfo=dt_timezone.utc))
+            .order_by()
+        )
+        tagged_metrics = metrics.filter(room__tags__isnull=False)
+        rows = list(metrics.values(*bucket).annotate(**aggregates))
+        rows += list(
+            tagged_metrics.values(*bucket, "room__tags").annotate(**aggregates)
+        )
+
+        sketches = self.bucket_sketches(metrics, bucket)
+        sketches.update(self.bucket_sketches(tagged_metrics, bucket + ("room__tags",)))
+        rollups = []
+        for row in rows:
+            row_bucket = tuple(row.pop(field, None) for field in bucket) + (
+                row.pop("room__tags", None),
+            )
+            project_pk, sector_pk, queue_pk, user_pk, hour, tag_pk = row_bucket
+            rollups.append(
+                self.model(
+                    project_id=project_pk,
+                    sector_id=sector_pk,
+                    queue_id=queue_pk,
+                    user_id=user_pk,
+                    hour=hour,
+                    tag_id=tag_pk,
+                    sketches={
+                        field: sketch.to_dict()
+                        for field, sketch in sketches[row_bucket].items()
+                    },
+                    **row,
+                )
+            )
+        return rollups
+
+    def bucket_sketches(self, metrics, bucket: tuple) -> dict:
+        """Quantile sketches of the time fields of each bucket, keyed as (project, sector, queue, user, hour, tag)"""
+        time_fields = RoomMetricsRollup.time_fields
+        sketches = {}
+        size = len(bucket)
+        for values in metrics.values_list(*bucket, *time_fields).iterator():
+            row_bucket, times = values[:size], values[size:]
+            if "room__tags" not in bucket:
+                row_bucket += (None,)
+            bucket_sketches = sketches.setdefault(
+                row_bucket, {field: QuantileSketch() for field in time_fields}
+            )
+            for field, value in zip(time_fields, times):
+                bucket_sketches[field].add(value)
+        return sketches
+
+    def refresh_bucket(self, queue_pk, user_pk, hour):
+        """
+        Recompute the rows of an agent on a queue for one hour from the room metrics.
+        Closing rooms of the same bucket are serialized by a redis lock, so one
+        refresh does not delete the rows another one is about to replace.
+        """
+        metrics = RoomMetrics.objects.filter(
+            room__queue=queue_pk,
+            room__created_on__gte=hour,
+            room__created_on__lt=hour + timedelta(hours=1),
+        )
+        rollups = self.filter(queue=queue_pk, hour=hour)
+        if user_pk is None:
+            metrics = metrics.filter(room__user__isnull=True)
+            rollups = rollups.filter(user__isnull=True)
+        else:
+            metrics = metrics.filter(room__user=user_pk)
+            rollups = rollups.filter(user=user_pk)
+
+        lock = get_redis_connection().lock(
+            f"dashboard_rollup:{queue_pk}:{user_pk}:{hour.isoformat()}",
+            timeout=settings.DASHBOARD_ROLLUP_LOCK_TIMEOUT,
+        )
+        with lock, transaction.atomic():
+            rollups.delete()
+            self.bulk_create(self.rollup_rows(metrics))
+
+    def mark_pending(self, queue_pk, user_pk, hour):
+        """Queue a bucket to be refreshed, a bucket queued many times is refreshed once"""
+        get_redis_connection().sadd(
+            self.pending_key, json.dumps([str(queue_pk), user_pk, hour.isoformat()])
+        )
+
+    def refresh_pending(self, count: int) -> int:
+        """
+        Refresh up to count of the queued buckets. Returns how many were refreshed.
+        A bucket that fails is queued again for the next run, the others are still refreshed.
+        """
+        redis_connection = get_redis_connection()
+        refreshed = 0
+        for bucket in redis_connection.spop(self.pending_key, count) or []:
+            queue_pk, user_pk, hour = json.loads(bucket)
+            try:
+                self.refresh_bucket(queue_pk, user_pk, datetime.fromisoformat(hour))
+            except Exception:
+                LOGGER.exception("Could not refresh the dashboard rollup %s", bucket)
+                redis_connection.sadd(self.pending_key, bucket)
+                continue
+            refreshed += 1
+        return refreshed
+
+    def rebuild(self, metrics, rollups, batch_size: int = 1000) -> int:
+        """Replace the rollup rows with the aggregation of the given metrics"""
+        with transaction.atomic():
+            rollups.delete()
+            rows = self.bulk_create(self.rollup_rows(metrics), batch_size=batch_size)
+        return len(rows)
+
+
+class RoomMetricsRollup(BaseModel):
+    """
+    Metrics of the closed rooms summed per project, sector, queue, agent,
+    tag and the hour the room was created, so the dashboard reads a few
+    rows per hour instead of joining every room of the period.
+
+    Kept only with USE_DASHBOARD_ROLLUP: the buckets of the closed rooms are
+    queued when their metrics change and recomputed by refresh_dashboard_rollup,
+    so the date range answers lag the closes by up to that task interval.
+    Unlike the queries over the rooms, the rollup only holds closed rooms,
+    bucketed by the room creation: the metrics of rooms still active in the
+    range are not averaged, the division rooms are not picked by the metric
+    creation, and the agents closed rooms include the rooms created in the
+    range and closed after its end.
+    """
+
+    time_fields = ("waiting_time", "message_response_time", "interaction_time")
+    dashboard_names = {
+        "waiting_time": "waiting_time",
+        "message_response_time": "response_time",
+        "interaction_time": "interact_time",
+    }
+
+    project = models.ForeignKey(
+        "projects.Project",
+        related_name="metrics_rollups",
+        verbose_name=_("Project"),
+        on_delete=models.CASCADE,
+    )
+    sector = models.ForeignKey(
+        "sectors.Sector",
+        related_name="metrics_rollups",
+        verbose_name=_("Sector"),
+        on_delete=models.CASCADE,
+    )
+    queue = models.ForeignKey(
+        "queues.Queue",
+        related_name="metrics_rollups",
+        verbose_name=_("Queue"),
+        on_delete=models.CASCADE,
+    )
+    user = models.ForeignKey(
+        "accounts.User",
+        related_name="metrics_rollups",
+        verbose_name=_("user"),
+        on_delete=models.CASCADE,
+        to_field="email",
+        blank=True,
+        null=True,
+    )
+    tag = models.ForeignKey(
+        "sectors.SectorTag",
+        related_name="metrics_rollups",
+        verbose_name=_("Tag"),
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+    )
+    hour = models.DateTimeField(_("Hour"))
+
+    rooms = models.IntegerField(_("Rooms count"), default=0)
+    waiting_time_sum = models.BigIntegerField(_("Waiting time sum"), default=0)
+    waiting_time_min = models.IntegerField(_("Waiting time min"), default=0)
+    waiting_time_max = models.IntegerField(_("Waiting time max"), default=0)
+    message_response_time_sum = models.BigIntegerField(
+        _("Messages response time sum"), default=0
+    )
+    message_response_time_min = models.IntegerField(
+        _("Messages response time min"), default=0
+    )
+    message_response_time_max = models.IntegerField(
+        _("Messages response time max"), default=0
+    )
+    interaction_time_sum = models.BigIntegerField(_("Interaction time sum"), default=0)
+    interaction_time_min = models.IntegerField(_("Interaction time min"), default=0)
+    interaction_time_max = models.IntegerField(_("Interaction time max"), default=0)
+    transfer_count_sum = models.IntegerField(_("Transfer count sum"), default=0)
+    sketches = models.JSONField(_("Quantile sketches"), default=dict, blank=True)
+
+    objects = RoomMetricsRollupManager()
+
+    class Meta:
+        verbose_name = _("Room Metrics Rollup")
+        verbose_name_plural = _("Rooms Metrics Rollups")
+        indexes = [
+            models.Index(fields=["project", "hour"]),
+            models.Index(fields=["sector", "hour"]),
+            models.Index(fields=["queue", "user", "hour"]),
+        ]
+
+    def __str__(self):
+        return f"{self.queue.name} {self.hour}"
+
+    @staticmethod
+    def truncate_hour(date):
+        return date.astimezone(dt_timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        )
+
+    @classmethod
+    def sum_columns(cls) -> list:
+        return ["rooms", "transfer_count_sum"] + [
+            f"{field}_sum" for field in cls.time_fields
+        ]
+
+    @classmethod
+    def sum_aggregates(cls, prefix: str = "", filter=None) -> dict:
+        """Sums of the rollup columns, to be used on aggregate() or annotate()"""
+        return {
+            column: Coalesce(Sum(f"{prefix}{column}", filter=filter), 0)
+            for column in cls.sum_columns()
+        }
+
+    @classmethod
+    def averages(cls, totals: dict) -> dict:
+        """Dashboard averages from the summed columns"""
+        rooms = totals.get("rooms") or 0
+        return {
+            "waiting_time": totals["waiting_time_sum"] / rooms if rooms else None,
+            "response_time": totals["message_response_time_sum"] / rooms
+            if rooms
+            else None,
+            "interact_time": totals["interaction_time_sum"] / rooms if rooms else None,
+        }
+
+    @classmethod
+    def percentiles(cls, sketches: dict) -> dict:
+        """Dashboard percentiles from the merged sketches of each time field"""
+        percentiles = {}
+        for field, sketch in sketches.items():
+            percentiles.update(sketch.percentiles(cls.dashboard_names[field]))
+        return percentiles
+
+
+class DashboardExportJob(BaseModel):
+    """An xlsx export of the dashboard, written in background and uploaded to the storage"""
+
+    TYPE_ROOMS = "rooms"
+    TYPE_DASHBOARD = "dashboard"
+
+    TYPE_CHOICES = [
+        (TYPE_ROOMS, _("rooms")),
+        (TYPE_DASHBOARD, _("dashboard")),
+    ]
+
+    STATUS_PENDING = "PENDING"
+    STATUS_RUNNING = "RUNNING"
+    STATUS_DONE = "DONE"
+    STATUS_FAILED = "FAILED"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, _("pending")),
+        (STATUS_RUNNING, _("running")),
+        (STATUS_DONE, _("done")),
+        (STATUS_FAILED, _("failed")),
+    ]
+
+    project = models.ForeignKey(
+        "projects.Project",
+        related_name="dashboard_exports",
+        verbose_name=_("Project"),
+        on_delete=models.CASCADE,
+    )
+    user = models.ForeignKey(
+        "accounts.User",
+        related_name="dashboard_exports",
+        verbose_name=_("user"),
+        on_delete=models.CASCADE,
+        to_field="email",
+    )
+    export_type = models.CharField(
+        _("Export type"), max_length=20, choices=TYPE_CHOICES, default=TYPE_ROOMS
+    )
+    filters = models.JSONField(_("Filters"), default=dict, blank=True)
+    filters_hash = models.CharField(_("Filters hash"), max_length=64, db_index=True)
+    status = models.CharField(
+        _("Status"), max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    progress = models.IntegerField(_("Exported rows"), default=0)
+    total = models.IntegerField(_("Total rows"), null=True, blank=True)
+    file_name = models.CharField(_("File name"), max_length=255, blank=True)
+    error = models.TextField(_("Error"), blank=True)
+
+    class Meta:
+        verbose_name = _("Dashboard Export Job")
+        verbose_name_plural = _("Dashboard Export Jobs")
+
+    def __str__(self):
+        return f"{self.project.name} {self.export_type} {self.status}"
+
+    @staticmethod
+    def hash_filters(filters: dict) -> str:
+        return hashlib.sha256(
+            json.dumps(filters, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    @classmethod
+    def request(cls, project, user, export_type: str, filters: dict):
+        """
+        Create the export job, or return the one for the same filters that is still
+        running or was created within DASHBOARD_EXPORT_DEDUP_WINDOW, so repeated
+        requests do not export twice. Jobs unfinished after DASHBOARD_EXPORT_LOCK_TIMEOUT
+        are taken as lost.
+        """
+        filters_hash = cls.hash_filters(filters)
+        lock = get_redis_connection().lock(
+            f"dashboard_export:{project.pk}:{user.pk}:{export_type}:{filters_hash}",
+            timeout=settings.DASHBOARD_EXPORT_LOCK_TIMEOUT,
+        )
+        now = timezone.now()
+        recent = Q(
+            created_on__gte=now
+            - timedelta(seconds=settings.DASHBOARD_EXPORT_DEDUP_WINDOW)
+        )
+        running = Q(
+            status__in=[cls.STATUS_PENDING, cls.STATUS_RUNNING],
+            created_on__gte=now
+            - timedelta(seconds=settings.DASHBOARD_EXPORT_LOCK_TIMEOUT),
+        )
+        with lock:
+            job = (
+                cls.objects.filter(
+                    recent | running,
+                    project=project,
+                    user=user,
+                    export_type=export_type,
+                    filters_hash=filters_hash,
+                )
+                .exclude(status=cls.STATUS_FAILED)
+                .order_by("-created_on")
+                .first()
+            )
+            if job is not None:
+                return job, False
+            job = cls.objects.create(
+                project=project,
+                user=user,
+                export_type=export_type,
+                filters=filters,
+                filters_hash=filters_hash,
+            )
+        job.enqueue()
+        return job, True
+
+    def enqueue(self):
+        """Start the export once the job is committed, on a background thread without celery"""
+        from chats.apps.dashboard.tasks import (
+            exports_executor,
+            run_dashboard_export,
+            run_dashboard_export_in_background,
+        )
+
+        job_pk = str(self.pk)
+        if settings.USE_CELERY:
+            transaction.on_commit(
+                lambda: run_dashboard_export.apply_async(
+                    args=[job_pk], queue=settings.EXPORTS_CUSTOM_QUEUE
+                )
+            )
+        else:
+            transaction.on_commit(
+                lambda: exports_executor.submit(
+                    run_dashboard_export_in_background, job_pk
+                )
+            )
+
+    def update_progress(self, progress: int):
+        self.progress = progress
+        DashboardExportJob.objects.filter(pk=self.pk).update(progress=progress)
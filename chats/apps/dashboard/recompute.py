@@ -0,0 +1,160 @@
+import json
+
+import pandas as pd
+
+from chats.apps.dashboard.models import RoomMetrics
+from chats.apps.msgs.models import Message
+
+METRIC_FIELDS = {
+    "interaction": ["interaction_time"],
+    "response": ["message_response_time"],
+    "waiting": ["waiting_time", "queued_count"],
+}
+
+ROUTING_FEEDBACK_PREFIX = '{"method": "rt"'
+
+
+def seconds(deltas: pd.Series) -> pd.Series:
+    return deltas.dt.total_seconds().fillna(0).astype(int)
+
+
+def interaction_times(rooms: pd.DataFrame) -> pd.DataFrame:
+    closed = rooms[~rooms["is_active"] & rooms["ended_at"].notna()]
+    return pd.DataFrame(
+        {"interaction_time": seconds(closed["ended_at"] - closed["created_on"])}
+    )
+
+
+def response_times(messages: pd.DataFrame) -> pd.DataFrame:
+    """Time between the first contact message and the first agent message after it"""
+    first_contact = (
+        messages[messages["is_contact"]]
+        .groupby("room")["created_on"]
+        .min()
+        .rename("first_contact")
+    )
+    agent_messages = messages[messages["is_agent"]].join(first_contact, on="room")
+    replies = agent_messages[
+        agent_messages["created_on"] >= agent_messages["first_contact"]
+    ]
+    first_reply = replies.groupby("room")["created_on"].min()
+    return pd.DataFrame(
+        {
+            "message_response_time": seconds(
+                first_reply - first_contact.reindex(first_reply.index)
+            )
+        }
+    )
+
+
+def waiting_times(rooms: pd.DataFrame, feedbacks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Time the rooms spent on queues, replaying the routing feedback messages.
+    A room enters a queue when it is created or transferred to a queue, and
+    leaves it when a feedback moves it from the queue to an agent.
+    """
+    creations = rooms[["created_on"]].reset_index().assign(enters=True, leaves=False)
+    events = pd.concat([creations, feedbacks], ignore_index=True).sort_values(
+        ["room", "created_on"], kind="stable"
+    )
+    enters = events["enters"].astype(bool)
+    events["entered_at"] = (
+        events["created_on"].where(enters).groupby(events["room"]).ffill()
+    )
+    exits = events[events["leaves"].astype(bool)]
+    waits = (exits["created_on"] - exits["entered_at"]).dt.total_seconds()
+    grouped = waits.groupby(exits["room"])
+    metrics = pd.DataFrame(
+        {"waiting_time": grouped.sum(), "queued_count": grouped.count()}
+    ).reindex(rooms.index, fill_value=0)
+    return metrics.astype(int)
+
+
+def parse_feedback(text: str) -> dict:
+    try:
+        return json.loads(text).get("content") or {}
+    except (TypeError, ValueError, AttributeError):
+        return {}
+
+
+def routing_feedbacks(room_pks) -> pd.DataFrame:
+    """Queue entries and exits of the rooms from their routing feedback messages"""
+    rows = Message.objects.filter(
+        room__in=room_pks,
+        user__isnull=True,
+        contact__isnull=True,
+        text__startswith=ROUTING_FEEDBACK_PREFIX,
+    ).values_list("room", "created_on", "text")
+    feedbacks = pd.DataFrame(list(rows), columns=["room", "created_on", "text"])
+    content = pd.json_normalize(feedbacks["text"].map(parse_feedback).tolist())
+    from_type = content.get("from.type", pd.Series("", index=content.index))
+    to_type = content.get("to.type", pd.Series("", index=content.index))
+    feedbacks["enters"] = (to_type == "queue").values
+    feedbacks["leaves"] = ((to_type == "user") & (from_type != "user")).values
+    return feedbacks.drop(columns="text")
+
+
+def room_messages(room_pks) -> pd.DataFrame:
+    rows = (
+        Message.objects.filter(room__in=room_pks)
+        .exclude(user__isnull=True, contact__isnull=True)
+        .values_list("room", "created_on", "contact")
+    )
+    messages = pd.DataFrame(list(rows), columns=["room", "created_on", "contact"])
+    messages["is_contact"] = messages["contact"].notna()
+    messages["is_agent"] = ~messages["is_contact"]
+    return messages
+
+
+def compute_room_metrics(room_rows: list, fields: list) -> pd.DataFrame:
+    """
+    Metrics of a chunk of (pk, created_on, ended_at, is_active) rooms, indexed
+    by the room pk, with one column per recomputed metric field. The messages
+    of the whole chunk are read on one query per metric.
+    """
+    rooms = pd.DataFrame(
+        room_rows, columns=["room", "created_on", "ended_at", "is_active"]
+    ).set_index("room")
+    rooms["created_on"] = pd.to_datetime(rooms["created_on"], utc=True)
+    rooms["ended_at"] = pd.to_datetime(rooms["ended_at"], utc=True)
+
+    frames = []
+    if "interaction" in fields:
+        frames.append(interaction_times(rooms))
+    if "response" in fields:
+        messages = room_messages(rooms.index.tolist())
+        messages["created_on"] = pd.to_datetime(messages["created_on"], utc=True)
+        frames.append(response_times(messages))
+    if "waiting" in fields:
+        feedbacks = routing_feedbacks(rooms.index.tolist())
+        feedbacks["created_on"] = pd.to_datetime(feedbacks["created_on"], utc=True)
+        frames.append(waiting_times(rooms, feedbacks))
+    return pd.concat(frames, axis=1).reindex(rooms.index)
+
+
+def write_room_metrics(metrics: pd.DataFrame, batch_size: int) -> int:
+    """Save the computed metrics with bulk queries, creating the missing ones"""
+    existing = set(
+        RoomMetrics.objects.filter(room__in=metrics.index.tolist()).values_list(
+            "room", flat=True
+        )
+    )
+    RoomMetrics.objects.bulk_create(
+        [
+            RoomMetrics(room_id=room_pk)
+            for room_pk in metrics.index
+            if room_pk not in existing
+        ],
+        batch_size=batch_size,
+    )
+
+    room_values = metrics.to_dict("index")
+    updated = []
+    for room_metric in RoomMetrics.objects.filter(room__in=metrics.index.tolist()):
+        for field, value in room_values[room_metric.room_id].items():
+            if pd.notna(value):
+                setattr(room_metric, field, int(value))
+        updated.append(room_metric)
+    return RoomMetrics.objects.bulk_update(
+        updated, list(metrics.columns), batch_size=batch_size
+    )
@@ -0,0 +1,87 @@
+import math
+from collections import Counter
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch (DDSketch) of non negative durations.
+
+    Values are counted on logarithmic bins, so any quantile is estimated with
+    a relative error under RELATIVE_ACCURACY whatever the distribution, and
+    sketches of different rollup rows are merged by adding their bin counts.
+    Durations under one second are counted on the zero bin.
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self, bins: dict = None, zero_count: int = 0):
+        self.bins = Counter(bins or {})
+        self.zero_count = zero_count
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def key(self, value) -> int:
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def value(self, key: int) -> float:
+        """The estimate of the values counted on a bin, within the relative accuracy of all of them"""
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def add(self, value, count: int = 1):
+        if value is None:
+            return
+        if value < 1:
+            self.zero_count += count
+        else:
+            self.bins[self.key(value)] += count
+
+    def merge(self, other: "QuantileSketch"):
+        self.bins.update(other.bins)
+        self.zero_count += other.zero_count
+        return self
+
+    def quantile(self, q: float):
+        """The value whose rank is q * (count - 1), None when the sketch is empty"""
+        count = self.count
+        if count == 0:
+            return None
+        rank = q * (count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.bins))
+
+    def percentiles(self, name: str) -> dict:
+        """The dashboard percentiles of the sketch, as {name_p50: value, ...}"""
+        return {f"{name}_p{round(q * 100)}": self.quantile(q) for q in self.QUANTILES}
+
+    def to_dict(self) -> dict:
+        return {
+            "zero": self.zero_count,
+            "bins": {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        data = data or {}
+        return cls(
+            bins={int(key): count for key, count in data.get("bins", {}).items()},
+            zero_count=data.get("zero", 0),
+        )
+
+    @classmethod
+    def from_values(cls, values) -> "QuantileSketch":
+        sketch = cls()
+        for value in values:
+            sketch.add(value)
+        return sketch
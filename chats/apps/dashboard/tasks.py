@@ -1,36 +1,72 @@
-from chats.apps.dashboard.models import RoomMetrics
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from sentry_sdk import capture_exception
+
+from chats.apps.dashboard.models import (
+    DashboardExportJob,
+    RoomMetrics,
+    RoomMetricsRollup,
+)
 from chats.apps.rooms.models import Room
 from chats.celery import app
 
+# without celery the exports run one at a time, off the requests that create them
+exports_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exports")
+
 
 def generate_metrics(room: str):
+    """
+    Set the interaction time of the closed room. The response and waiting times
+    are accounted when they happen, so closing does not scan the room messages.
+    """
     room = Room.objects.get(pk=room)
-    messages_contact = (
-        room.messages.filter(contact__isnull=False).order_by("created_on").first()
-    )
-    messages_agent = (
-        room.messages.filter(user__isnull=False).order_by("created_on").first()
+    interaction_time = room.ended_at - room.created_on
+    RoomMetrics.update_room(
+        room, interaction_time=int(interaction_time.total_seconds())
     )
 
-    time_message_contact = 0
-    time_message_agent = 0
 
-    if messages_agent and messages_contact:
-        time_message_agent = messages_agent.created_on.timestamp()
-        time_message_contact = messages_contact.created_on.timestamp()
-    else:
-        time_message_agent = 0
-        time_message_contact = 0
+@app.task(name="close_metrics")
+def close_metrics(room: str):
+    generate_metrics(room)
 
-    difference_time = time_message_agent - time_message_contact
-    interaction_time = room.ended_at - room.created_on
 
-    metric_room = RoomMetrics.objects.get_or_create(room=room)[0]
-    metric_room.message_response_time = difference_time
-    metric_room.interaction_time = interaction_time.total_seconds()
-    metric_room.save()
+@app.task(name="refresh_dashboard_rollup")
+def refresh_dashboard_rollup():
+    """Recompute the rollup buckets of the rooms closed or updated since the last run"""
+    if not settings.USE_DASHBOARD_ROLLUP:
+        return 0
+    return RoomMetricsRollup.objects.refresh_pending(
+        settings.DASHBOARD_ROLLUP_BATCH_SIZE
+    )
 
 
-@app.task(name="close_metrics")
-def close_metrics(room: str):
-    generate_metrics(room)
+@app.task(name="run_dashboard_export")
+def run_dashboard_export(job_pk: str):
+    from chats.apps.api.v1.dashboard.exports import run_export_job
+
+    job = DashboardExportJob.objects.select_related("project", "user").get(pk=job_pk)
+    DashboardExportJob.objects.filter(pk=job.pk).update(
+        status=DashboardExportJob.STATUS_RUNNING
+    )
+    try:
+        file_name = run_export_job(job)
+    except Exception as error:
+        capture_exception(error)
+        DashboardExportJob.objects.filter(pk=job.pk).update(
+            status=DashboardExportJob.STATUS_FAILED, error=str(error)
+        )
+        return
+    DashboardExportJob.objects.filter(pk=job.pk).update(
+        status=DashboardExportJob.STATUS_DONE, file_name=file_name
+    )
+
+
+def run_dashboard_export_in_background(job_pk: str):
+    """Run the export on the exports thread, which closes its database connection after it"""
+    try:
+        run_dashboard_export(job_pk)
+    finally:
+        connection.close()
@@ -0,0 +1,91 @@
+from unittest.mock import Mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from chats.apps.accounts.models import User
+from chats.apps.api.v1.dashboard.serializers import dashboard_general_data
+from chats.apps.dashboard.cache import DashboardCache
+from chats.apps.dashboard.models import RoomMetrics
+from chats.apps.rooms.models import Room
+
+
+class DashboardCacheTests(TestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.room = Room.objects.get(pk="8ecb1e4a-b457-4645-a161-e2b02ddffa88")
+        self.sector = self.room.queue.sector
+        self.project = self.sector.project
+        self.cache = DashboardCache()
+        self.params = {"scope": "all"}
+        self.cache.redis.delete(
+            self.cache.version_key(self.project.pk),
+            self.cache.version_key(self.project.pk, self.sector.pk),
+            *self.cache.redis.keys(f"dashboard:{self.project.pk}:*"),
+        )
+
+    def entry_key(self):
+        return self.cache.entry_key("test", self.params, self.project.pk)
+
+    def get_or_compute(self, value):
+        compute = Mock(return_value=value)
+        data = self.cache.get_or_compute("test", self.params, compute, self.project.pk)
+        return data, compute.call_count
+
+    def test_values_are_computed_once_per_version(self):
+        self.assertEqual(self.get_or_compute({"total": 1}), ({"total": 1}, 1))
+        self.assertEqual(self.get_or_compute({"total": 2}), ({"total": 1}, 0))
+
+        self.cache.invalidate_queues([self.room.queue_id])
+
+        self.assertEqual(self.get_or_compute({"total": 2}), ({"total": 2}, 1))
+
+    def test_outdated_value_is_served_while_another_request_recomputes(self):
+        self.get_or_compute({"total": 1})
+        self.cache.invalidate_queues([self.room.queue_id])
+
+        lock = self.cache.redis.lock(f"{self.entry_key()}:lock", timeout=10)
+        lock.acquire()
+        try:
+            self.assertEqual(self.get_or_compute({"total": 2}), ({"total": 1}, 0))
+        finally:
+            lock.release()
+
+    def test_closing_room_invalidates_its_sector_and_project(self):
+        version_keys = [
+            self.cache.version_key(self.project.pk),
+            self.cache.version_key(self.project.pk, self.sector.pk),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.close()
+
+        self.assertEqual(self.cache.redis.mget(version_keys), [b"1", b"1"])
+
+    def test_creating_room_invalidates_its_sector_and_project(self):
+        version_keys = [
+            self.cache.version_key(self.project.pk),
+            self.cache.version_key(self.project.pk, self.sector.pk),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(queue=self.room.queue)
+        self.assertEqual(self.cache.redis.mget(version_keys), [b"1", b"1"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(queue=self.room.queue, user=self.room.user)
+        self.assertEqual(self.cache.redis.mget(version_keys), [b"2", b"2"])
+
+    def test_general_data_is_updated_when_room_metrics_change(self):
+        context = {
+            "user_request": User.objects.get(email="brucebanner@chats.weni.ai"),
+            "sector": str(self.sector.pk),
+        }
+        Room.objects.filter(pk=self.room.pk).update(created_on=timezone.now())
+        self.assertIsNone(dashboard_general_data(context, self.project)["waiting_time"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RoomMetrics.objects.create(room=self.room, waiting_time=30)
+
+        self.assertEqual(
+            dashboard_general_data(context, self.project)["waiting_time"], 30
+        )
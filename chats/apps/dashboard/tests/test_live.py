@@ -0,0 +1,118 @@
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from chats.apps.accounts.models import User
+from chats.apps.dashboard.live import dashboard_group_name, room_deltas
+from chats.apps.queues.models import Queue
+from chats.apps.rooms.models import Room
+
+
+class RoomDeltasTests(TestCase):
+    sectors = {"queue_a": "sector_a", "queue_b": "sector_a", "queue_c": "sector_b"}
+
+    def test_assigning_a_queued_room(self):
+        deltas = room_deltas(
+            (True, None, "queue_a"), (True, "agent@chats.com", "queue_a"), self.sectors
+        )
+
+        counters, agents = deltas["sector_a"]
+        self.assertEqual(counters, {"queue_rooms": -1, "active_chats": 1})
+        self.assertEqual(agents, {"agent@chats.com": {"opened_rooms": 1}})
+
+    def test_transferring_between_sectors(self):
+        deltas = room_deltas(
+            (True, "agent@chats.com", "queue_a"), (True, None, "queue_c"), self.sectors
+        )
+
+        self.assertEqual(deltas["sector_a"][0], {"active_chats": -1})
+        self.assertEqual(
+            deltas["sector_a"][1], {"agent@chats.com": {"opened_rooms": -1}}
+        )
+        self.assertEqual(deltas["sector_b"], ({"queue_rooms": 1}, {}))
+
+    def test_moving_inside_a_sector_does_not_change_its_counters(self):
+        deltas = room_deltas(
+            (True, None, "queue_a"), (True, None, "queue_b"), self.sectors
+        )
+
+        counters, agents = deltas["sector_a"]
+        self.assertFalse(any(counters.values()))
+        self.assertEqual(agents, {})
+
+
+@override_settings(USE_DASHBOARD_LIVE=True)
+@patch("chats.apps.dashboard.live.notify_channels_group")
+class RoomLiveDashboardTests(TestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.room = Room.objects.get(pk="8ecb1e4a-b457-4645-a161-e2b02ddffa88")
+        self.sector = self.room.queue.sector
+        self.project = self.sector.project
+
+    def sent_contents(self, notify_channels_group):
+        return {
+            call.kwargs["group_name"]: call.kwargs["content"]
+            for call in notify_channels_group.call_args_list
+        }
+
+    def test_closing_a_room_is_pushed_to_the_sector_and_project(
+        self, notify_channels_group
+    ):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.close()
+
+        contents = self.sent_contents(notify_channels_group)
+        expected = {
+            "room": str(self.room.pk),
+            "sector": str(self.sector.pk),
+            "active_chats": -1,
+            "closed_rooms": 1,
+            "agents": {
+                self.room.user_id: {"opened_rooms": -1, "closed_rooms": 1},
+            },
+        }
+        self.assertEqual(
+            contents,
+            {
+                dashboard_group_name(sector_pk=self.sector.pk): expected,
+                dashboard_group_name(project_pk=self.project.pk): expected,
+            },
+        )
+
+    def test_transferring_a_room_moves_the_agents_counters(self, notify_channels_group):
+        previous_agent = self.room.user_id
+        self.room.user = User.objects.exclude(email=previous_agent).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.save()
+
+        content = self.sent_contents(notify_channels_group)[
+            dashboard_group_name(sector_pk=self.sector.pk)
+        ]
+        self.assertNotIn("active_chats", content)
+        self.assertEqual(
+            content["agents"],
+            {
+                self.room.user_id: {"opened_rooms": 1},
+                previous_agent: {"opened_rooms": -1},
+            },
+        )
+
+    def test_moving_the_room_inside_the_sector_is_not_pushed(
+        self, notify_channels_group
+    ):
+        self.room.queue = Queue.objects.filter(sector=self.sector).exclude(
+            pk=self.room.queue_id
+        )[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.save()
+
+        notify_channels_group.assert_not_called()
+
+    @override_settings(USE_DASHBOARD_LIVE=False)
+    def test_nothing_is_pushed_when_disabled(self, notify_channels_group):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.close()
+
+        notify_channels_group.assert_not_called()
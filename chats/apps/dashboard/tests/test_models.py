@@ -0,0 +1,248 @@
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from chats.apps.accounts.models import User
+from chats.apps.api.v1.dashboard.serializers import (
+    dashboard_agents_data,
+    dashboard_division_data,
+    dashboard_general_data,
+)
+from chats.apps.dashboard.models import RoomMetrics, RoomMetricsRollup
+from chats.apps.dashboard.tasks import refresh_dashboard_rollup
+from chats.apps.msgs.models import Message
+from chats.apps.rooms.models import Room
+from chats.apps.rooms.views import close_room
+
+
+class RoomMetricsTests(TestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.room = Room.objects.get(pk="090da6d1-959e-4dea-994a-41bf0d38ba26")
+        self.metric = RoomMetrics.objects.create(room=self.room)
+
+    def test_response_time_is_captured_on_the_first_agent_reply(self):
+        now = timezone.now()
+        self.room.first_contact_message_at = now - timedelta(seconds=50)
+        self.room.capture_response_time(now - timedelta(seconds=20))
+        self.room.capture_response_time(now)
+
+        self.metric.refresh_from_db()
+        self.room.refresh_from_db()
+        self.assertEqual(self.metric.message_response_time, 30)
+        self.assertEqual(self.room.first_agent_reply_at, now - timedelta(seconds=20))
+
+    def test_agent_messages_before_the_contact_are_not_replies(self):
+        message = Message.objects.create(room=self.room, user_id=self.room.user_id)
+
+        self.room.refresh_from_db()
+        self.assertIsNone(self.room.first_agent_reply_at)
+
+        Message.objects.create(room=self.room, contact_id=self.room.contact_id)
+        Message.objects.create(room=self.room, user_id=self.room.user_id)
+        Message.objects.create(room=self.room, contact_id=self.room.contact_id)
+
+        self.room.refresh_from_db()
+        self.assertGreater(self.room.first_agent_reply_at, message.created_on)
+        self.assertLessEqual(
+            self.room.first_contact_message_at, self.room.first_agent_reply_at
+        )
+
+    def test_concurrent_updates_are_not_lost(self):
+        stale_room = Room.objects.get(pk=self.room.pk)
+        RoomMetrics.update_room(self.room, transfer_count=F("transfer_count") + 1)
+        RoomMetrics.update_room(stale_room, transfer_count=F("transfer_count") + 1)
+
+        self.metric.refresh_from_db()
+        self.assertEqual(self.metric.transfer_count, 2)
+
+    def test_missing_metrics_are_created(self):
+        self.metric.delete()
+        RoomMetrics.update_room(self.room, queued_count=F("queued_count") + 1)
+
+        self.assertEqual(RoomMetrics.objects.get(room=self.room).queued_count, 1)
+
+    def test_closing_sets_the_interaction_time_without_reading_messages(self):
+        self.room.close()
+        Room.objects.filter(pk=self.room.pk).update(
+            created_on=self.room.ended_at - timedelta(seconds=90)
+        )
+
+        with self.assertNumQueries(2):
+            close_room(str(self.room.pk))
+
+        self.metric.refresh_from_db()
+        self.assertEqual(self.metric.interaction_time, 90)
+
+    @override_settings(USE_CELERY=True)
+    @patch("chats.apps.rooms.views.generate_metrics")
+    @patch("chats.apps.rooms.views.close_metrics")
+    def test_closing_with_celery_leaves_the_request(
+        self, close_metrics, generate_metrics
+    ):
+        with self.captureOnCommitCallbacks(execute=True):
+            close_room(str(self.room.pk))
+
+        close_metrics.apply_async.assert_called_once()
+        generate_metrics.assert_not_called()
+
+
+@override_settings(USE_DASHBOARD_ROLLUP=True)
+class RoomMetricsRollupTests(TestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        get_redis_connection().delete(RoomMetricsRollup.objects.pending_key)
+        self.room = Room.objects.get(pk="8ecb1e4a-b457-4645-a161-e2b02ddffa88")
+        self.project = self.room.queue.sector.project
+        self.context = {
+            "user_request": User.objects.get(email="brucebanner@chats.weni.ai"),
+            "start_date": "2022-08-24",
+            "end_date": "2022-08-24",
+        }
+
+    def close_room_with_metrics(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.close()
+            metric = RoomMetrics.objects.create(
+                room=self.room,
+                waiting_time=10,
+                message_response_time=4,
+                interaction_time=100,
+                transfer_count=2,
+            )
+        refresh_dashboard_rollup()
+        return metric
+
+    def test_closed_room_metrics_are_rolled_up(self):
+        self.close_room_with_metrics()
+
+        rollup = RoomMetricsRollup.objects.get(tag__isnull=True)
+        self.assertEqual(rollup.queue_id, self.room.queue_id)
+        self.assertEqual(rollup.project_id, self.project.pk)
+        self.assertEqual(rollup.user_id, self.room.user_id)
+        self.assertEqual(
+            rollup.hour, RoomMetricsRollup.truncate_hour(self.room.created_on)
+        )
+        self.assertEqual(rollup.rooms, 1)
+        self.assertEqual(rollup.waiting_time_sum, 10)
+        self.assertEqual(rollup.interaction_time_max, 100)
+        self.assertEqual(rollup.transfer_count_sum, 2)
+        self.assertEqual(
+            set(
+                RoomMetricsRollup.objects.filter(tag__isnull=False).values_list(
+                    "tag", flat=True
+                )
+            ),
+            set(self.room.tags.values_list("pk", flat=True)),
+        )
+
+    def test_closed_room_times_are_sketched(self):
+        self.close_room_with_metrics()
+
+        percentiles = RoomMetricsRollup.objects.filter(tag__isnull=True).percentiles()
+        self.assertAlmostEqual(percentiles["waiting_time_p50"], 10, delta=0.1)
+        self.assertAlmostEqual(percentiles["response_time_p90"], 4, delta=0.04)
+        self.assertAlmostEqual(percentiles["interact_time_p99"], 100, delta=1)
+
+    def test_updating_metrics_does_not_count_the_room_twice(self):
+        metric = self.close_room_with_metrics()
+        with self.captureOnCommitCallbacks(execute=True):
+            metric.interaction_time = 50
+            metric.save()
+            metric.transfer_count = 3
+            metric.save()
+        self.assertEqual(
+            get_redis_connection().scard(RoomMetricsRollup.objects.pending_key), 1
+        )
+
+        self.assertEqual(refresh_dashboard_rollup(), 1)
+        rollup = RoomMetricsRollup.objects.get(tag__isnull=True)
+        self.assertEqual(rollup.rooms, 1)
+        self.assertEqual(rollup.interaction_time_sum, 50)
+
+    def test_failed_bucket_does_not_drop_the_other_buckets(self):
+        hour = RoomMetricsRollup.truncate_hour(self.room.created_on)
+        users = [None, "amywong@chats.weni.ai", "linalawson@chats.weni.ai"]
+        for user_pk in users:
+            RoomMetricsRollup.objects.mark_pending(self.room.queue_id, user_pk, hour)
+        refresh_bucket = RoomMetricsRollup.objects.refresh_bucket
+        refreshed = []
+
+        def flaky_refresh_bucket(queue_pk, user_pk, hour):
+            refreshed.append(user_pk)
+            if len(refreshed) == 2:
+                raise ConnectionError()
+            refresh_bucket(queue_pk, user_pk, hour)
+
+        with patch.object(
+            RoomMetricsRollup.objects, "refresh_bucket", flaky_refresh_bucket
+        ), self.assertLogs("chats.apps.dashboard.models", "ERROR"):
+            self.assertEqual(refresh_dashboard_rollup(), 2)
+
+        self.assertCountEqual(refreshed, users)
+        pending = get_redis_connection().smembers(RoomMetricsRollup.objects.pending_key)
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(json.loads(pending.pop())[1], refreshed[1])
+
+    def test_active_room_metrics_are_not_rolled_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RoomMetrics.objects.create(room=self.room, waiting_time=10)
+
+        self.assertEqual(refresh_dashboard_rollup(), 0)
+        self.assertFalse(RoomMetricsRollup.objects.exists())
+
+    def test_rollup_is_not_kept_when_disabled(self):
+        with override_settings(USE_DASHBOARD_ROLLUP=False):
+            self.close_room_with_metrics()
+
+        self.assertFalse(RoomMetricsRollup.objects.exists())
+        self.assertEqual(
+            get_redis_connection().scard(RoomMetricsRollup.objects.pending_key), 0
+        )
+
+    def test_dashboard_answers_date_ranges_from_rollup(self):
+        self.close_room_with_metrics()
+        # inside the range, as the rooms of the queries over the rooms
+        Room.objects.filter(pk=self.room.pk).update(ended_at=self.room.created_on)
+        RoomMetrics.objects.filter(room=self.room).update(
+            created_on=self.room.created_on
+        )
+        agents_context = {**self.context, "is_weni_admin": True}
+
+        with override_settings(USE_DASHBOARD_ROLLUP=False):
+            general_data = dashboard_general_data(self.context, self.project)
+            division_data = list(dashboard_division_data(self.context, self.project))
+            agents_data = dashboard_agents_data(agents_context, self.project)
+            agents_data = sorted(agents_data, key=lambda agent: agent["email"])
+        self.assertIn(1, [agent["closed_rooms"] for agent in agents_data])
+
+        rollup_general_data = dashboard_general_data(self.context, self.project)
+        for field in ("waiting_time", "response_time", "interact_time"):
+            self.assertEqual(rollup_general_data[field], general_data[field])
+        self.assertEqual(rollup_general_data["active_chats"], 1)
+        self.assertEqual(
+            dashboard_division_data(self.context, self.project), division_data
+        )
+        rollup_agents_data = dashboard_agents_data(agents_context, self.project)
+        self.assertEqual(
+            sorted(rollup_agents_data, key=lambda agent: agent["email"]), agents_data
+        )
+
+    def test_rollup_leaves_out_the_rooms_active_in_the_range(self):
+        RoomMetrics.objects.create(room=self.room, waiting_time=10)
+        Room.objects.filter(pk=self.room.pk).update(created_on="2022-08-24T12:00:00Z")
+
+        with override_settings(USE_DASHBOARD_ROLLUP=False):
+            self.assertEqual(
+                dashboard_general_data(self.context, self.project)["waiting_time"], 10
+            )
+        self.assertIsNone(
+            dashboard_general_data(self.context, self.project)["waiting_time"]
+        )
@@ -0,0 +1,102 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django_redis import get_redis_connection
+
+from chats.apps.dashboard.management.commands.recompute_room_metrics import (
+    Command as RecomputeCommand,
+)
+from chats.apps.dashboard.models import RoomMetrics
+from chats.apps.msgs.models import Message
+from chats.apps.rooms.models import Room
+
+
+class RecomputeRoomMetricsTests(TestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.room = Room.objects.get(pk="090da6d1-959e-4dea-994a-41bf0d38ba26")
+        self.created_on = self.room.created_on
+        self.add_feedback(30, from_type="", to_type="user")
+        self.add_message(40, contact_id=self.room.contact_id)
+        self.add_message(100, user_id=self.room.user_id)
+        self.add_message(150, contact_id=self.room.contact_id)
+        self.add_message(160, user_id=self.room.user_id)
+        self.add_feedback(200, from_type="user", to_type="queue")
+        self.add_feedback(260, from_type="queue", to_type="user")
+        Room.objects.filter(pk=self.room.pk).update(
+            is_active=False, ended_at=self.created_on + timedelta(seconds=500)
+        )
+        RoomMetrics.objects.filter(room=self.room).delete()
+        get_redis_connection().delete(*self.checkpoint_keys())
+
+    def add_message(self, seconds: int, text: str = "hello", **sender):
+        message = Message.objects.create(room=self.room, text=text, **sender)
+        Message.objects.filter(pk=message.pk).update(
+            created_on=self.created_on + timedelta(seconds=seconds)
+        )
+
+    def add_feedback(self, seconds: int, from_type: str, to_type: str):
+        feedback = {
+            "method": "rt",
+            "content": {
+                "action": "transfer",
+                "from": {"type": from_type, "name": ""},
+                "to": {"type": to_type, "name": ""},
+            },
+        }
+        self.add_message(seconds, seen=True, text=json.dumps(feedback))
+
+    def checkpoint_keys(self):
+        return get_redis_connection().keys("recompute_room_metrics:*") or ["none"]
+
+    def recompute(self, *args):
+        output = StringIO()
+        call_command("recompute_room_metrics", *args, stdout=output)
+        return output.getvalue()
+
+    def test_metrics_are_recomputed_from_the_messages(self):
+        output = self.recompute("--project", str(self.room.queue.sector.project_id))
+
+        metric = RoomMetrics.objects.get(room=self.room)
+        self.assertEqual(metric.interaction_time, 500)
+        self.assertEqual(metric.message_response_time, 60)
+        self.assertEqual(metric.waiting_time, 30 + 60)
+        self.assertEqual(metric.queued_count, 2)
+        self.assertIn("rooms/s", output)
+
+    def test_only_the_requested_metrics_are_recomputed(self):
+        RoomMetrics.objects.create(room=self.room, waiting_time=7)
+
+        self.recompute("--metric", "interaction")
+
+        metric = RoomMetrics.objects.get(room=self.room)
+        self.assertEqual(metric.interaction_time, 500)
+        self.assertEqual(metric.waiting_time, 7)
+        self.assertEqual(metric.message_response_time, 0)
+
+    def test_rooms_out_of_the_period_are_skipped(self):
+        created_on = self.created_on.date()
+        self.recompute("--until", created_on.isoformat())
+
+        self.assertFalse(RoomMetrics.objects.filter(room=self.room).exists())
+
+    def test_interrupted_runs_are_resumed(self):
+        options = {"project": [], "since": None, "until": None, "metric": []}
+        checkpoint_key = RecomputeCommand().checkpoint_key(
+            options, ["interaction", "response", "waiting"]
+        )
+        last_room = Room.objects.order_by("-pk").values_list("pk", flat=True)[0]
+        get_redis_connection().set(checkpoint_key, str(last_room))
+
+        output = self.recompute()
+
+        self.assertIn(f"Resuming after room {last_room}", output)
+        self.assertFalse(RoomMetrics.objects.filter(room=self.room).exists())
+        self.assertIsNone(get_redis_connection().get(checkpoint_key))
+
+        self.recompute()
+        self.assertTrue(RoomMetrics.objects.filter(room=self.room).exists())
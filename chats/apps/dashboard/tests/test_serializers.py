@@ -1,11 +1,23 @@
-from django.test import TestCase
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django_redis import get_redis_connection
 
 from chats.apps.accounts.models import User
+from chats.apps.api.v1.dashboard.presenter import (
+    get_agents_data,
+    get_general_data,
+    get_sector_data,
+)
 from chats.apps.api.v1.dashboard.serializers import (
+    DashboardRawDataSerializer,
     dashboard_agents_data,
+    dashboard_division_data,
     dashboard_general_data,
 )
 from chats.apps.projects.models import Project
+from chats.apps.rooms.models import Room
 
 
 class RedisMock:
@@ -66,3 +78,99 @@ class SerializerTests(TestCase):
         self.assertEqual(instance[2]["agent_status"], "OFFLINE")
         self.assertEqual(instance[2]["closed_rooms"], 0)
         self.assertEqual(instance[2]["opened_rooms"], 1)
+
+
+class DashboardQueriesCountTests(TestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.project = Project.objects.get(pk="34a93b52-231e-11ed-861d-0242ac120002")
+        self.user = User.objects.get(email="brucebanner@chats.weni.ai")
+        # loaded by the HasDashboardAccess permission of the viewset
+        self.permission = self.project.permissions.get(user=self.user)
+        self.filters = [
+            {},
+            {"start_date": "2022-08-01", "end_date": "2022-08-31"},
+            {
+                "sector": "4f88b656-194d-4a83-a166-5d84ba825b8d",
+                "tag": "f4b8aa78-7735-4dd2-9999-941ebb8e4e35",
+                "queue": "f2519480-7e58-4fc4-9894-9ab1769e29cf",
+                "agent": "amywong@chats.weni.ai",
+            },
+        ]
+
+    def contexts(self):
+        for params in self.filters:
+            yield {
+                "user_request": self.user,
+                "user_permission": self.permission,
+                **params,
+            }
+
+    def assertMaxQueries(self, num, func, *args, **kwargs):
+        redis = get_redis_connection()
+        cached = redis.keys("dashboard:*")
+        if cached:
+            redis.delete(*cached)
+        with CaptureQueriesContext(connection) as queries:
+            result = func(*args, **kwargs)
+            if isinstance(result, QuerySet):
+                list(result)
+        self.assertLessEqual(len(queries), num, [q["sql"] for q in queries])
+
+    def test_raw_data_is_computed_on_a_single_query(self):
+        for context in self.contexts():
+            serializer = DashboardRawDataSerializer(
+                instance=self.project, context=context
+            )
+            self.assertMaxQueries(2, lambda: serializer.data)
+
+    def test_general_data_is_computed_on_a_single_query(self):
+        for use_rollup in (False, True):
+            with override_settings(USE_DASHBOARD_ROLLUP=use_rollup):
+                for context in self.contexts():
+                    self.assertMaxQueries(
+                        2, dashboard_general_data, context, self.project
+                    )
+
+    def test_agents_data_is_computed_on_a_single_query(self):
+        for use_rollup in (False, True):
+            with override_settings(USE_DASHBOARD_ROLLUP=use_rollup):
+                for context in self.contexts():
+                    self.assertMaxQueries(
+                        2, dashboard_agents_data, context, self.project
+                    )
+
+    def test_division_data_is_computed_on_a_single_query(self):
+        for use_rollup in (False, True):
+            with override_settings(USE_DASHBOARD_ROLLUP=use_rollup):
+                for context in self.contexts():
+                    self.assertMaxQueries(
+                        2, dashboard_division_data, context, self.project
+                    )
+                    del context["user_permission"]
+                    self.assertMaxQueries(
+                        2, dashboard_division_data, context, self.project
+                    )
+
+    def test_presenter_data_is_computed_on_a_single_query(self):
+        for use_rollup in (False, True):
+            with override_settings(USE_DASHBOARD_ROLLUP=use_rollup):
+                for params in self.filters:
+                    self.assertMaxQueries(2, get_general_data, self.project, params)
+                    self.assertMaxQueries(2, get_agents_data, self.project, params)
+                    self.assertMaxQueries(2, get_sector_data, self.project, params)
+
+    def test_raw_data_counts_tagged_rooms_once(self):
+        room = Room.objects.get(pk="8ecb1e4a-b457-4645-a161-e2b02ddffa88")
+        room.close()
+        serializer = DashboardRawDataSerializer(
+            instance=self.project,
+            context={
+                "user_request": self.user,
+                "sector": str(room.queue.sector_id),
+                "tag": "f4b8aa78-7735-4dd2-9999-941ebb8e4e35",
+            },
+        )
+
+        self.assertEqual(serializer.data["closed_rooms"], 1)
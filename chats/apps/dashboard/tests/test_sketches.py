@@ -0,0 +1,62 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from chats.apps.dashboard.sketches import QuantileSketch
+
+
+class QuantileSketchTests(SimpleTestCase):
+    quantiles = (0.5, 0.9, 0.99)
+
+    def setUp(self):
+        self.random = np.random.default_rng(42)
+
+    def assertAccurate(self, sketch, values):
+        for q in self.quantiles:
+            exact = np.quantile(values, q, method="lower")
+            estimate = sketch.quantile(q)
+            self.assertLessEqual(
+                abs(estimate - exact),
+                QuantileSketch.RELATIVE_ACCURACY * exact,
+                f"p{q * 100} estimated as {estimate}, exact {exact}",
+            )
+
+    def test_lognormal_durations(self):
+        values = np.ceil(self.random.lognormal(mean=4, sigma=1.5, size=50_000))
+
+        self.assertAccurate(QuantileSketch.from_values(values.tolist()), values)
+
+    def test_long_tail_durations(self):
+        values = np.ceil(self.random.pareto(1.2, size=50_000) * 30)
+
+        self.assertAccurate(QuantileSketch.from_values(values.tolist()), values)
+
+    def test_merged_sketches_are_as_accurate_as_one_sketch(self):
+        chunks = [
+            np.ceil(self.random.exponential(scale, size=5_000))
+            for scale in (5, 60, 600, 3600)
+        ]
+        merged = QuantileSketch()
+        for chunk in chunks:
+            sketch = QuantileSketch.from_dict(
+                QuantileSketch.from_values(chunk.tolist()).to_dict()
+            )
+            merged.merge(sketch)
+
+        self.assertEqual(merged.count, 20_000)
+        self.assertAccurate(merged, np.concatenate(chunks))
+
+    def test_zero_durations(self):
+        sketch = QuantileSketch.from_values([0, 0, 10, 10])
+
+        self.assertEqual(sketch.quantile(0.5), 0)
+        self.assertAlmostEqual(sketch.quantile(0.99), 10, delta=0.1)
+
+    def test_empty_sketch(self):
+        self.assertEqual(
+            QuantileSketch().percentiles("waiting_time"),
+            {
+                "waiting_time_p50": None,
+                "waiting_time_p90": None,
+                "waiting_time_p99": None,
+            },
+        )
@@ -1,16 +1,19 @@
-import json
-
-import requests
 from django.conf import settings
-from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import ValidationError
 
+from chats.apps.rooms.models import Room
 from chats.core.models import BaseModel
 
 
 class Message(BaseModel):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__original_seen = self.seen
+
     room = models.ForeignKey(
         "rooms.Room",
         related_name="messages",
@@ -54,7 +57,47 @@ class Message(BaseModel):
                 }
             )
 
-        return super().save(*args, **kwargs)
+        is_new = self._state.adding
+        saved = super().save(*args, **kwargs)
+        if is_new:
+            self.update_room_message_data()
+        elif self.seen != self.__original_seen:
+            self.room.update_unread_msgs(-1 if self.seen else 1)
+        self.__original_seen = self.seen
+        return saved
+
+    def update_room_message_data(self):
+        """
+        Keep the denormalized last message columns and the unread counter of the room up to date,
+        so listing and sorting rooms does not need to scan the messages table
+        """
+        room_update = {"last_message_at": self.created_on}
+        if self.text and (self.user_id or self.contact_id):
+            room_update["last_message_text"] = self.text
+        if self.contact_id:
+            room_update["last_contact_message_at"] = self.created_on
+            if self.room.first_contact_message_at is None:
+                room_update["first_contact_message_at"] = self.created_on
+
+        for field, value in room_update.items():
+            setattr(self.room, field, value)
+        if not self.seen:
+            room_update["unread_msgs"] = F("unread_msgs") + 1
+            self.room.unread_msgs += 1
+        if "first_contact_message_at" in room_update:
+            room_update["first_contact_message_at"] = Coalesce(
+                "first_contact_message_at",
+                Value(self.created_on, output_field=models.DateTimeField()),
+            )
+
+        Room.objects.filter(pk=self.room_id).update(**room_update)
+
+        if (
+            self.user_id
+            and self.room.first_contact_message_at is not None
+            and self.room.first_agent_reply_at is None
+        ):
+            self.room.capture_response_time(self.created_on)
 
     @property
     def serialized_ws_data(self) -> dict:
@@ -82,21 +125,10 @@ class Message(BaseModel):
 
     def notify_room(self, action: str, callback: bool = False):
         """ """
-        data = self.serialized_ws_data
-        self.room.base_notification(content=data, action=f"msg.{action}")
+        self.room.base_notification(action=f"msg.{action}", instance=self)
         if self.room.callback_url and callback:
-            data = self.update_msg_text_with_signature(data)
-
-            requests.post(
-                self.room.callback_url,
-                data=json.dumps(
-                    {"type": "msg.create", "content": data},
-                    sort_keys=True,
-                    indent=1,
-                    cls=DjangoJSONEncoder,
-                ),
-                headers={"content-type": "application/json"},
-            )
+            data = self.update_msg_text_with_signature(self.serialized_ws_data)
+            self.room.enqueue_callback("msg.create", data)
 
     @property
     def project(self):
@@ -147,16 +179,7 @@ class MessageMedia(BaseModel):
         msg_data["text"] = ""
 
         if self.message.room.callback_url:
-            requests.post(
-                self.message.room.callback_url,
-                data=json.dumps(
-                    {"type": "msg.create", "content": msg_data},
-                    sort_keys=True,
-                    indent=1,
-                    cls=DjangoJSONEncoder,
-                ),
-                headers={"content-type": "application/json"},
-            )
+            self.message.room.enqueue_callback("msg.create", msg_data)
 
     def notify_room(self, *args, **kwargs):
         """ """
@@ -0,0 +1,68 @@
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+from chats.apps.rooms.models import Room
+
+
+class MessageRoomLastMessageTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self) -> None:
+        self.room = Room.objects.get(uuid="090da6d1-959e-4dea-994a-41bf0d38ba26")
+
+    def test_contact_message_updates_room_last_message(self):
+        msg = self.room.messages.create(contact=self.room.contact, text="Hello")
+        self.room.refresh_from_db()
+
+        self.assertEqual(self.room.last_message_text, "Hello")
+        self.assertEqual(self.room.last_message_at, msg.created_on)
+        self.assertEqual(self.room.last_contact_message_at, msg.created_on)
+
+    def test_agent_message_does_not_update_last_contact_message(self):
+        contact_msg = self.room.messages.create(contact=self.room.contact, text="Hi")
+        agent_msg = self.room.messages.create(user=self.room.user, text="Hello")
+        self.room.refresh_from_db()
+
+        self.assertEqual(self.room.last_message_text, "Hello")
+        self.assertEqual(self.room.last_message_at, agent_msg.created_on)
+        self.assertEqual(self.room.last_contact_message_at, contact_msg.created_on)
+
+    def test_feedback_message_does_not_update_last_message_text(self):
+        self.room.messages.create(contact=self.room.contact, text="Hi")
+        feedback_msg = self.room.messages.create(text='{"method": "rt"}')
+        self.room.refresh_from_db()
+
+        self.assertEqual(self.room.last_message_text, "Hi")
+        self.assertEqual(self.room.last_message_at, feedback_msg.created_on)
+
+    def test_backfill_rooms_last_message(self):
+        contact_msg = self.room.messages.create(contact=self.room.contact, text="Hi")
+        feedback_msg = self.room.messages.create(text='{"method": "rt"}')
+        Room.objects.update(
+            last_message_text="", last_message_at=None, last_contact_message_at=None
+        )
+
+        call_command("backfill_rooms_last_message", stdout=StringIO())
+        self.room.refresh_from_db()
+
+        self.assertEqual(self.room.last_message_text, "Hi")
+        self.assertEqual(self.room.last_message_at, feedback_msg.created_on)
+        self.assertEqual(self.room.last_contact_message_at, contact_msg.created_on)
+
+    def test_unseen_message_increments_room_unread_msgs(self):
+        self.room.messages.create(contact=self.room.contact, text="Hi")
+        self.room.messages.create(contact=self.room.contact, text="Hello")
+        self.room.messages.create(text='{"method": "rt"}', seen=True)
+        self.room.refresh_from_db()
+
+        self.assertEqual(self.room.unread_msgs, 2)
+
+    def test_marking_message_as_seen_decrements_room_unread_msgs(self):
+        msg = self.room.messages.create(contact=self.room.contact, text="Hi")
+        msg.seen = True
+        msg.save()
+        self.room.refresh_from_db()
+
+        self.assertEqual(self.room.unread_msgs, 0)
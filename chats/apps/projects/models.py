@@ -10,7 +10,7 @@ from chats.apps.api.v1.internal.rest_clients.integrations_rest_client import (
     IntegrationsRESTClient,
 )
 from chats.core.models import BaseConfigurableModel, BaseModel, BaseSoftDeleteModel
-from chats.utils.websockets import send_channels_group
+from chats.utils.websockets import notify_channels_group
 
 # Create your models here.
 
@@ -220,11 +220,11 @@ class ProjectPermission(
 
     def notify_user(self, action, sender="user"):
         """ """
-        send_channels_group(
+        notify_channels_group(
             group_name=f"permission_{self.pk}",
             call_type="notify",
-            content={"from": sender, "status": self.status},
             action=f"status.{action}",
+            content={"from": sender, "status": self.status},
         )
 
     def manager_sectors(self, custom_filters: dict = {}):
@@ -0,0 +1,139 @@
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+CONNECT_SCRIPT = """
+if redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2]) == 0 then
+    return {0, tonumber(redis.call('HGET', KEYS[2], ARGV[3]) or 0)}
+end
+return {1, redis.call('HINCRBY', KEYS[2], ARGV[3], 1)}
+"""
+
+DISCONNECT_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return tonumber(redis.call('HGET', KEYS[2], ARGV[2]) or 0)
+end
+local refcount = redis.call('HINCRBY', KEYS[2], ARGV[2], -1)
+if refcount <= 0 then
+    redis.call('HDEL', KEYS[2], ARGV[2])
+    redis.call('SADD', KEYS[3], ARGV[3])
+end
+return refcount
+"""
+
+
+class AgentPresence:
+    """
+    Registry of the websocket connections of each agent, kept on redis.
+
+    Every connection is stored with the time of its last ping and counted
+    per (project, permission), so an agent is online while any of its
+    sockets is alive. When the last one closes or stops pinging, the
+    permission is marked as pending and its status is written to the
+    database in batches by sync_agents_presence.
+
+    A socket that stops pinging may still be open. The status the agent had
+    when it expired is kept for AGENT_PRESENCE_RESTORE_TTL, so a late ping
+    of that socket can put it back.
+    """
+
+    connections_key = "agent_presence:connections"
+    pending_key = "agent_presence:pending"
+
+    def __init__(self, redis_connection=None):
+        self.redis = redis_connection or get_redis_connection()
+        self.connect_script = self.redis.register_script(CONNECT_SCRIPT)
+        self.disconnect_script = self.redis.register_script(DISCONNECT_SCRIPT)
+
+    def project_key(self, project_pk) -> str:
+        return f"agent_presence:project:{project_pk}"
+
+    def connection_member(self, project_pk, permission_pk, channel_name) -> str:
+        return f"{project_pk}:{permission_pk}:{channel_name}"
+
+    def connect(self, project_pk, permission_pk, channel_name) -> int:
+        """Register the connection, or refresh it on a ping. Returns the agent connections count"""
+        return self.heartbeat(project_pk, permission_pk, channel_name)[1]
+
+    def heartbeat(self, project_pk, permission_pk, channel_name) -> tuple:
+        """
+        Register or refresh the connection. Returns whether it was registered again,
+        as happens when a socket pings after being expired, and the agent connections count
+        """
+        registered, connections = self.connect_script(
+            keys=[self.connections_key, self.project_key(project_pk)],
+            args=[
+                time.time(),
+                self.connection_member(project_pk, permission_pk, channel_name),
+                str(permission_pk),
+            ],
+        )
+        return bool(registered), connections
+
+    def disconnect(self, project_pk, permission_pk, channel_name) -> int:
+        """Remove the connection. Returns the agent connections left"""
+        return self.disconnect_script(
+            keys=[
+                self.connections_key,
+                self.project_key(project_pk),
+                self.pending_key,
+            ],
+            args=[
+                self.connection_member(project_pk, permission_pk, channel_name),
+                str(permission_pk),
+                f"{project_pk}:{permission_pk}",
+            ],
+        )
+
+    def expire_stale(self) -> list:
+        """
+        Disconnect the sockets that did not ping within AGENT_PRESENCE_TTL.
+        Returns the (project_pk, permission_pk) pairs left without connections
+        """
+        cutoff = time.time() - settings.AGENT_PRESENCE_TTL
+        stale_members = self.redis.zrangebyscore(self.connections_key, 0, cutoff)
+        expired = []
+        for member in stale_members:
+            project_pk, permission_pk, channel_name = member.decode().split(":", 2)
+            if self.disconnect(project_pk, permission_pk, channel_name) <= 0:
+                expired.append((project_pk, permission_pk))
+        return expired
+
+    def previous_status_key(self, permission_pk) -> str:
+        return f"agent_presence:previous_status:{permission_pk}"
+
+    def keep_previous_statuses(self, statuses: dict):
+        """Keep the status of each expired permission, keyed by its pk"""
+        pipe = self.redis.pipeline(transaction=False)
+        for permission_pk, status in statuses.items():
+            pipe.set(
+                self.previous_status_key(permission_pk),
+                status,
+                ex=settings.AGENT_PRESENCE_RESTORE_TTL,
+            )
+        pipe.execute()
+
+    def pop_previous_status(self, permission_pk):
+        """The status the agent had before its sockets expired, if it was not restored yet"""
+        pipe = self.redis.pipeline()
+        pipe.get(self.previous_status_key(permission_pk))
+        pipe.delete(self.previous_status_key(permission_pk))
+        status, _ = pipe.execute()
+        return status.decode() if status else None
+
+    def online_permissions(self, project_pk) -> list:
+        return [
+            permission_pk.decode()
+            for permission_pk in self.redis.hkeys(self.project_key(project_pk))
+        ]
+
+    def is_online(self, project_pk, permission_pk) -> bool:
+        return self.redis.hexists(self.project_key(project_pk), str(permission_pk))
+
+    def pop_pending(self, count: int) -> list:
+        """Returns (project_pk, permission_pk) pairs whose status must be synced"""
+        return [
+            tuple(pending.decode().split(":", 1))
+            for pending in self.redis.spop(self.pending_key, count) or []
+        ]
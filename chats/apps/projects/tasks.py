@@ -0,0 +1,65 @@
+from django.conf import settings
+
+from chats.apps.projects.models import ProjectPermission
+from chats.apps.projects.presence import AgentPresence
+from chats.celery import app
+from chats.utils.websockets import coalesce_notifications
+
+
+@app.task(name="sync_agents_presence")
+def sync_agents_presence():
+    """
+    Set offline, in one query, the agents whose last connection was closed or expired.
+    Agents that reconnected in the meantime are left untouched.
+    """
+    presence = AgentPresence()
+    expired = {permission_pk for _, permission_pk in presence.expire_stale()}
+
+    pending = presence.pop_pending(settings.AGENT_PRESENCE_BATCH_SIZE)
+    disconnected = [
+        permission_pk
+        for project_pk, permission_pk in pending
+        if not presence.is_online(project_pk, permission_pk)
+    ]
+    permissions = list(
+        ProjectPermission.objects.filter(pk__in=disconnected).exclude(
+            status=ProjectPermission.STATUS_OFFLINE
+        )
+    )
+    if not permissions:
+        return 0
+
+    # an expired socket may still be open, its next ping restores the status
+    presence.keep_previous_statuses(
+        {
+            permission.pk: permission.status
+            for permission in permissions
+            if str(permission.pk) in expired
+        }
+    )
+    ProjectPermission.objects.filter(
+        pk__in=[permission.pk for permission in permissions]
+    ).update(status=ProjectPermission.STATUS_OFFLINE)
+    with coalesce_notifications():
+        for permission in permissions:
+            permission.status = ProjectPermission.STATUS_OFFLINE
+            permission.notify_user("update", "system")
+    return len(permissions)
+
+
+def restore_agent_status(permission, presence=None) -> bool:
+    """
+    Give back the status the agent had before its sockets expired, once one of
+    them pings again. Agents that changed their status since are left untouched.
+    """
+    presence = presence or AgentPresence()
+    status = presence.pop_previous_status(permission.pk)
+    if status is None:
+        return False
+    restored = ProjectPermission.objects.filter(
+        pk=permission.pk, status=ProjectPermission.STATUS_OFFLINE
+    ).update(status=status)
+    if restored:
+        permission.status = status
+        permission.notify_user("update", "system")
+    return bool(restored)
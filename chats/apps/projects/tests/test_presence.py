@@ -0,0 +1,222 @@
+import time
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from django.db.models import F
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from chats.apps.api.websockets.rooms.consumers.agent import AgentRoomConsumer
+from chats.apps.api.websockets.rooms.consumers.manager import ManagerAgentRoomConsumer
+from chats.apps.projects.models import ProjectPermission
+from chats.apps.projects.presence import AgentPresence
+from chats.apps.projects.tasks import sync_agents_presence
+from chats.apps.queues.models import QueueAuthorization
+
+
+class AgentPresenceTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.presence = AgentPresence()
+        self.presence.redis.delete(
+            self.presence.connections_key, self.presence.pending_key
+        )
+        self.permission = ProjectPermission.objects.get(
+            pk="4e11ac12-d7ca-4c18-9da1-54789dd95319"
+        )
+        self.permission.status = ProjectPermission.STATUS_ONLINE
+        self.permission.save()
+        self.project_pk = str(self.permission.project_id)
+        self.permission_pk = str(self.permission.pk)
+        self.presence.redis.delete(self.presence.project_key(self.project_pk))
+
+    def connect(self, channel_name):
+        return self.presence.connect(self.project_pk, self.permission_pk, channel_name)
+
+    def disconnect(self, channel_name):
+        return self.presence.disconnect(
+            self.project_pk, self.permission_pk, channel_name
+        )
+
+    def test_connections_are_counted_per_agent(self):
+        self.assertEqual(self.connect("tab_1"), 1)
+        self.assertEqual(self.connect("tab_2"), 2)
+        self.assertEqual(self.connect("tab_2"), 2)
+
+        self.assertEqual(self.disconnect("tab_1"), 1)
+        self.assertTrue(self.presence.is_online(self.project_pk, self.permission_pk))
+        self.assertEqual(self.presence.pop_pending(10), [])
+
+    def test_closing_the_last_connection_sets_the_agent_offline(self):
+        self.connect("tab_1")
+        self.connect("tab_2")
+        self.disconnect("tab_1")
+        self.disconnect("tab_2")
+
+        with patch.object(ProjectPermission, "notify_user") as notify_user:
+            self.assertEqual(sync_agents_presence(), 1)
+
+        self.permission.refresh_from_db()
+        self.assertEqual(self.permission.status, ProjectPermission.STATUS_OFFLINE)
+        notify_user.assert_called_once_with("update", "system")
+
+    def test_reconnected_agent_is_not_set_offline(self):
+        self.connect("tab_1")
+        self.disconnect("tab_1")
+        self.connect("tab_2")
+
+        self.assertEqual(sync_agents_presence(), 0)
+        self.permission.refresh_from_db()
+        self.assertEqual(self.permission.status, ProjectPermission.STATUS_ONLINE)
+
+    @override_settings(AGENT_PRESENCE_TTL=60)
+    def test_stale_connections_expire(self):
+        self.connect("tab_1")
+        self.presence.redis.zadd(
+            self.presence.connections_key,
+            {
+                self.presence.connection_member(
+                    self.project_pk, self.permission_pk, "tab_1"
+                ): time.time()
+                - 120
+            },
+        )
+
+        self.assertEqual(
+            self.presence.expire_stale(), [(self.project_pk, self.permission_pk)]
+        )
+        self.assertFalse(self.presence.is_online(self.project_pk, self.permission_pk))
+
+    @override_settings(USE_AGENT_PRESENCE_READS=True)
+    def test_online_agents_read_the_presence_registry(self):
+        queue_auth = QueueAuthorization.objects.filter(
+            permission__project__sectors__queues=F("queue")
+        ).first()
+        permission = queue_auth.permission
+        permission.status = ProjectPermission.STATUS_ONLINE
+        permission.save()
+        self.presence.redis.delete(self.presence.project_key(permission.project_id))
+        queue = queue_auth.queue
+        self.assertFalse(queue.online_agents.filter(email=permission.user_id))
+
+        self.presence.connect(permission.project_id, permission.pk, "tab_1")
+
+        self.assertTrue(queue.online_agents.filter(email=permission.user_id))
+
+
+class ExpiredAgentPingTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.presence = AgentPresence()
+        self.permission = ProjectPermission.objects.get(
+            pk="4e11ac12-d7ca-4c18-9da1-54789dd95319"
+        )
+        self.permission.status = ProjectPermission.STATUS_ONLINE
+        self.permission.save()
+        self.presence.redis.delete(
+            self.presence.connections_key,
+            self.presence.pending_key,
+            self.presence.project_key(self.permission.project_id),
+            self.presence.previous_status_key(self.permission.pk),
+        )
+        self.consumer = AgentRoomConsumer()
+        self.consumer.channel_name = "agent_tab"
+        self.consumer.added_groups = []
+        self.consumer.permission = self.permission
+        self.consumer.send_json = AsyncMock()
+
+    def ping(self):
+        with patch.object(ProjectPermission, "notify_user"):
+            async_to_sync(self.consumer.receive_json)({"type": "ping"})
+        self.permission.refresh_from_db()
+        return self.permission.status
+
+    @override_settings(AGENT_PRESENCE_TTL=60)
+    def expire(self):
+        self.presence.redis.zadd(
+            self.presence.connections_key,
+            {
+                self.presence.connection_member(
+                    self.permission.project_id, self.permission.pk, "agent_tab"
+                ): time.time()
+                - 120
+            },
+        )
+        with patch.object(ProjectPermission, "notify_user"):
+            self.assertEqual(sync_agents_presence(), 1)
+        self.permission.refresh_from_db()
+        return self.permission.status
+
+    def test_late_ping_restores_the_status_of_an_expired_agent(self):
+        self.assertEqual(self.ping(), ProjectPermission.STATUS_ONLINE)
+        self.assertEqual(self.expire(), ProjectPermission.STATUS_OFFLINE)
+
+        self.assertEqual(self.ping(), ProjectPermission.STATUS_ONLINE)
+        self.assertTrue(
+            self.presence.is_online(self.permission.project_id, self.permission.pk)
+        )
+
+    def test_status_changed_after_the_expiry_is_kept(self):
+        self.ping()
+        self.expire()
+        ProjectPermission.objects.filter(pk=self.permission.pk).update(
+            status=ProjectPermission.STATUS_BUSY
+        )
+
+        self.assertEqual(self.ping(), ProjectPermission.STATUS_BUSY)
+
+    def test_closed_connection_is_not_restored(self):
+        self.ping()
+        with patch.object(ProjectPermission, "notify_user"):
+            async_to_sync(self.consumer.disconnect)()
+            sync_agents_presence()
+        self.permission.refresh_from_db()
+        self.assertEqual(self.permission.status, ProjectPermission.STATUS_OFFLINE)
+
+        self.assertEqual(self.ping(), ProjectPermission.STATUS_OFFLINE)
+
+
+class ManagerConsumerPresenceTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.presence = AgentPresence()
+        self.permission = ProjectPermission.objects.get(
+            pk="4e11ac12-d7ca-4c18-9da1-54789dd95319"
+        )
+        self.presence.redis.delete(
+            self.presence.connections_key,
+            self.presence.project_key(self.permission.project_id),
+        )
+
+    def consumer(self, consumer_class):
+        consumer = consumer_class()
+        consumer.channel_name = "manager_tab"
+        consumer.added_groups = []
+        consumer.permission = self.permission
+        consumer.send_json = AsyncMock()
+        return consumer
+
+    def test_manager_pings_do_not_keep_the_agent_online(self):
+        consumer = self.consumer(ManagerAgentRoomConsumer)
+
+        async_to_sync(consumer.receive_json)({"type": "ping"})
+        consumer.send_json.assert_awaited_once_with({"type": "pong"})
+        self.assertFalse(
+            self.presence.is_online(self.permission.project_id, self.permission.pk)
+        )
+
+        with patch.object(AgentPresence, "disconnect") as disconnect:
+            async_to_sync(consumer.disconnect)()
+        disconnect.assert_not_called()
+
+    def test_agent_pings_keep_the_agent_online(self):
+        consumer = self.consumer(AgentRoomConsumer)
+
+        async_to_sync(consumer.receive_json)({"type": "ping"})
+
+        self.assertTrue(
+            self.presence.is_online(self.permission.project_id, self.permission.pk)
+        )
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from chats.apps.projects.presence import AgentPresence
 from chats.core.models import BaseConfigurableModel, BaseModel, BaseSoftDeleteModel
 
 User = get_user_model()
@@ -57,10 +59,15 @@ class Queue(BaseSoftDeleteModel, BaseConfigurableModel, BaseModel):
 
     @property
     def online_agents(self):
-        return self.agents.filter(
-            project_permissions__status="ONLINE",
-            project_permissions__project=self.sector.project,
-        )  # TODO: Set this variable to ProjectPermission.STATUS_ONLINE
+        online_filter = {
+            "project_permissions__status": "ONLINE",
+            "project_permissions__project": self.sector.project,
+        }  # TODO: Set this variable to ProjectPermission.STATUS_ONLINE
+        if settings.USE_AGENT_PRESENCE_READS:
+            online_filter[
+                "project_permissions__pk__in"
+            ] = AgentPresence().online_permissions(self.sector.project_id)
+        return self.agents.filter(**online_filter)
 
     @property
     def available_agents(self):
@@ -76,6 +83,18 @@ class Queue(BaseSoftDeleteModel, BaseConfigurableModel, BaseModel):
             "active_rooms_count"
         )
 
+    def get_available_agent(self):
+        """The online agent with less active rooms on the sector, under the rooms limit"""
+        if not settings.USE_AGENT_LOAD_INDEX:
+            return self.available_agents.first()
+        from chats.apps.rooms.routing import AgentLoadIndex
+
+        online_agents = {agent.email: agent for agent in self.online_agents}
+        user_email = AgentLoadIndex().least_loaded(
+            self.sector_id, sorted(online_agents), self.limit
+        )
+        return online_agents.get(user_email)
+
     def is_agent(self, user):
         return self.authorizations.filter(permission__user=user).exists()
 
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from chats.apps.msgs.models import Message
+from chats.apps.rooms.models import Room
+
+
+class Command(BaseCommand):
+    help = "Fill the last message columns of the rooms from their messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="How many rooms are updated per query",
+        )
+        parser.add_argument(
+            "--only-active",
+            action="store_true",
+            help="Only update the rooms that are still open",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        room_messages = Message.objects.filter(room=OuterRef("pk")).order_by(
+            "-created_on"
+        )
+        last_message_at = room_messages.values("created_on")[:1]
+        last_message_text = (
+            room_messages.exclude(user__isnull=True, contact__isnull=True)
+            .exclude(text="")
+            .exclude(text__isnull=True)
+            .values("text")[:1]
+        )
+        last_contact_message_at = room_messages.filter(contact__isnull=False).values(
+            "created_on"
+        )[:1]
+
+        rooms = Room.objects.all()
+        if options["only_active"]:
+            rooms = rooms.filter(is_active=True)
+        room_pks = rooms.order_by("pk").values_list("pk", flat=True)
+
+        updated = 0
+        batch = []
+        for room_pk in room_pks.iterator(chunk_size=batch_size):
+            batch.append(room_pk)
+            if len(batch) < batch_size:
+                continue
+            updated += self.update_rooms(
+                batch, last_message_at, last_message_text, last_contact_message_at
+            )
+            batch = []
+        if batch:
+            updated += self.update_rooms(
+                batch, last_message_at, last_message_text, last_contact_message_at
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} rooms updated"))
+
+    def update_rooms(
+        self, room_pks, last_message_at, last_message_text, last_contact_message_at
+    ):
+        updated = Room.objects.filter(pk__in=room_pks).update(
+            last_message_at=Subquery(last_message_at),
+            last_message_text=Coalesce(Subquery(last_message_text), Value("")),
+            last_contact_message_at=Subquery(last_contact_message_at),
+        )
+        self.stdout.write(f"{updated} rooms updated on this batch")
+        return updated
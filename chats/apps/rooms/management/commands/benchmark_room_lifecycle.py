@@ -0,0 +1,132 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+from chats.benchmarks.lifecycle import (
+    OPERATIONS,
+    BenchmarkError,
+    RoomLifecycleBenchmark,
+    compare,
+)
+
+DEFAULT_BASELINE = os.path.join(
+    settings.BASE_DIR, "chats", "benchmarks", "baselines", "room_lifecycle.json"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the room lifecycle through the API, from the flows room creation "
+        "to the close, on a test database created for the run. Compares the results "
+        "with the baseline of the database vendor and fails on regressions. "
+        "Run it with DJANGO_SETTINGS_MODULE=chats.benchmarks.settings to stay offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rooms", type=int, default=200, help="Measured room lifecycles"
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=20,
+            help="Room lifecycles run before measuring",
+        )
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=3,
+            help="Incoming contact messages per room",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=DEFAULT_BASELINE,
+            help="JSON file with the baselines, per database vendor",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Save the results as the baseline instead of comparing them",
+        )
+        parser.add_argument(
+            "--latency-tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed p50 latency increase over the baseline, as a fraction",
+        )
+        parser.add_argument(
+            "--query-tolerance",
+            type=float,
+            default=0.0,
+            help="Allowed queries per operation increase over the baseline, as a fraction",
+        )
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            benchmark = RoomLifecycleBenchmark(messages=options["messages"])
+            benchmark.setup()
+            results = benchmark.run(options["rooms"], warmup=options["warmup"])
+        except BenchmarkError as error:
+            raise CommandError(str(error))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.write_results(results)
+
+        vendor = connection.vendor
+        baselines = self.read_baselines(options["baseline"])
+        if options["save_baseline"]:
+            baselines[vendor] = results
+            with open(options["baseline"], "w") as baseline_file:
+                json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+                baseline_file.write("\n")
+            self.stdout.write(f"Saved the {vendor} baseline to {options['baseline']}")
+            return
+
+        if vendor not in baselines:
+            self.stdout.write(f"No {vendor} baseline to compare with")
+            return
+        if baselines[vendor]["messages"] != results["messages"]:
+            raise CommandError(
+                f"The {vendor} baseline was run with "
+                f"--messages {baselines[vendor]['messages']}"
+            )
+        regressions = compare(
+            results,
+            baselines[vendor],
+            latency_tolerance=options["latency_tolerance"],
+            query_tolerance=options["query_tolerance"],
+        )
+        if regressions:
+            raise CommandError(
+                "Regressions over the baseline:\n" + "\n".join(regressions)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"No regressions over the {vendor} baseline")
+        )
+
+    def read_baselines(self, path: str) -> dict:
+        if not os.path.exists(path):
+            return {}
+        with open(path) as baseline_file:
+            return json.load(baseline_file)
+
+    def write_results(self, results: dict):
+        self.stdout.write(
+            f"{results['rooms']} rooms, {results['rooms_per_second']} rooms/s"
+        )
+        self.stdout.write(
+            f"{'operation':>18} {'ops/s':>9} {'p50 (ms)':>10} "
+            f"{'p99 (ms)':>10} {'queries':>8}"
+        )
+        for operation in OPERATIONS:
+            summary = results["operations"][operation]
+            self.stdout.write(
+                f"{operation:>18} {summary['throughput']:>9} {summary['p50_ms']:>10} "
+                f"{summary['p99_ms']:>10} {summary['queries']:>8}"
+            )
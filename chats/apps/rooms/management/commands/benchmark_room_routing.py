@@ -0,0 +1,104 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from chats.apps.accounts.models import User
+from chats.apps.contacts.models import Contact
+from chats.apps.projects.models import Project, ProjectPermission
+from chats.apps.queues.models import QueueAuthorization
+from chats.apps.rooms.models import Room
+from chats.apps.rooms.routing import AgentLoadIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the room creation latency when routing with the rooms count query "
+        "and with the agent load index. Every row created is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=10000)
+        parser.add_argument("--agents", type=int, default=50)
+        parser.add_argument("--iterations", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            queue = self.create_active_rooms(options["rooms"], options["agents"])
+            self.stdout.write(
+                f"{options['rooms']} active rooms, {options['agents']} online agents"
+            )
+            for use_index in [False, True]:
+                with override_settings(USE_AGENT_LOAD_INDEX=use_index):
+                    latency = self.measure(queue, options["iterations"])
+                label = "load index" if use_index else "count query"
+                self.stdout.write(f"{label:>12}: {latency:.3f} ms per room")
+            transaction.set_rollback(True)
+        AgentLoadIndex().redis.delete(AgentLoadIndex().sector_key(queue.sector_id))
+
+    def create_active_rooms(self, rooms: int, agents: int):
+        project = Project.objects.create(name="Routing benchmark")
+        sector = project.sectors.create(
+            name="Routing benchmark",
+            rooms_limit=rooms,
+            work_start="00:00",
+            work_end="23:59",
+        )
+        queue = sector.queues.create(name="Routing benchmark")
+
+        users = User.objects.bulk_create(
+            [
+                User(email=f"routing-benchmark-{index}@chats.com")
+                for index in range(agents)
+            ]
+        )
+        permissions = ProjectPermission.objects.bulk_create(
+            [
+                ProjectPermission(
+                    project=project,
+                    user=user,
+                    role=ProjectPermission.ROLE_ATTENDANT,
+                    status=ProjectPermission.STATUS_ONLINE,
+                )
+                for user in users
+            ]
+        )
+        QueueAuthorization.objects.bulk_create(
+            [
+                QueueAuthorization(
+                    queue=queue,
+                    permission=permission,
+                    role=QueueAuthorization.ROLE_AGENT,
+                )
+                for permission in permissions
+            ]
+        )
+        contacts = Contact.objects.bulk_create(
+            [Contact(external_id=str(uuid.uuid4())) for _ in range(rooms)]
+        )
+        Room.objects.bulk_create(
+            [
+                Room(queue=queue, contact=contact, user=users[index % agents])
+                for index, contact in enumerate(contacts)
+            ],
+            batch_size=1000,
+        )
+        return queue
+
+    def measure(self, queue, iterations: int) -> float:
+        """Returns the mean time to route and create a room, in milliseconds"""
+        contacts = Contact.objects.bulk_create(
+            [Contact(external_id=str(uuid.uuid4())) for _ in range(iterations)]
+        )
+        elapsed = 0
+        for contact in contacts:
+            start = time.perf_counter()
+            with transaction.atomic():
+                user = queue.get_available_agent()
+                room = Room.objects.create(queue=queue, contact=contact, user=user)
+            elapsed += time.perf_counter() - start
+            # the savepoint commit does not run on_commit, apply the index update here
+            AgentLoadIndex().move(None, room.agent_load())
+        return elapsed / iterations * 1000
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from chats.apps.rooms.routing import AgentLoadIndex
+from chats.apps.sectors.models import Sector
+
+
+class Command(BaseCommand):
+    help = "Compare the agents load on the routing index with the active rooms on the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sector",
+            action="append",
+            default=[],
+            help="Only check this sector, may be repeated",
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rebuild the sectors that drifted from the database",
+        )
+
+    def handle(self, *args, **options):
+        index = AgentLoadIndex()
+        sectors = Sector.objects.filter(is_deleted=False)
+        if options["sector"]:
+            sectors = sectors.filter(pk__in=options["sector"])
+
+        drifted = 0
+        for sector_pk in sectors.values_list("pk", flat=True).iterator():
+            mismatches = index.check_sector(sector_pk)
+            if not mismatches:
+                continue
+            drifted += 1
+            for user_email, (index_load, database_load) in mismatches.items():
+                self.stdout.write(
+                    f"{sector_pk} {user_email}: index {index_load}, database {database_load}"
+                )
+            if options["fix"]:
+                index.rebuild_sector(sector_pk)
+
+        message = f"{drifted} sectors drifted from the database"
+        if options["fix"]:
+            message += " and were rebuilt"
+        self.stdout.write(self.style.SUCCESS(message))
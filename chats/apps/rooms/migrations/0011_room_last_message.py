@@ -0,0 +1,34 @@
+# Generated by Django 4.1.2 on 2026-10-18 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rooms", "0010_alter_room_urn"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="last_contact_message_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Last contact message at"
+            ),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="last_message_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, null=True, verbose_name="Last message at"
+            ),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="last_message_text",
+            field=models.TextField(
+                blank=True, default="", verbose_name="Last message text"
+            ),
+        ),
+    ]
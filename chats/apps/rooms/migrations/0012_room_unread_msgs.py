@@ -0,0 +1,40 @@
+# Generated by Django 4.1.2 on 2026-10-18 20:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_active_rooms_unread_msgs(apps, schema_editor):
+    Room = apps.get_model("rooms", "Room")
+    Message = apps.get_model("msgs", "Message")
+
+    unread_msgs = (
+        Message.objects.filter(room=OuterRef("pk"), seen=False)
+        .order_by()
+        .values("room")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    Room.objects.filter(is_active=True).update(
+        unread_msgs=Coalesce(Subquery(unread_msgs), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("msgs", "0007_alter_message_options"),
+        ("rooms", "0011_room_last_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="unread_msgs",
+            field=models.IntegerField(default=0, verbose_name="Unread messages"),
+        ),
+        migrations.RunPython(
+            count_active_rooms_unread_msgs, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_active_rooms_last_contact_message(apps, schema_editor):
+    Room = apps.get_model("rooms", "Room")
+    Message = apps.get_model("msgs", "Message")
+
+    last_contact_message_at = (
+        Message.objects.filter(room=OuterRef("pk"), contact=OuterRef("contact"))
+        .order_by("-created_on")
+        .values("created_on")[:1]
+    )
+    Room.objects.filter(is_active=True, last_contact_message_at__isnull=True).update(
+        last_contact_message_at=Subquery(last_contact_message_at)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("msgs", "0007_alter_message_options"),
+        ("rooms", "0012_room_unread_msgs"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fill_active_rooms_last_contact_message, migrations.RunPython.noop
+        ),
+    ]
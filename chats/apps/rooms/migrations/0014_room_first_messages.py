@@ -0,0 +1,27 @@
+# Generated by Django 4.1.2 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rooms", "0013_fill_active_rooms_last_contact_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="first_agent_reply_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="First agent reply at"
+            ),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="first_contact_message_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="First contact message at"
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_active_rooms_first_messages(apps, schema_editor):
+    Room = apps.get_model("rooms", "Room")
+    Message = apps.get_model("msgs", "Message")
+    RoomMetrics = apps.get_model("dashboard", "RoomMetrics")
+
+    first_contact_message_at = (
+        Message.objects.filter(room=OuterRef("pk"), contact__isnull=False)
+        .order_by("created_on")
+        .values("created_on")[:1]
+    )
+    first_agent_reply_at = (
+        Message.objects.filter(
+            room=OuterRef("pk"),
+            user__isnull=False,
+            created_on__gte=OuterRef("first_contact_message_at"),
+        )
+        .order_by("created_on")
+        .values("created_on")[:1]
+    )
+    active_rooms = Room.objects.filter(is_active=True)
+    active_rooms.update(first_contact_message_at=Subquery(first_contact_message_at))
+    active_rooms.filter(first_contact_message_at__isnull=False).update(
+        first_agent_reply_at=Subquery(first_agent_reply_at)
+    )
+
+    replied_rooms = active_rooms.filter(first_agent_reply_at__isnull=False).values_list(
+        "pk", "first_contact_message_at", "first_agent_reply_at"
+    )
+    for room_pk, contact_message_at, agent_reply_at in replied_rooms.iterator():
+        RoomMetrics.objects.filter(room=room_pk).update(
+            message_response_time=int(
+                (agent_reply_at - contact_message_at).total_seconds()
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("msgs", "0007_alter_message_options"),
+        ("dashboard", "0006_roommetricsrollup_sketches"),
+        ("rooms", "0014_room_first_messages"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fill_active_rooms_first_messages, migrations.RunPython.noop
+        ),
+    ]
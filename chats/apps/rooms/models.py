@@ -1,22 +1,68 @@
-import json
 from datetime import timedelta
 
-import requests
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import ValidationError
 
 from chats.core.models import BaseModel
-from chats.utils.websockets import send_channels_group
+from chats.utils.callbacks import serialize_callback
+from chats.utils.websockets import notify_channels_group
+
+
+class RoomQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Updates that change the state of the rooms run the same hooks as saving them"""
+        state_fields = {field for fields in Room.STATE_FIELDS for field in fields}
+        if not state_fields & kwargs.keys():
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            rooms = {
+                room.pk: room
+                for room in self.select_for_update(of=("self",)).select_related("queue")
+            }
+            updated = super().update(**kwargs)
+            new_states = Room.objects.filter(pk__in=rooms).values_list(
+                "pk", "is_active", "user_id", "queue_id"
+            )
+            for room_pk, *new_state in new_states:
+                room = rooms[room_pk]
+                if room.saved_state() != tuple(new_state):
+                    room.on_state_change(room.saved_state(), tuple(new_state))
+        return updated
 
 
 class Room(BaseModel):
+    # The fields, as (name, attname), whose changes run the state change hooks
+    STATE_FIELDS = (
+        ("is_active", "is_active"),
+        ("user", "user_id"),
+        ("queue", "queue_id"),
+    )
+
+    # Kept up to date by the messages with queryset updates, never written by save
+    MESSAGE_DATA_FIELDS = (
+        "last_message_text",
+        "last_message_at",
+        "last_contact_message_at",
+        "first_contact_message_at",
+        "first_agent_reply_at",
+        "unread_msgs",
+    )
+
+    objects = RoomQuerySet.as_manager()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.__original_is_active = self.is_active
+        self.__saved_is_active = self.is_active
+        self.__saved_user_id = self.user_id
+        self.__saved_queue_id = self.queue_id
 
     user = models.ForeignKey(
         "accounts.User",
@@ -64,6 +110,21 @@ class Room(BaseModel):
 
     transfer_history = models.JSONField(_("Transfer History"), null=True, blank=True)
 
+    last_message_text = models.TextField(_("Last message text"), blank=True, default="")
+    last_message_at = models.DateTimeField(
+        _("Last message at"), null=True, blank=True, db_index=True
+    )
+    last_contact_message_at = models.DateTimeField(
+        _("Last contact message at"), null=True, blank=True
+    )
+    first_contact_message_at = models.DateTimeField(
+        _("First contact message at"), null=True, blank=True
+    )
+    first_agent_reply_at = models.DateTimeField(
+        _("First agent reply at"), null=True, blank=True
+    )
+    unread_msgs = models.IntegerField(_("Unread messages"), default=0)
+
     tags = models.ManyToManyField(
         "sectors.SectorTag",
         related_name="rooms",
@@ -85,7 +146,133 @@ class Room(BaseModel):
     def save(self, *args, **kwargs) -> None:
         if self.__original_is_active is False:
             raise ValidationError({"detail": _("Closed rooms cannot receive updates")})
-        return super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = self.saved_fields()
+        old_state = None if self._state.adding else self.saved_state()
+        new_state = self.written_state(kwargs.get("update_fields"))
+        saved = super().save(*args, **kwargs)
+        if old_state != new_state:
+            self.on_state_change(old_state, new_state)
+        self.__saved_is_active, self.__saved_user_id, self.__saved_queue_id = new_state
+        return saved
+
+    def saved_fields(self) -> list:
+        """
+        The fields a full save of an existing room writes: the message data is left out,
+        so a stale room does not overwrite what the messages saved since it was loaded
+        """
+        skipped = set(self.MESSAGE_DATA_FIELDS) | self.get_deferred_fields()
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in skipped
+        ]
+
+    def delete(self, *args, **kwargs):
+        if not settings.USE_AGENT_LOAD_INDEX:
+            return super().delete(*args, **kwargs)
+        old_load = self.original_agent_load()
+        deleted = super().delete(*args, **kwargs)
+        self.update_agent_load(old_load, None)
+        return deleted
+
+    def saved_state(self) -> tuple:
+        """The (is_active, user_id, queue_id) of the room when it was last saved"""
+        return (self.__saved_is_active, self.__saved_user_id, self.__saved_queue_id)
+
+    def written_state(self, update_fields=None) -> tuple:
+        """The (is_active, user_id, queue_id) a save with these update_fields leaves on the database"""
+        if update_fields is None:
+            return (self.is_active, self.user_id, self.queue_id)
+        update_fields = set(update_fields)
+        saved_state = self.saved_state()
+        return tuple(
+            getattr(self, attname)
+            if {name, attname} & update_fields
+            else saved_state[index]
+            for index, (name, attname) in enumerate(self.STATE_FIELDS)
+        )
+
+    def on_state_change(self, old_state, new_state):
+        """
+        Run the side effects of the room being created, closed, transferred or moved
+        to another queue, from its (is_active, user_id, queue_id) before and after the change.
+        Each effect has its own flag and runs once the transaction is committed.
+        """
+        if settings.USE_DASHBOARD_CACHE:
+            self.invalidate_dashboard(
+                {state[2] for state in (old_state, new_state) if state} - {None}
+            )
+        if settings.USE_DASHBOARD_LIVE:
+            self.publish_dashboard_delta(old_state, new_state)
+
+        distribute_rooms = settings.USE_ROOMS_DISTRIBUTION and settings.USE_CELERY
+        if not (settings.USE_AGENT_LOAD_INDEX or distribute_rooms):
+            return
+        old_load = self.state_agent_load(old_state)
+        if settings.USE_AGENT_LOAD_INDEX:
+            self.update_agent_load(old_load, self.state_agent_load(new_state))
+        # closing or transferring the room frees a place on its agent
+        if distribute_rooms and old_load and new_state[:2] != old_state[:2]:
+            self.request_rooms_distribution(old_load)
+
+    def invalidate_dashboard(self, queue_pks):
+        """Outdate the cached dashboard of the sectors of the queues once the transaction is committed"""
+        from chats.apps.dashboard.cache import DashboardCache
+
+        queue_pks = list(queue_pks)
+        transaction.on_commit(lambda: DashboardCache().invalidate_queues(queue_pks))
+
+    def publish_dashboard_delta(self, old_state, new_state):
+        """Push the counters this change moved to the live dashboard once the transaction is committed"""
+        from chats.apps.dashboard.live import publish_room_delta
+
+        room_pk = self.pk
+        transaction.on_commit(lambda: publish_room_delta(room_pk, old_state, new_state))
+
+    def state_agent_load(self, state):
+        """The (sector, agent) pair the room counts for on the routing index in the state"""
+        if not state:
+            return None
+        is_active, user_id, queue_id = state
+        if not (is_active and user_id):
+            return None
+        if queue_id == self.queue_id:
+            sector_id = self.queue.sector_id
+        else:
+            Queue = self._meta.get_field("queue").related_model
+            sector_id = (
+                Queue.objects.filter(pk=queue_id)
+                .values_list("sector_id", flat=True)
+                .first()
+            )
+        return (str(sector_id), user_id)
+
+    def agent_load(self):
+        """The (sector, agent) pair this room counts for on the routing index"""
+        return self.state_agent_load((self.is_active, self.user_id, self.queue_id))
+
+    def original_agent_load(self):
+        """The (sector, agent) pair this room counted for when it was last saved"""
+        return self.state_agent_load(self.saved_state())
+
+    def update_agent_load(self, old_load, new_load):
+        if old_load == new_load:
+            return
+        from chats.apps.rooms.routing import AgentLoadIndex
+
+        transaction.on_commit(lambda: AgentLoadIndex().move(old_load, new_load))
+
+    def request_rooms_distribution(self, freed_load):
+        """Ask for the queued rooms of the sector to be given to the agents with free capacity"""
+        from chats.apps.rooms.tasks import distribute_queued_rooms
+
+        sector_pk, _ = freed_load
+        transaction.on_commit(
+            lambda: distribute_queued_rooms.apply_async(
+                args=[sector_pk], queue=settings.ROOMS_DISTRIBUTION_CUSTOM_QUEUE
+            )
+        )
 
     def get_permission(self, user):
         try:
@@ -137,12 +324,10 @@ class Room(BaseModel):
         """Validates is the last contact message was sent more than a day ago"""
         if not self.urn.startswith("whatsapp"):
             return True
+        if self.last_contact_message_at is None:
+            return False
 
-        day_validation = self.messages.filter(
-            created_on__gte=timezone.now() - timedelta(days=1),
-            contact=self.contact,
-        )
-        return day_validation.exists()
+        return self.last_contact_message_at >= timezone.now() - timedelta(days=1)
 
     @property
     def serialized_ws_data(self):
@@ -158,6 +343,31 @@ class Room(BaseModel):
             .order_by("-created_on")[:5]
         )
 
+    def update_unread_msgs(self, amount: int):
+        """Add (or remove, when negative) the amount to the room unread messages counter"""
+        Room.objects.filter(pk=self.pk).update(
+            unread_msgs=Greatest(F("unread_msgs") + amount, 0)
+        )
+        self.unread_msgs = max(self.unread_msgs + amount, 0)
+
+    def reset_unread_msgs(self):
+        Room.objects.filter(pk=self.pk).update(unread_msgs=0)
+        self.unread_msgs = 0
+
+    def capture_response_time(self, replied_at):
+        """Account the time the agent took to answer the contact on the room metrics, once per room"""
+        from chats.apps.dashboard.models import RoomMetrics
+
+        replied = Room.objects.filter(
+            pk=self.pk, first_agent_reply_at__isnull=True
+        ).update(first_agent_reply_at=replied_at)
+        self.first_agent_reply_at = replied_at
+        if replied:
+            response_time = replied_at - self.first_contact_message_at
+            RoomMetrics.update_room(
+                self, message_response_time=int(response_time.total_seconds())
+            )
+
     def close(self, tags: list = [], end_by: str = ""):
         self.is_active = False
         self.ended_at = timezone.now()
@@ -170,31 +380,42 @@ class Room(BaseModel):
         if self.callback_url is None:
             return None
 
-        requests.post(
-            self.callback_url,
-            data=json.dumps(
-                {"type": "room.update", "content": room_data},
-                sort_keys=True,
-                indent=1,
-                cls=DjangoJSONEncoder,
-            ),
-            headers={"content-type": "application/json"},
-        )
+        self.enqueue_callback("room.update", room_data)
+
+    def enqueue_callback(self, event_type: str, content: dict):
+        """
+        Queue the event to the room callback url once the transaction is committed.
+        The content is serialized right away, so later changes do not leak into it.
+        """
+        from chats.apps.rooms.tasks import enqueue_room_callback
 
-    def base_notification(self, content, action):
+        room_pk = str(self.pk)
+        url = self.callback_url
+        data = serialize_callback(event_type, content)
+        transaction.on_commit(lambda: enqueue_room_callback(room_pk, url, data))
+
+    def base_notification(self, action, content=None, instance=None):
         if self.user:
             permission = self.get_permission(self.user)
             group_name = f"permission_{permission.pk}"
         else:
             group_name = f"queue_{self.queue.pk}"
 
-        send_channels_group(
+        notify_channels_group(
             group_name=group_name,
             call_type="notify",
-            content=content,
             action=action,
+            content=content,
+            instance=instance,
         )
 
+    def notify_content(self, action: str):
+        """
+        The room is serialized when the notifications are sent,
+        except on destroy, as the room will not exist anymore by then
+        """
+        return self.serialized_ws_data if action == "destroy" else None
+
     def notify_queue(
         self, action: str, callback: bool = False, transferred_by: str = ""
     ):
@@ -208,14 +429,13 @@ class Room(BaseModel):
         Contact create new room,
         Call the sector group(all agents) and send the 'create' action to add them in the room group
         """
-        content = self.serialized_ws_data
-        if transferred_by != "":
-            content["transferred_by"] = transferred_by
-        send_channels_group(
+        notify_channels_group(
             group_name=f"queue_{self.queue.pk}",
             call_type="notify",
-            content=content,
             action=f"rooms.{action}",
+            content=self.notify_content(action),
+            instance=self,
+            extra={"transferred_by": transferred_by} if transferred_by != "" else None,
         )
 
         if self.callback_url and callback and action in ["update", "destroy", "close"]:
@@ -245,33 +465,46 @@ class Room(BaseModel):
         permission = self.get_permission(user)
         if not permission:
             return
-        content = self.serialized_ws_data
-        if transferred_by != "":
-            content["transferred_by"] = transferred_by
 
-        send_channels_group(
+        notify_channels_group(
             group_name=f"permission_{permission.pk}",
             call_type="notify",
-            content=content,
             action=f"rooms.{action}",
+            content=self.notify_content(action),
+            instance=self,
+            extra={"transferred_by": transferred_by} if transferred_by != "" else None,
+        )
+
+    @classmethod
+    def notify_user_rooms(cls, user, rooms, action: str):
+        """Send the rooms to the agent on a single rooms.bulk_<action> message"""
+        permission = rooms[0].get_permission(user)
+        if not permission:
+            return
+
+        notify_channels_group(
+            group_name=f"permission_{permission.pk}",
+            call_type="notify",
+            action=f"rooms.bulk_{action}",
+            content=[room.serialized_ws_data for room in rooms],
         )
 
     def user_connection(self, action: str, user=None):
         user = user if user else self.user
         permission = self.get_permission(user)
-        send_channels_group(
+        notify_channels_group(
             group_name=f"permission_{permission.pk}",
             call_type=action,
-            content={"name": "room", "id": str(self.pk)},
             action=f"groups.{action}",
+            content={"name": "room", "id": str(self.pk)},
         )
 
     def queue_connection(self, action: str, queue=None):
         queue = queue if queue else self.queue
 
-        send_channels_group(
+        notify_channels_group(
             group_name=f"queue_{queue.pk}",
             call_type=action,
-            content={"name": "room", "id": str(self.pk)},
             action=f"group.{action}",
+            content={"name": "room", "id": str(self.pk)},
         )
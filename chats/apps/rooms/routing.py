@@ -0,0 +1,97 @@
+from django.db.models import Count
+from django_redis import get_redis_connection
+
+from chats.apps.rooms.models import Room
+
+
+class AgentLoadIndex:
+    """
+    Active rooms count of each agent per sector, kept on redis sorted sets.
+
+    Rooms update the index when they are assigned, transferred or closed,
+    so routing a new room reads the load of the online agents instead of
+    counting their rooms. A sector is loaded from the database the first
+    time it is read, and the consistency checker rebuilds it on drift.
+    """
+
+    built_sectors_key = "agent_load:sectors"
+
+    def __init__(self, redis_connection=None):
+        self.redis = redis_connection or get_redis_connection()
+
+    def sector_key(self, sector_pk) -> str:
+        return f"agent_load:sector:{sector_pk}"
+
+    def move(self, old_load: tuple = None, new_load: tuple = None):
+        """
+        Moves a room between (sector_pk, user_email) pairs,
+        None stands for a closed or queued room
+        """
+        if old_load == new_load:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        if old_load is not None:
+            sector_pk, user_email = old_load
+            pipe.zincrby(self.sector_key(sector_pk), -1, user_email)
+        if new_load is not None:
+            sector_pk, user_email = new_load
+            pipe.zincrby(self.sector_key(sector_pk), 1, user_email)
+        pipe.execute()
+
+    def database_loads(self, sector_pk) -> dict:
+        return dict(
+            Room.objects.filter(
+                is_active=True, user__isnull=False, queue__sector=sector_pk
+            )
+            .order_by()
+            .values("user")
+            .annotate(load=Count("pk"))
+            .values_list("user", "load")
+        )
+
+    def rebuild_sector(self, sector_pk) -> dict:
+        loads = self.database_loads(sector_pk)
+        pipe = self.redis.pipeline()
+        pipe.delete(self.sector_key(sector_pk))
+        if loads:
+            pipe.zadd(self.sector_key(sector_pk), loads)
+        pipe.sadd(self.built_sectors_key, str(sector_pk))
+        pipe.execute()
+        return loads
+
+    def sector_loads(self, sector_pk) -> dict:
+        return {
+            user_email.decode(): int(load)
+            for user_email, load in self.redis.zrange(
+                self.sector_key(sector_pk), 0, -1, withscores=True
+            )
+            if load
+        }
+
+    def least_loaded(self, sector_pk, user_emails: list, limit: int):
+        """Returns the email of the agent with less rooms under the limit, if any"""
+        if not user_emails:
+            return None
+        if not self.redis.sismember(self.built_sectors_key, str(sector_pk)):
+            self.rebuild_sector(sector_pk)
+
+        scores = self.redis.zmscore(self.sector_key(sector_pk), user_emails)
+        loads = [
+            (score or 0, user_email)
+            for score, user_email in zip(scores, user_emails)
+            if (score or 0) < limit
+        ]
+        return min(loads)[1] if loads else None
+
+    def check_sector(self, sector_pk) -> dict:
+        """Returns the agents whose indexed load differs from the database, as {email: (index, database)}"""
+        index_loads = self.sector_loads(sector_pk)
+        database_loads = self.database_loads(sector_pk)
+        return {
+            user_email: (
+                index_loads.get(user_email, 0),
+                database_loads.get(user_email, 0),
+            )
+            for user_email in set(index_loads) | set(database_loads)
+            if index_loads.get(user_email, 0) != database_loads.get(user_email, 0)
+        }
@@ -0,0 +1,209 @@
+import json
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+from sentry_sdk import capture_exception
+
+from chats.apps.msgs.models import Message
+from chats.apps.rooms.models import Room
+from chats.apps.rooms.views import assign_queued_room
+from chats.celery import app
+from chats.utils.callbacks import post_callback
+from chats.utils.websockets import coalesce_notifications
+
+LOGGER = logging.getLogger(__name__)
+
+# without celery the callbacks are posted by a single thread, so they keep their order
+callbacks_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="callbacks")
+
+
+def unread_msgs_subquery():
+    return Coalesce(
+        Subquery(
+            Message.objects.filter(room=OuterRef("pk"), seen=False)
+            .order_by()
+            .values("room")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        Value(0),
+    )
+
+
+@app.task(name="reconcile_rooms_unread_msgs")
+def reconcile_rooms_unread_msgs():
+    """Fix the active rooms whose unread messages counter drifted from the messages table"""
+    drifted_rooms = list(
+        Room.objects.filter(is_active=True)
+        .annotate(counted_unread_msgs=unread_msgs_subquery())
+        .exclude(unread_msgs=F("counted_unread_msgs"))
+        .values_list("pk", flat=True)
+    )
+    if not drifted_rooms:
+        return 0
+    return Room.objects.filter(pk__in=drifted_rooms).update(
+        unread_msgs=unread_msgs_subquery()
+    )
+
+
+def room_callbacks_key(room_pk: str) -> str:
+    return f"room_callbacks:{room_pk}"
+
+
+def post_room_callback(room_pk: str, url: str, data: str):
+    """Single delivery attempt of a callback, used without celery"""
+    try:
+        post_callback(url, data)
+    except requests.RequestException as error:
+        LOGGER.error("Dropped the callback of room %s to %s: %s", room_pk, url, error)
+        capture_exception(error)
+
+
+def enqueue_room_callback(room_pk: str, url: str, data: str):
+    """
+    Hand a callback over to the workers, which deliver the events of each room in order.
+    Without celery the callback is sent by a background thread, as a single attempt,
+    so the request does not wait for it either.
+    """
+    if not settings.USE_CELERY:
+        callbacks_executor.submit(post_room_callback, room_pk, url, data)
+        return
+
+    redis_connection = get_redis_connection()
+    redis_connection.rpush(
+        room_callbacks_key(room_pk), json.dumps({"url": url, "data": data})
+    )
+    deliver_room_callbacks.apply_async(
+        args=[room_pk], queue=settings.CALLBACKS_CUSTOM_QUEUE
+    )
+
+
+@app.task(
+    name="deliver_room_callbacks", bind=True, max_retries=settings.CALLBACK_MAX_RETRIES
+)
+def deliver_room_callbacks(self, room_pk: str):
+    """
+    Send the queued callbacks of a room, oldest first.
+    Only one worker drains a room at a time, the others leave their events for it.
+    """
+    redis_connection = get_redis_connection()
+    queue_key = room_callbacks_key(room_pk)
+    lock = redis_connection.lock(
+        f"{queue_key}:lock", timeout=settings.CALLBACK_TIMEOUT * 3
+    )
+    if not lock.acquire(blocking=False):
+        return
+
+    retrying = False
+    try:
+        while True:
+            event = redis_connection.lindex(queue_key, 0)
+            if event is None:
+                break
+            event = json.loads(event)
+            try:
+                post_callback(event["url"], event["data"])
+            except requests.RequestException as error:
+                if self.request.retries < self.max_retries:
+                    retrying = True
+                    raise self.retry(
+                        exc=error,
+                        countdown=settings.CALLBACK_RETRY_BACKOFF
+                        ** (self.request.retries + 1),
+                    )
+                # give up on this event, the next ones start with fresh retries
+                LOGGER.error(
+                    "Dropped the callback of room %s to %s after %s retries: %s",
+                    room_pk,
+                    event["url"],
+                    self.max_retries,
+                    error,
+                )
+                capture_exception(error)
+                redis_connection.lpop(queue_key)
+                break
+            redis_connection.lpop(queue_key)
+            lock.reacquire()
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # the lock expired, the events left are picked by the next delivery
+            pass
+
+    # events may have been queued while the lock was being released
+    if not retrying and redis_connection.llen(queue_key):
+        deliver_room_callbacks.apply_async(
+            args=[room_pk], queue=settings.CALLBACKS_CUSTOM_QUEUE
+        )
+
+
+def distribute_sector_rooms(sector_pk: str) -> int:
+    """
+    Give the queued rooms of the sector, oldest first, to the agents under the rooms limit.
+    Each room is assigned on its own transaction, so the agents load is current for the next one.
+    With USE_ROOMS_BULK_NOTIFICATIONS each agent gets its rooms on a single message.
+    """
+    queued_rooms = list(
+        Room.objects.filter(
+            queue__sector=sector_pk,
+            queue__is_deleted=False,
+            is_active=True,
+            is_waiting=False,
+            user__isnull=True,
+        )
+        .order_by("created_on")
+        .values_list("pk", flat=True)[: settings.ROOMS_DISTRIBUTION_BATCH_SIZE]
+    )
+    full_queues = set()
+    assigned = 0
+    bulk_notifications = settings.USE_ROOMS_BULK_NOTIFICATIONS
+    agents_rooms = defaultdict(list)
+    with coalesce_notifications():
+        for room_pk in queued_rooms:
+            with transaction.atomic():
+                room = (
+                    Room.objects.select_for_update(skip_locked=True, of=("self",))
+                    .select_related("queue__sector")
+                    .filter(pk=room_pk, is_active=True, user__isnull=True)
+                    .first()
+                )
+                if room is None or room.queue_id in full_queues:
+                    continue
+                agent = room.queue.get_available_agent()
+                if agent is None:
+                    full_queues.add(room.queue_id)
+                    continue
+                assign_queued_room(room, agent, notify_user=not bulk_notifications)
+                assigned += 1
+                if bulk_notifications:
+                    agents_rooms[agent].append(room)
+
+        for agent, rooms in agents_rooms.items():
+            Room.notify_user_rooms(agent, rooms, "update")
+    return assigned
+
+
+@app.task(name="distribute_queued_rooms")
+def distribute_queued_rooms(sector_pk: str = None):
+    """Distribute the queued rooms of a sector, or of every sector with queued rooms"""
+    if not settings.USE_ROOMS_DISTRIBUTION:
+        return 0
+    if sector_pk is not None:
+        return distribute_sector_rooms(sector_pk)
+
+    sectors = (
+        Room.objects.filter(is_active=True, is_waiting=False, user__isnull=True)
+        .order_by()
+        .values_list("queue__sector", flat=True)
+        .distinct()
+    )
+    return sum(distribute_sector_rooms(sector) for sector in sectors)
@@ -0,0 +1,45 @@
+from django.test import TestCase, override_settings
+
+from chats.apps.rooms.models import Room
+from chats.benchmarks.lifecycle import OPERATIONS, RoomLifecycleBenchmark, compare
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class RoomLifecycleBenchmarkTests(TestCase):
+    def test_rooms_are_driven_through_the_lifecycle(self):
+        benchmark = RoomLifecycleBenchmark(messages=2)
+        benchmark.setup()
+
+        results = benchmark.run(rooms=2, warmup=1)
+
+        self.assertEqual(list(results["operations"]), OPERATIONS)
+        self.assertEqual(results["operations"]["create_room"]["count"], 2)
+        self.assertEqual(results["operations"]["incoming_message"]["count"], 4)
+        self.assertGreater(results["operations"]["close"]["queries"], 0)
+        rooms = Room.objects.filter(queue=benchmark.queue)
+        self.assertEqual(rooms.count(), 3)
+        self.assertFalse(rooms.filter(is_active=True).exists())
+        self.assertEqual(
+            set(rooms.values_list("user", flat=True)), {benchmark.agents[1][0].email}
+        )
+
+    def test_more_queries_and_slower_latencies_are_regressions(self):
+        baseline = {"operations": {"pick": {"queries": 10, "p50_ms": 20.0}}}
+        results = {
+            "operations": {
+                "pick": {"queries": 10, "p50_ms": 24.0},
+                "close": {"queries": 50, "p50_ms": 90.0},
+            }
+        }
+        self.assertEqual(compare(results, baseline, 0.25, 0), [])
+
+        results["operations"]["pick"] = {"queries": 11, "p50_ms": 26.0}
+        self.assertEqual(
+            compare(results, baseline, 0.25, 0),
+            [
+                "pick: 11 queries, the baseline runs 10",
+                "pick: p50 of 26.0ms, the baseline is 20.0ms",
+            ],
+        )
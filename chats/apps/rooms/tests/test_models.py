@@ -1,7 +1,13 @@
+import json
+from datetime import timedelta
+from unittest.mock import PropertyMock, patch
+
 from django.db import IntegrityError
+from django.utils import timezone
 from rest_framework.test import APITestCase
 
 from chats.apps.rooms.models import Room
+from chats.utils.websockets import channels_group_message, coalesce_notifications
 
 
 class ConstraintTests(APITestCase):
@@ -17,3 +23,156 @@ class ConstraintTests(APITestCase):
             'duplicate key value violates unique constraint "unique_contact_queue_is_activetrue_room"'
             in str(context.exception)
         )
+
+
+class Room24hValidTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.room = Room.objects.get(uuid="090da6d1-959e-4dea-994a-41bf0d38ba26")
+        self.room.urn = "whatsapp:5584999999999"
+
+    def test_recent_contact_message_is_24h_valid(self):
+        self.room.messages.create(contact=self.room.contact, text="Hi")
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.room.is_24h_valid)
+
+    def test_old_contact_message_is_not_24h_valid(self):
+        self.room.last_contact_message_at = timezone.now() - timedelta(days=1, hours=1)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(self.room.is_24h_valid)
+
+    def test_room_without_contact_messages_is_not_24h_valid(self):
+        self.room.last_contact_message_at = None
+
+        self.assertFalse(self.room.is_24h_valid)
+
+    def test_non_whatsapp_room_is_always_24h_valid(self):
+        self.room.urn = "telegram:123"
+        self.room.last_contact_message_at = None
+
+        self.assertTrue(self.room.is_24h_valid)
+
+
+class RoomMessageDataTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def test_saving_a_stale_room_keeps_the_newer_message_data(self):
+        stale_room = Room.objects.get(uuid="090da6d1-959e-4dea-994a-41bf0d38ba26")
+        unread_msgs = stale_room.unread_msgs
+        message = stale_room.messages.model.objects.create(
+            room=Room.objects.get(pk=stale_room.pk),
+            contact=stale_room.contact,
+            text="Are you there?",
+        )
+
+        stale_room.is_waiting = True
+        stale_room.save()
+
+        room = Room.objects.get(pk=stale_room.pk)
+        self.assertTrue(room.is_waiting)
+        self.assertEqual(room.unread_msgs, unread_msgs + 1)
+        self.assertEqual(room.last_message_text, "Are you there?")
+        self.assertEqual(room.last_contact_message_at, message.created_on)
+
+
+@patch.object(Room, "on_state_change")
+class RoomStateChangeTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.room = Room.objects.get(uuid="090da6d1-959e-4dea-994a-41bf0d38ba26")
+        self.state = (self.room.is_active, self.room.user_id, self.room.queue_id)
+
+    def test_closing_the_room_runs_the_state_change_hooks(self, on_state_change):
+        self.room.close()
+
+        on_state_change.assert_called_once_with(
+            self.state, (False, self.room.user_id, self.room.queue_id)
+        )
+
+    def test_unsaved_state_fields_do_not_run_the_hooks(self, on_state_change):
+        self.room.is_active = False
+        self.room.is_waiting = True
+        self.room.save(update_fields=["is_waiting"])
+
+        on_state_change.assert_not_called()
+        self.room.save(update_fields=["is_active"])
+
+        on_state_change.assert_called_once_with(
+            self.state, (False, self.room.user_id, self.room.queue_id)
+        )
+
+    def test_queryset_updates_run_the_state_change_hooks(self, on_state_change):
+        Room.objects.filter(pk=self.room.pk).update(user=None)
+        Room.objects.filter(pk=self.room.pk).update(is_waiting=True)
+
+        on_state_change.assert_called_once_with(
+            self.state, (self.room.is_active, None, self.room.queue_id)
+        )
+
+
+@patch("chats.utils.websockets.send_channels_groups")
+class RoomNotificationCoalescingTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.room = Room.objects.get(uuid="090da6d1-959e-4dea-994a-41bf0d38ba26")
+
+    def sent_messages(self, send_channels_groups):
+        return [
+            message
+            for call in send_channels_groups.call_args_list
+            for message in call.args[0]
+        ]
+
+    def test_notifications_are_sent_on_commit(self, send_channels_groups):
+        with self.captureOnCommitCallbacks(execute=True):
+            with coalesce_notifications():
+                self.room.queue_connection("join")
+            send_channels_groups.assert_not_called()
+
+        send_channels_groups.assert_called_once_with(
+            [
+                (
+                    f"queue_{self.room.queue.pk}",
+                    channels_group_message(
+                        "join", {"name": "room", "id": str(self.room.pk)}, "group.join"
+                    ),
+                )
+            ]
+        )
+
+    def test_duplicated_notifications_are_sent_once(self, send_channels_groups):
+        with self.captureOnCommitCallbacks(execute=True):
+            with coalesce_notifications():
+                self.room.notify_queue("update")
+                self.room.notify_queue("update")
+                self.room.notify_queue("update", transferred_by="agent@chats.com")
+
+        messages = self.sent_messages(send_channels_groups)
+        self.assertEqual(len(messages), 2)
+        transferred_content = json.loads(messages[1][1]["content"])
+        self.assertEqual(transferred_content["transferred_by"], "agent@chats.com")
+
+    def test_room_is_serialized_once(self, send_channels_groups):
+        with patch.object(
+            Room, "serialized_ws_data", new_callable=PropertyMock
+        ) as serialized_ws_data:
+            serialized_ws_data.return_value = {"uuid": str(self.room.pk)}
+            with self.captureOnCommitCallbacks(execute=True):
+                with coalesce_notifications():
+                    self.room.notify_queue("update")
+                    self.room.notify_queue("close")
+
+        self.assertEqual(serialized_ws_data.call_count, 1)
+        self.assertEqual(len(self.sent_messages(send_channels_groups)), 2)
+
+    def test_notifications_are_sent_right_away_without_coalescing(
+        self, send_channels_groups
+    ):
+        self.room.queue_connection("join")
+
+        self.assertEqual(len(self.sent_messages(send_channels_groups)), 1)
@@ -0,0 +1,97 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from chats.apps.api.utils import create_contact, create_user_and_token
+from chats.apps.projects.models import Project, ProjectPermission
+from chats.apps.queues.models import QueueAuthorization
+from chats.apps.rooms.models import Room
+from chats.apps.rooms.routing import AgentLoadIndex
+
+
+@override_settings(USE_AGENT_LOAD_INDEX=True)
+class AgentLoadIndexTests(APITestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name="Routing")
+        self.sector = self.project.sectors.create(
+            name="Routing", rooms_limit=2, work_start="00:00", work_end="23:59"
+        )
+        self.queue = self.sector.queues.create(name="Routing")
+        self.agent, _ = create_user_and_token("agent")
+        self.agent_2, _ = create_user_and_token("agent2")
+        for agent in [self.agent, self.agent_2]:
+            permission = self.project.permissions.create(
+                user=agent,
+                role=ProjectPermission.ROLE_ATTENDANT,
+                status=ProjectPermission.STATUS_ONLINE,
+            )
+            self.queue.authorizations.create(
+                permission=permission, role=QueueAuthorization.ROLE_AGENT
+            )
+
+        self.index = AgentLoadIndex()
+        self.index.redis.delete(
+            self.index.sector_key(self.sector.pk), self.index.built_sectors_key
+        )
+
+    def create_room(self, user=None):
+        contact = create_contact("Contact", "contact@chats.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            return Room.objects.create(queue=self.queue, contact=contact, user=user)
+
+    def test_index_follows_assign_transfer_and_close(self):
+        room = self.create_room(user=self.agent)
+        self.create_room(user=self.agent)
+        self.assertEqual(self.index.sector_loads(self.sector.pk), {self.agent.email: 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            room.user = self.agent_2
+            room.save()
+        self.assertEqual(
+            self.index.sector_loads(self.sector.pk),
+            {self.agent.email: 1, self.agent_2.email: 1},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            room.close()
+        self.assertEqual(self.index.sector_loads(self.sector.pk), {self.agent.email: 1})
+        self.assertEqual(self.index.check_sector(self.sector.pk), {})
+
+    def test_least_loaded_agent_under_the_limit_is_picked(self):
+        self.create_room(user=self.agent)
+        self.assertEqual(self.queue.get_available_agent(), self.agent_2)
+
+        self.create_room(user=self.agent_2)
+        self.create_room(user=self.agent_2)
+        self.assertEqual(self.queue.get_available_agent(), self.agent)
+
+        self.create_room(user=self.agent)
+        self.assertIsNone(self.queue.get_available_agent())
+
+    def test_sector_is_loaded_from_the_database_on_first_read(self):
+        contact = create_contact("Contact", "contact@chats.com")
+        Room.objects.bulk_create(
+            [Room(queue=self.queue, contact=contact, user=self.agent)]
+        )
+
+        self.assertEqual(self.queue.get_available_agent(), self.agent_2)
+
+    def test_checker_rebuilds_drifted_sectors(self):
+        self.create_room(user=self.agent)
+        self.index.redis.zadd(
+            self.index.sector_key(self.sector.pk), {self.agent.email: 5}
+        )
+
+        output = StringIO()
+        call_command(
+            "check_agent_load_index",
+            "--sector",
+            str(self.sector.pk),
+            "--fix",
+            stdout=output,
+        )
+
+        self.assertIn("index 5, database 1", output.getvalue())
+        self.assertEqual(self.index.check_sector(self.sector.pk), {})
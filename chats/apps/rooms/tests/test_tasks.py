@@ -0,0 +1,205 @@
+import json
+import threading
+from unittest.mock import patch
+
+import requests
+from django.test import override_settings
+from django_redis import get_redis_connection
+from rest_framework.test import APITestCase
+
+from chats.apps.api.utils import create_contact, create_user_and_token
+from chats.apps.projects.models import Project, ProjectPermission
+from chats.apps.queues.models import QueueAuthorization
+from chats.apps.rooms.models import Room
+from chats.apps.rooms.tasks import (
+    callbacks_executor,
+    deliver_room_callbacks,
+    distribute_queued_rooms,
+    enqueue_room_callback,
+    reconcile_rooms_unread_msgs,
+    room_callbacks_key,
+)
+from chats.utils.callbacks import get_callback_session
+
+
+class ReconcileUnreadMsgsTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def test_reconcile_fixes_drifted_counters(self):
+        room = Room.objects.filter(is_active=True, messages__seen=False).first()
+        Room.objects.filter(pk=room.pk).update(unread_msgs=999)
+
+        reconcile_rooms_unread_msgs()
+        room.refresh_from_db()
+
+        self.assertEqual(room.unread_msgs, room.messages.filter(seen=False).count())
+
+    def test_reconcile_keeps_counters_in_sync(self):
+        reconcile_rooms_unread_msgs()
+
+        self.assertEqual(reconcile_rooms_unread_msgs(), 0)
+
+
+@override_settings(USE_CELERY=False)
+class RoomCallbackTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.room = Room.objects.get(uuid="090da6d1-959e-4dea-994a-41bf0d38ba26")
+        self.room.callback_url = "http://callback.local/room"
+
+    def wait_callbacks(self):
+        # the executor has a single thread, so this runs after the callbacks queued before
+        callbacks_executor.submit(lambda: None).result(timeout=5)
+
+    @patch("chats.apps.rooms.tasks.post_callback")
+    def test_callback_is_sent_after_commit(self, post_callback):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.request_callback({"uuid": str(self.room.pk)})
+            post_callback.assert_not_called()
+        self.wait_callbacks()
+
+        post_callback.assert_called_once()
+        url, data = post_callback.call_args.args
+        self.assertEqual(url, "http://callback.local/room")
+        self.assertEqual(
+            json.loads(data),
+            {"type": "room.update", "content": {"uuid": str(self.room.pk)}},
+        )
+
+    @patch("chats.apps.rooms.tasks.post_callback")
+    def test_room_without_callback_url_is_not_queued(self, post_callback):
+        self.room.callback_url = None
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.room.request_callback({"uuid": str(self.room.pk)})
+
+        self.assertEqual(callbacks, [])
+        post_callback.assert_not_called()
+
+    def test_callback_is_sent_off_the_request(self):
+        released = threading.Event()
+
+        with patch(
+            "chats.apps.rooms.tasks.post_callback",
+            side_effect=lambda url, data: released.wait(5),
+        ) as post_callback:
+            enqueue_room_callback(str(self.room.pk), self.room.callback_url, "{}")
+            post_callback_calls = post_callback.call_count
+            released.set()
+            self.wait_callbacks()
+
+        self.assertEqual(post_callback_calls, 0)
+        post_callback.assert_called_once()
+
+    @override_settings(USE_CELERY=True)
+    @patch(
+        "chats.apps.rooms.tasks.post_callback",
+        side_effect=requests.ConnectionError(),
+    )
+    def test_callback_dropped_after_the_retries_is_logged(self, post_callback):
+        room_pk = str(self.room.pk)
+        redis_connection = get_redis_connection()
+        redis_connection.delete(room_callbacks_key(room_pk))
+        redis_connection.rpush(
+            room_callbacks_key(room_pk),
+            json.dumps({"url": self.room.callback_url, "data": "{}"}),
+        )
+
+        with self.assertLogs("chats.apps.rooms.tasks", "ERROR") as logs:
+            deliver_room_callbacks.apply(args=[room_pk])
+
+        self.assertIn(self.room.callback_url, logs.output[0])
+        self.assertEqual(
+            post_callback.call_count, deliver_room_callbacks.max_retries + 1
+        )
+        self.assertEqual(redis_connection.llen(room_callbacks_key(room_pk)), 0)
+
+    def test_callback_sessions_are_shared_per_host(self):
+        session = get_callback_session("http://callback.local/room")
+
+        self.assertIs(session, get_callback_session("http://callback.local/msgs"))
+        self.assertIsNot(session, get_callback_session("http://other.local/room"))
+
+
+@override_settings(USE_ROOMS_DISTRIBUTION=True)
+class DistributeQueuedRoomsTests(APITestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name="Distribution")
+        self.sector = self.project.sectors.create(
+            name="Distribution", rooms_limit=1, work_start="00:00", work_end="23:59"
+        )
+        self.queue = self.sector.queues.create(name="Distribution")
+        self.agent, _ = create_user_and_token("agent")
+        permission = self.project.permissions.create(
+            user=self.agent,
+            role=ProjectPermission.ROLE_ATTENDANT,
+            status=ProjectPermission.STATUS_ONLINE,
+        )
+        self.queue.authorizations.create(
+            permission=permission, role=QueueAuthorization.ROLE_AGENT
+        )
+
+    def create_room(self, user=None):
+        contact = create_contact("Contact", "contact@chats.com")
+        return Room.objects.create(queue=self.queue, contact=contact, user=user)
+
+    def test_oldest_queued_rooms_are_assigned_first(self):
+        oldest_room = self.create_room()
+        newest_room = self.create_room()
+
+        self.assertEqual(distribute_queued_rooms(), 1)
+
+        oldest_room.refresh_from_db()
+        newest_room.refresh_from_db()
+        self.assertEqual(oldest_room.user, self.agent)
+        self.assertIsNone(newest_room.user)
+        self.assertEqual(oldest_room.metric.queued_count, 1)
+
+    @override_settings(USE_CELERY=True)
+    @patch("chats.apps.rooms.tasks.distribute_queued_rooms.apply_async")
+    def test_closing_an_agent_room_requests_a_distribution(self, apply_async):
+        room = self.create_room(user=self.agent)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            room.close()
+
+        apply_async.assert_called_once_with(args=[str(self.sector.pk)], queue="celery")
+
+    @override_settings(USE_CELERY=True)
+    @patch("chats.apps.rooms.tasks.distribute_queued_rooms.apply_async")
+    def test_queued_room_updates_do_not_request_a_distribution(self, apply_async):
+        room = self.create_room()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            room.custom_fields = {"key": "value"}
+            room.save()
+
+        apply_async.assert_not_called()
+
+    @override_settings(USE_ROOMS_BULK_NOTIFICATIONS=True)
+    @patch("chats.utils.websockets.send_channels_groups")
+    def test_agent_gets_the_distributed_rooms_on_one_message(
+        self, send_channels_groups
+    ):
+        self.sector.rooms_limit = 3
+        self.sector.save()
+        rooms = [self.create_room(), self.create_room()]
+        permission = self.project.permissions.get(user=self.agent)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(distribute_queued_rooms(), 2)
+
+        agent_messages = [
+            message
+            for call in send_channels_groups.call_args_list
+            for group_name, message in call.args[0]
+            if group_name == f"permission_{permission.pk}"
+            and message["action"].startswith("rooms.")
+        ]
+        self.assertEqual(len(agent_messages), 1)
+        self.assertEqual(agent_messages[0]["action"], "rooms.bulk_update")
+        self.assertEqual(
+            [room["uuid"] for room in json.loads(agent_messages[0]["content"])],
+            [str(room.pk) for room in rooms],
+        )
@@ -1,12 +1,19 @@
+import json
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
-from chats.apps.api.utils import create_contact, create_user_and_token
-from chats.apps.projects.models import Project, ProjectPermission
+from chats.apps.api.utils import create_contact, create_message, create_user_and_token
+from chats.apps.api.v1.rooms.serializers import RoomSerializer
+from chats.apps.projects.models import LinkContact, Project, ProjectPermission
 from chats.apps.queues.models import Queue, QueueAuthorization
 from chats.apps.rooms.models import Room
+from chats.apps.rooms.tasks import reconcile_rooms_unread_msgs
 from chats.apps.sectors.models import Sector, SectorAuthorization
 
 User = get_user_model()
@@ -181,6 +188,29 @@ class RoomMessagesTests(APITestCase):
         self.assertNotEqual(unread_messages_count_new, unread_messages_count_old)
         self.assertEqual(unread_messages_count_new, 0)
 
+    def test_read_all_messages_resets_unread_counter(self):
+        self.room.messages.create(contact=self.room.contact, text="Hi")
+
+        response = self._update_message_status(
+            token=self.agent_token, data={"seen": True}
+        )
+        self.room.refresh_from_db()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.room.unread_msgs, 0)
+
+    def test_read_list_messages_lowers_unread_counter(self):
+        reconcile_rooms_unread_msgs()
+        self.room.refresh_from_db()
+        unread_msgs_old = self.room.unread_msgs
+        first_msg, second_msg = self.room.messages.filter(seen=False)[:2]
+
+        data = {"seen": True, "messages": [str(first_msg.pk), str(second_msg.pk)]}
+        self._update_message_status(token=self.agent_token, data=data)
+        self.room.refresh_from_db()
+
+        self.assertEqual(self.room.unread_msgs, unread_msgs_old - 2)
+
     def test_read_list_messages(self):
         first_msg, second_msg = self.room.messages.filter(seen=False)[:2]
 
@@ -320,3 +350,73 @@ class RoomsManagerTests(APITestCase):
         room.refresh_from_db()
         self.assertEquals(response.status_code, status.HTTP_200_OK)
         self.assertEquals(room.user, self.agent_2)
+
+
+class RoomListQueriesTests(APITestCase):
+    def setUp(self):
+        self.agent, self.agent_token = create_user_and_token("agent")
+        self.project = Project.objects.create(name="Test Project")
+        self.agent_perm = self.project.permissions.create(
+            user=self.agent, role=ProjectPermission.ROLE_ATTENDANT
+        )
+        self.sector = Sector.objects.create(
+            name="Test Sector",
+            project=self.project,
+            rooms_limit=100,
+            work_start="00:00",
+            work_end="23:59",
+        )
+        self.queue = Queue.objects.create(name="Q1", sector=self.sector)
+        self.queue.authorizations.create(
+            permission=self.agent_perm, role=QueueAuthorization.ROLE_AGENT
+        )
+        self.tag = self.sector.tags.create(name="tag")
+
+    def _create_rooms(self, amount: int):
+        for index in range(amount):
+            contact = create_contact(f"Contact {index}", f"contact{index}@mail.com")
+            room = Room.objects.create(
+                contact=contact,
+                queue=self.queue,
+                user=self.agent,
+                urn="whatsapp:5582999999999" if index % 2 else "telegram:123",
+            )
+            room.tags.add(self.tag)
+            create_message("Hello", room, contact=contact)
+            create_message("Hi", room, user=self.agent)
+            if index % 3 == 0:
+                LinkContact.objects.create(
+                    contact=contact, user=self.agent, project=self.project
+                )
+                room.flowstarts.create(project=self.project, name="flow")
+
+    def _list_rooms(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.agent_token.key)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse("room-list"), data={"project": self.project.uuid, "limit": 50}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json().get("results"), len(context.captured_queries)
+
+    def test_list_rooms_query_count_does_not_grow_with_page(self):
+        self._create_rooms(2)
+        results, small_page_queries = self._list_rooms()
+        self.assertEqual(len(results), 2)
+
+        self._create_rooms(8)
+        results, big_page_queries = self._list_rooms()
+        self.assertEqual(len(results), 10)
+
+        self.assertEqual(small_page_queries, big_page_queries)
+        self.assertEqual(big_page_queries, 10)
+
+    def test_batched_serialization_matches_per_room_serialization(self):
+        self._create_rooms(4)
+        results, _ = self._list_rooms()
+
+        for result in results:
+            room = Room.objects.get(pk=result["uuid"])
+            room.last_interaction = room.last_message_at
+            expected = json.loads(JSONRenderer().render(RoomSerializer(room).data))
+            self.assertEqual(result, expected)
@@ -2,10 +2,13 @@ import json
 
 from django.conf import settings
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.exceptions import APIException
 
 from chats.apps.api.v1.internal.rest_clients.flows_rest_client import FlowRESTClient
+from chats.apps.dashboard.models import RoomMetrics
 from chats.apps.dashboard.tasks import close_metrics, generate_metrics
 from chats.apps.rooms.models import Room
 
@@ -17,6 +20,7 @@ def close_room(room_pk: str):
                 args=[room_pk], queue=settings.METRICS_CUSTOM_QUEUE
             )
         )
+        return
     generate_metrics(room_pk)
 
 
@@ -79,3 +83,37 @@ def create_room_feedback_message(room: object, feedback: dict, method: str):
         seen=True,
     )
     msg.notify_room("create")
+
+
+def update_room_waiting_time(room: Room, queued_since):
+    """Account the time the room spent on the queue before getting an agent"""
+    time = timezone.now() - queued_since
+    RoomMetrics.update_room(
+        room,
+        waiting_time=F("waiting_time") + int(time.total_seconds()),
+        queued_count=F("queued_count") + 1,
+    )
+
+
+def assign_queued_room(room: Room, user, notify_user: bool = True):
+    """
+    Give a queued room to the agent, notifying the agent and the queue.
+    The caller notifies the agent itself when notify_user is False.
+    """
+    queued_since = room.modified_on
+    room.user = user
+
+    feedback = create_transfer_json(
+        action="forward",
+        from_="",
+        to=room.user,
+    )
+    room.transfer_history = feedback
+    room.save()
+
+    if notify_user:
+        room.notify_user("update")
+    room.notify_queue("update")
+
+    create_room_feedback_message(room, feedback, method="rt")
+    update_room_waiting_time(room, queued_since)
@@ -1,4 +1,5 @@
 import pendulum
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
@@ -6,8 +7,9 @@ from django.db.models import Count, F, Q, Value
 from django.db.models.functions import Concat
 from django.utils.translation import gettext_lazy as _
 
+from chats.apps.projects.presence import AgentPresence
 from chats.core.models import BaseConfigurableModel, BaseModel, BaseSoftDeleteModel
-from chats.utils.websockets import send_channels_group
+from chats.utils.websockets import notify_channels_group
 
 User = get_user_model()
 
@@ -170,16 +172,24 @@ class Sector(BaseSoftDeleteModel, BaseConfigurableModel, BaseModel):
         if self.open_offline:
             return True
         is_online = False
+        online_filter = {"permission__status": "ONLINE"}
+        if settings.USE_AGENT_PRESENCE_READS:
+            online_filter["permission__pk__in"] = AgentPresence().online_permissions(
+                self.project_id
+            )
         if queue:
-            is_online = queue.authorizations.filter(
-                permission__status="ONLINE"
-            ).exists()
+            is_online = queue.authorizations.filter(**online_filter).exists()
         else:
             is_online = (
                 self.queues.annotate(
                     online_count=Count(
                         "authorizations",
-                        filter=Q(authorizations__permission__status="ONLINE"),
+                        filter=Q(
+                            **{
+                                f"authorizations__{lookup}": value
+                                for lookup, value in online_filter.items()
+                            }
+                        ),
                     )
                 )
                 .filter(online_count__gt=0)
@@ -286,11 +296,12 @@ class SectorAuthorization(BaseModel):
 
     def notify_user(self, action):
         """ """
-        send_channels_group(
+        notify_channels_group(
             group_name=f"permission_{self.permission.user.pk}",
             call_type="notify",
-            content=self.serialized_ws_data,
             action=f"sector_authorization.{action}",
+            content=self.serialized_ws_data if action == "destroy" else None,
+            instance=self,
         )
 
     @property
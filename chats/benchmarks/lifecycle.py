@@ -0,0 +1,250 @@
+import time
+import uuid
+from contextlib import ExitStack
+
+import numpy as np
+from django.db import connections
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from chats.apps.accounts.models import User
+from chats.apps.projects.models import Project, ProjectPermission
+from chats.apps.queues.models import QueueAuthorization
+from chats.apps.sectors.models import Sector
+from chats.core.middleware import QueryMetrics
+
+OPERATIONS = [
+    "create_room",
+    "incoming_message",
+    "pick",
+    "agent_message",
+    "transfer",
+    "close",
+]
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class OperationStats:
+    """Latencies and query counts of the runs of an operation"""
+
+    def __init__(self):
+        self.seconds = []
+        self.queries = []
+
+    def add(self, seconds: float, queries: int):
+        self.seconds.append(seconds)
+        self.queries.append(queries)
+
+    def summary(self) -> dict:
+        seconds = np.array(self.seconds)
+        p50, p99 = np.percentile(seconds, [50, 99])
+        return {
+            "count": len(seconds),
+            "throughput": round(len(seconds) / seconds.sum(), 2),
+            "p50_ms": round(p50 * 1000, 3),
+            "p99_ms": round(p99 * 1000, 3),
+            "queries": round(float(np.mean(self.queries)), 2),
+        }
+
+
+class RoomLifecycleBenchmark:
+    """
+    Drives rooms through their lifecycle with the API client, as the flows and the agents do:
+    the room is created by a flow, the contact sends messages, an agent picks the room,
+    answers it and transfers it to another agent, who closes it with the metrics.
+    Each request runs the whole middleware stack and is timed with its SQL queries.
+    """
+
+    def __init__(self, messages: int = 3):
+        self.messages = messages
+        self.client = APIClient()
+
+    def setup(self):
+        suffix = uuid.uuid4().hex[:8]
+        project = Project.objects.create(name=f"Benchmark {suffix}", timezone="UTC")
+        sector = Sector.objects.create(
+            name="Benchmark",
+            project=project,
+            rooms_limit=1_000_000,
+            work_start="00:00",
+            work_end="23:59",
+            open_offline=True,
+        )
+        self.queue = sector.queues.create(name="Benchmark")
+
+        admin = User.objects.create(email=f"benchmark-admin-{suffix}@chats.weni.ai")
+        self.admin_permission = project.permissions.create(
+            user=admin, role=ProjectPermission.ROLE_ADMIN
+        )
+        self.agents = []
+        for index in range(2):
+            agent = User.objects.create(
+                email=f"benchmark-agent-{index}-{suffix}@chats.weni.ai"
+            )
+            permission = project.permissions.create(
+                user=agent, role=ProjectPermission.ROLE_ATTENDANT
+            )
+            self.queue.authorizations.create(
+                permission=permission, role=QueueAuthorization.ROLE_AGENT
+            )
+            self.agents.append((agent, Token.objects.create(user=agent).key))
+
+    def run(self, rooms: int, warmup: int = 0) -> dict:
+        """Run the lifecycle of warmup + rooms rooms, the warmup rooms are not measured"""
+        for index in range(warmup):
+            self.lifecycle(f"warmup-{index}", {})
+
+        stats = {operation: OperationStats() for operation in OPERATIONS}
+        started = time.perf_counter()
+        for index in range(rooms):
+            self.lifecycle(str(index), stats)
+        elapsed = time.perf_counter() - started
+
+        return {
+            "rooms": rooms,
+            "messages": self.messages,
+            "rooms_per_second": round(rooms / elapsed, 2),
+            "operations": {
+                operation: operation_stats.summary()
+                for operation, operation_stats in stats.items()
+            },
+        }
+
+    def lifecycle(self, name: str, stats: dict):
+        (agent, agent_token), (other_agent, other_token) = self.agents
+        flows = f"Bearer {self.admin_permission.uuid}"
+
+        room = self.request(
+            stats,
+            "create_room",
+            "post",
+            reverse("external_rooms-list"),
+            flows,
+            {
+                "queue_uuid": str(self.queue.uuid),
+                "contact": {
+                    "external_id": str(uuid.uuid4()),
+                    "name": f"Contact {name}",
+                    "email": f"contact-{name}@chats.weni.ai",
+                    "phone": "+5582999999999",
+                    "urn": "whatsapp:5582999999999",
+                    "custom_fields": {},
+                },
+            },
+            201,
+        )
+        room_pk = room["uuid"]
+        for index in range(self.messages):
+            self.request(
+                stats,
+                "incoming_message",
+                "post",
+                reverse("external_message-list"),
+                flows,
+                {
+                    "room": room_pk,
+                    "text": f"Hello {index}",
+                    "direction": "incoming",
+                    "attachments": [],
+                },
+                201,
+            )
+
+        room_url = reverse("room-detail", kwargs={"pk": room_pk})
+        self.request(
+            stats,
+            "pick",
+            "patch",
+            room_url,
+            f"Token {agent_token}",
+            {"user_email": agent.email},
+            200,
+        )
+        self.request(
+            stats,
+            "agent_message",
+            "post",
+            reverse("message-list"),
+            f"Token {agent_token}",
+            {"room": room_pk, "text": "How can I help?", "user_email": agent.email},
+            201,
+        )
+        self.request(
+            stats,
+            "transfer",
+            "patch",
+            room_url,
+            f"Token {agent_token}",
+            {"user_email": other_agent.email},
+            200,
+        )
+        self.request(
+            stats,
+            "close",
+            "patch",
+            reverse("room-close", kwargs={"pk": room_pk}),
+            f"Token {other_token}",
+            {},
+            200,
+        )
+
+    def request(
+        self,
+        stats: dict,
+        operation: str,
+        method: str,
+        url: str,
+        authorization: str,
+        data: dict,
+        expected_status: int,
+    ) -> dict:
+        self.client.credentials(HTTP_AUTHORIZATION=authorization)
+        query_metrics = QueryMetrics()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(query_metrics))
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, data=data, format="json")
+            seconds = time.perf_counter() - started
+
+        if response.status_code != expected_status:
+            raise BenchmarkError(
+                f"{operation} answered {response.status_code}: {response.content[:500]}"
+            )
+        if operation in stats:
+            stats[operation].add(seconds, query_metrics.count)
+        return response.json()
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    latency_tolerance: float,
+    query_tolerance: float,
+) -> list:
+    """
+    The regressions of the results against the baseline: operations running more
+    queries or with a p50 latency slower than the baseline, beyond the tolerances
+    """
+    regressions = []
+    for operation, summary in results["operations"].items():
+        expected = baseline["operations"].get(operation)
+        if expected is None:
+            continue
+        max_queries = expected["queries"] * (1 + query_tolerance)
+        if summary["queries"] > max_queries + 1e-9:
+            regressions.append(
+                f"{operation}: {summary['queries']} queries, "
+                f"the baseline runs {expected['queries']}"
+            )
+        max_p50 = expected["p50_ms"] * (1 + latency_tolerance)
+        if summary["p50_ms"] > max_p50:
+            regressions.append(
+                f"{operation}: p50 of {summary['p50_ms']}ms, "
+                f"the baseline is {expected['p50_ms']}ms"
+            )
+    return regressions
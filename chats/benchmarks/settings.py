@@ -0,0 +1,40 @@
+"""
+Offline settings of the benchmarks, on SQLite unless DATABASE_URL points to a
+local postgres, with the in-memory channel layer and a fake redis.
+
+    DJANGO_SETTINGS_MODULE=chats.benchmarks.settings python manage.py benchmark_room_lifecycle
+
+The benchmarks run on a test database created for the run, the database
+of DATABASE_URL is not written. It defaults to a SQLite file on the
+temporary directory, so no file is left on the working tree. The feature flags are read from the
+environment as usual, so each one can be measured.
+"""
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("PROMETHEUS_AUTH_TOKEN", "benchmark")
+os.environ.setdefault(
+    "DATABASE_URL",
+    "sqlite:///" + os.path.join(tempfile.gettempdir(), "benchmark.sqlite3"),
+)
+
+from chats.settings import *  # noqa: E402,F401,F403
+
+try:
+    from fakeredis import FakeConnection, FakeServer
+except ImportError:  # pragma: no cover
+    raise ImproperlyConfigured("The benchmarks need fakeredis: pip install fakeredis")
+
+ALLOWED_HOSTS = [*ALLOWED_HOSTS, "testserver"]  # noqa: F405
+
+CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+CACHES["default"]["OPTIONS"]["CONNECTION_POOL_KWARGS"] = {  # noqa: F405
+    "connection_class": FakeConnection,
+    "server": FakeServer(),
+}
+
+CELERY_TASK_ALWAYS_EAGER = True
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chats.core"
+
+    def ready(self):
+        if settings.USE_SLOW_QUERY_LOG:
+            from celery.signals import task_prerun
+            from django.db.backends.signals import connection_created
+
+            from chats.core.slow_queries import (
+                install_slow_query_log,
+                name_task_queries,
+            )
+
+            connection_created.connect(install_slow_query_log)
+            task_prerun.connect(name_task_queries)
@@ -0,0 +1,76 @@
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from chats.utils.websockets import channels_group_message, send_channels_groups
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sending a notification group by group with the batched fan-out, "
+        "using the in-memory channel layer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--groups",
+            type=int,
+            nargs="+",
+            default=[1, 10, 50, 100, 500],
+            help="Amounts of groups to fan out to",
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=20,
+            help="How many times each fan-out is repeated",
+        )
+
+    def handle(self, *args, **options):
+        rounds = options["rounds"]
+        self.stdout.write(f"{'groups':>8} {'per call (ms)':>15} {'batched (ms)':>15}")
+        for groups in options["groups"]:
+            channel_layer = InMemoryChannelLayer()
+            messages = self.subscribe_groups(channel_layer, groups)
+
+            per_call = self.measure(
+                channel_layer,
+                rounds,
+                lambda: self.send_per_call(channel_layer, messages),
+            )
+            batched = self.measure(
+                channel_layer,
+                rounds,
+                lambda: send_channels_groups(messages, channel_layer=channel_layer),
+            )
+            self.stdout.write(f"{groups:>8} {per_call:>15.3f} {batched:>15.3f}")
+
+    def subscribe_groups(self, channel_layer, groups: int) -> list:
+        messages = []
+        for index in range(groups):
+            group_name = f"benchmark_{index}"
+            channel_name = async_to_sync(channel_layer.new_channel)()
+            async_to_sync(channel_layer.group_add)(group_name, channel_name)
+            messages.append(
+                (group_name, channels_group_message("notify", {"id": index}, "test"))
+            )
+        return messages
+
+    def send_per_call(self, channel_layer, messages: list):
+        for group_name, message in messages:
+            async_to_sync(channel_layer.group_send)(group_name, message)
+
+    def measure(self, channel_layer, rounds: int, send) -> float:
+        """Returns the mean time of a fan-out, in milliseconds"""
+        elapsed = 0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            send()
+            elapsed += time.perf_counter() - start
+            # drop the delivered messages, so the channels never get full
+            for channel in channel_layer.channels.values():
+                while not channel.empty():
+                    channel.get_nowait()
+        return elapsed / rounds * 1000
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from chats.core.profiling import PROFILE_HEADER, profile_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a signed profiling header. Requests and websocket connections "
+        "sent with it are profiled while USE_PROFILER is set."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{PROFILE_HEADER}: {profile_token()}")
@@ -0,0 +1,165 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from chats.apps.api.v1.prometheus import metrics
+from chats.core.profiling import (
+    PROFILE_HEADER,
+    SamplingProfiler,
+    save_profile,
+    should_profile,
+)
+from chats.core.slow_queries import query_context, set_query_context
+from chats.utils.websockets import coalesce_notifications
+
+HTTP_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+
+class WebsocketNotificationMiddleware:
+    """
+    Coalesce the websocket notifications sent while handling a request,
+    they are sent once the request data is committed
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with coalesce_notifications():
+            return self.get_response(request)
+
+
+class QueryMetrics:
+    """Database execute wrapper counting the queries and the time spent on them"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def view_endpoint(request, view_func) -> str:
+    """
+    The view name used as metrics label, as ViewSet.action for the DRF viewsets,
+    View.method for the other class based views and the function name otherwise.
+    Labels come from the code, so their cardinality is bounded by the routes.
+    """
+    view_class = getattr(view_func, "cls", None) or getattr(
+        view_func, "view_class", None
+    )
+    if view_class is None:
+        return getattr(view_func, "__name__", "unknown")
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f"{view_class.__name__}.{action}"
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the latency, the SQL queries count and time, the response size
+    and the errors of each request on prometheus, labeled by view and action.
+    """
+
+    def __init__(self, get_response):
+        if not settings.USE_PROMETHEUS_METRICS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.metrics_endpoint = "unresolved"
+        query_metrics = QueryMetrics()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(query_metrics))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        endpoint = request.metrics_endpoint
+        method = request.method if request.method in HTTP_METHODS else "other"
+        metrics.chats_http_request_duration_seconds.labels(endpoint, method).observe(
+            duration
+        )
+        metrics.chats_http_request_db_queries.labels(endpoint).observe(
+            query_metrics.count
+        )
+        metrics.chats_http_request_db_seconds.labels(endpoint).observe(
+            query_metrics.seconds
+        )
+        if not response.streaming:
+            metrics.chats_http_response_size_bytes.labels(endpoint).observe(
+                len(response.content)
+            )
+        metrics.chats_http_requests.labels(
+            endpoint, method, f"{response.status_code // 100}xx"
+        ).inc()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_endpoint = view_endpoint(request, view_func)
+
+    def process_exception(self, request, exception):
+        metrics.chats_http_request_errors.labels(request.metrics_endpoint).inc()
+
+
+class ProfilerMiddleware:
+    """
+    Profile the sampled requests, PROFILER_SAMPLE_RATE of them and the ones
+    sent with a signed X-Chats-Profile header, and store the profiles.
+    Not loaded unless USE_PROFILER is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.USE_PROFILER:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request.headers.get(PROFILE_HEADER)):
+            return self.get_response(request)
+
+        request.profiler_endpoint = "unresolved"
+        with SamplingProfiler() as profiler:
+            response = self.get_response(request)
+        save_profile(
+            profiler,
+            kind="http",
+            endpoint=request.profiler_endpoint,
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, "profiler_endpoint"):
+            request.profiler_endpoint = view_endpoint(request, view_func)
+
+
+class QueryContextMiddleware:
+    """
+    Name the queries of each request after its view and action on the slow query log.
+    Not loaded unless USE_SLOW_QUERY_LOG is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.USE_SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with query_context("unresolved"):
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_query_context(view_endpoint(request, view_func))
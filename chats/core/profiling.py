@@ -0,0 +1,151 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+PROFILE_HEADER = "X-Chats-Profile"
+PROFILE_TOKEN_SALT = "chats.core.profiling"
+
+
+class SamplingProfiler:
+    """
+    Wall clock profiler of a single thread. A background thread samples the stack
+    of the profiled thread every PROFILER_INTERVAL seconds, so the profiled code
+    runs untouched and the cost does not depend on how many calls it makes.
+    """
+
+    def __init__(self, thread_id: int = None, interval: float = None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or settings.PROFILER_INTERVAL
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.stacks[self.fold(frame)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def fold(frame) -> str:
+        """The stack from the outermost call, as module:function names joined by ;"""
+        calls = []
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "?")
+            calls.append(f"{module}:{frame.f_code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(calls))
+
+    def folded(self) -> list:
+        """Collapsed stacks with their samples, the flame graph tools input"""
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+
+def profile_token() -> str:
+    """A value of the profiling header, valid for PROFILER_TOKEN_MAX_AGE"""
+    return signing.TimestampSigner(salt=PROFILE_TOKEN_SALT).sign(uuid.uuid4().hex)
+
+
+def valid_profile_token(token: str) -> bool:
+    try:
+        signing.TimestampSigner(salt=PROFILE_TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def should_profile(token: str = None) -> bool:
+    if token and valid_profile_token(token):
+        return True
+    return random.random() < settings.PROFILER_SAMPLE_RATE
+
+
+def save_profile(profiler: SamplingProfiler, kind: str, endpoint: str, **metadata):
+    """
+    Store the profile as JSON on the default storage, the endpoint and
+    the start are in the file name so the profiles are listed unread
+    """
+    now = timezone.now()
+    endpoint = re.sub(r"[^\w.-]", "_", endpoint)
+    name = (
+        f"{settings.PROFILER_STORAGE_PATH}/{now:%Y-%m-%d}/"
+        f"{now:%H%M%S}_{kind}_{endpoint}_{uuid.uuid4().hex[:8]}.json"
+    )
+    profile = {
+        "kind": kind,
+        "endpoint": endpoint,
+        "created_on": now.isoformat(),
+        "duration": profiler.duration,
+        "interval": profiler.interval,
+        "samples": profiler.samples,
+        **metadata,
+        "stacks": profiler.folded(),
+    }
+    return default_storage.save(name, ContentFile(json.dumps(profile).encode()))
+
+
+def list_profiles(limit: int = 100) -> list:
+    """The newest stored profiles, described from their file names"""
+    root = settings.PROFILER_STORAGE_PATH
+    try:
+        days, _ = default_storage.listdir(root)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for day in sorted(days, reverse=True):
+        _, files = default_storage.listdir(f"{root}/{day}")
+        for file_name in sorted(files, reverse=True):
+            started, kind, rest = os.path.splitext(file_name)[0].split("_", 2)
+            profiles.append(
+                {
+                    "name": f"{root}/{day}/{file_name}",
+                    "created_on": f"{day}T{started[:2]}:{started[2:4]}:{started[4:]}",
+                    "kind": kind,
+                    "endpoint": rest.rsplit("_", 1)[0],
+                }
+            )
+            if len(profiles) >= limit:
+                return profiles
+    return profiles
+
+
+def read_profile(name: str) -> dict:
+    root = settings.PROFILER_STORAGE_PATH.rstrip("/") + "/"
+    if not name.startswith(root) or ".." in name or not default_storage.exists(name):
+        raise FileNotFoundError(name)
+    with default_storage.open(name) as profile_file:
+        return json.loads(profile_file.read())
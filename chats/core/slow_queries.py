@@ -0,0 +1,214 @@
+import hashlib
+import logging
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from chats.apps.api.v1.prometheus import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+_query_context = ContextVar("query_context", default="")
+
+SQL_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+@contextmanager
+def query_context(name: str):
+    """Name the request or consumer handler that runs the queries of the block"""
+    token = _query_context.set(name)
+    try:
+        yield
+    finally:
+        _query_context.reset(token)
+
+
+def set_query_context(name: str):
+    _query_context.set(name)
+
+
+def normalize_sql(sql: str) -> str:
+    """The SQL without its literals, so the runs of a query share it"""
+    for pattern, replacement in SQL_LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def sql_fingerprint(normalized_sql: str) -> str:
+    return hashlib.sha256(normalized_sql.encode()).hexdigest()[:16]
+
+
+def query_callsite(frame) -> tuple:
+    """
+    The innermost frame of the chats code that issued the query, as the
+    Class.method or function name, like Sector.validate_agent_status,
+    and its path:line location
+    """
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("chats.") and module != __name__:
+            code = frame.f_code
+            name = getattr(code, "co_qualname", None)
+            if name is None:
+                owner = frame.f_locals.get("self", frame.f_locals.get("cls"))
+                if owner is not None:
+                    owner = owner if isinstance(owner, type) else type(owner)
+                    name = f"{owner.__name__}.{code.co_name}"
+                else:
+                    name = code.co_name
+            path = module.replace(".", "/") + ".py"
+            return name, f"{path}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "unknown", ""
+
+
+class SlowQueryLog:
+    """
+    The queries slower than SLOW_QUERY_THRESHOLD, aggregated on redis by
+    fingerprint, with the code and the handlers that issued them. The stats
+    of a fingerprint expire SLOW_QUERY_LOG_TTL after its last slow run.
+    """
+
+    ranking_key = "slow_queries:ranking"
+
+    def __init__(self, redis_connection=None):
+        self.redis = redis_connection or get_redis_connection()
+
+    def stats_key(self, fingerprint: str) -> str:
+        return f"slow_queries:stats:{fingerprint}"
+
+    def callsites_key(self, fingerprint: str) -> str:
+        return f"slow_queries:callsites:{fingerprint}"
+
+    def contexts_key(self, fingerprint: str) -> str:
+        return f"slow_queries:contexts:{fingerprint}"
+
+    def record(
+        self, fingerprint: str, sql: str, seconds: float, callsite: str, context: str
+    ):
+        ttl = settings.SLOW_QUERY_LOG_TTL
+        stats_key = self.stats_key(fingerprint)
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(stats_key, "sql", sql)
+            pipe.hincrby(stats_key, "count", 1)
+            pipe.hincrbyfloat(stats_key, "seconds", seconds)
+            pipe.hget(stats_key, "max_seconds")
+            pipe.hincrby(self.callsites_key(fingerprint), callsite, 1)
+            pipe.hincrby(self.contexts_key(fingerprint), context or "unknown", 1)
+            pipe.zincrby(self.ranking_key, seconds, fingerprint)
+            for key in (
+                stats_key,
+                self.callsites_key(fingerprint),
+                self.contexts_key(fingerprint),
+                self.ranking_key,
+            ):
+                pipe.expire(key, ttl)
+            max_seconds = pipe.execute()[3]
+        if max_seconds is None or float(max_seconds) < seconds:
+            self.redis.hset(stats_key, "max_seconds", seconds)
+
+    def top(self, limit: int = 50) -> list:
+        """The slow queries that took the most time, the slowest first"""
+        ranking = self.redis.zrevrange(self.ranking_key, 0, limit - 1)
+        with self.redis.pipeline(transaction=False) as pipe:
+            for fingerprint in ranking:
+                fingerprint = fingerprint.decode()
+                pipe.hgetall(self.stats_key(fingerprint))
+                pipe.hgetall(self.callsites_key(fingerprint))
+                pipe.hgetall(self.contexts_key(fingerprint))
+            results = pipe.execute()
+
+        queries = []
+        grouped = zip(ranking, results[0::3], results[1::3], results[2::3])
+        for fingerprint, stats, callsites, contexts in grouped:
+            if not stats:
+                continue
+            count = int(stats[b"count"])
+            seconds = float(stats[b"seconds"])
+            queries.append(
+                {
+                    "fingerprint": fingerprint.decode(),
+                    "sql": stats[b"sql"].decode(),
+                    "count": count,
+                    "seconds": seconds,
+                    "mean_seconds": seconds / count,
+                    "max_seconds": float(stats.get(b"max_seconds", 0)),
+                    "callsites": self.decode_counts(callsites),
+                    "contexts": self.decode_counts(contexts),
+                }
+            )
+        return queries
+
+    @staticmethod
+    def decode_counts(counts: dict) -> dict:
+        return dict(
+            sorted(
+                ((key.decode(), int(value)) for key, value in counts.items()),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+        )
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """
+    Database execute wrapper recording the queries slower than SLOW_QUERY_THRESHOLD.
+    The fast queries only pay for a timer, recording never breaks the query.
+    """
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - start
+        if seconds >= settings.SLOW_QUERY_THRESHOLD:
+            record_slow_query(sql, seconds, sys._getframe(1))
+
+
+def record_slow_query(sql: str, seconds: float, frame):
+    try:
+        normalized_sql = normalize_sql(sql)
+        fingerprint = sql_fingerprint(normalized_sql)
+        callsite, location = query_callsite(frame)
+        handler = _query_context.get()
+        LOGGER.warning(
+            "Slow query %s took %.3fs at %s (%s) on %s: %s",
+            fingerprint,
+            seconds,
+            callsite,
+            location,
+            handler or "unknown",
+            normalized_sql,
+        )
+        metrics.chats_db_slow_queries.labels(fingerprint, callsite).inc()
+        metrics.chats_db_slow_query_seconds.labels(fingerprint, callsite).inc(seconds)
+        SlowQueryLog().record(
+            fingerprint,
+            normalized_sql,
+            seconds,
+            f"{callsite} ({location})" if location else callsite,
+            handler,
+        )
+    except Exception:
+        LOGGER.exception("Could not record a slow query")
+
+
+def install_slow_query_log(sender, connection, **kwargs):
+    """connection_created receiver wrapping the new connections"""
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_queries)
+
+
+def name_task_queries(sender=None, **kwargs):
+    """task_prerun receiver naming the queries of the celery tasks"""
+    set_query_context(f"task {getattr(sender, 'name', 'unknown')}")
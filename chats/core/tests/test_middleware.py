@@ -0,0 +1,116 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import override_settings
+from prometheus_client import REGISTRY
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from chats.apps.accounts.models import User
+from chats.core.middleware import QueryMetrics
+
+
+@override_settings(USE_PROMETHEUS_METRICS=True)
+class RequestMetricsMiddlewareTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        user = User.objects.get(email="brucebanner@chats.weni.ai")
+        token = Token.objects.get_or_create(user=user)[0]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+        self.url = "/v1/dashboard/34a93b52-231e-11ed-861d-0242ac120002/general/"
+
+    def sample(self, name: str, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_labeled_by_viewset_action(self):
+        endpoint = "DashboardLiveViewset.general"
+        requests = self.sample(
+            "chats_http_requests_total", endpoint=endpoint, method="GET", status="2xx"
+        )
+        durations = self.sample(
+            "chats_http_request_duration_seconds_count", endpoint=endpoint, method="GET"
+        )
+        queries = self.sample("chats_http_request_db_queries_sum", endpoint=endpoint)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.sample(
+                "chats_http_requests_total",
+                endpoint=endpoint,
+                method="GET",
+                status="2xx",
+            ),
+            requests + 1,
+        )
+        self.assertEqual(
+            self.sample(
+                "chats_http_request_duration_seconds_count",
+                endpoint=endpoint,
+                method="GET",
+            ),
+            durations + 1,
+        )
+        self.assertGreater(
+            self.sample("chats_http_request_db_queries_sum", endpoint=endpoint),
+            queries,
+        )
+        self.assertGreater(
+            self.sample("chats_http_response_size_bytes_sum", endpoint=endpoint), 0
+        )
+
+    def test_unresolved_urls_share_one_label(self):
+        requests = self.sample(
+            "chats_http_requests_total",
+            endpoint="unresolved",
+            method="GET",
+            status="4xx",
+        )
+
+        self.client.get("/v1/not-a-route/123/")
+        self.client.get("/v1/not-a-route/456/")
+
+        self.assertEqual(
+            self.sample(
+                "chats_http_requests_total",
+                endpoint="unresolved",
+                method="GET",
+                status="4xx",
+            ),
+            requests + 2,
+        )
+
+    def test_unhandled_errors_are_counted(self):
+        errors = self.sample(
+            "chats_http_request_errors_total", endpoint="DashboardLiveViewset.general"
+        )
+        self.client.raise_request_exception = False
+
+        with patch(
+            "chats.apps.api.v1.dashboard.viewsets.dashboard_general_data",
+            side_effect=ValueError,
+        ):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(
+            self.sample(
+                "chats_http_request_errors_total",
+                endpoint="DashboardLiveViewset.general",
+            ),
+            errors + 1,
+        )
+
+
+class QueryMetricsTests(APITestCase):
+    def test_queries_are_counted(self):
+        query_metrics = QueryMetrics()
+
+        with connection.execute_wrapper(query_metrics):
+            User.objects.count()
+            User.objects.exists()
+
+        self.assertEqual(query_metrics.count, 2)
+        self.assertGreater(query_metrics.seconds, 0)
@@ -0,0 +1,128 @@
+import tempfile
+import time
+
+from asgiref.testing import ApplicationCommunicator
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.test import SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from chats.apps.accounts.models import User
+from chats.core.profiling import (
+    SamplingProfiler,
+    list_profiles,
+    profile_token,
+    valid_profile_token,
+)
+from chats.core.websockets.profiling import ConsumerProfilerMixin
+
+
+class SamplingProfilerTests(SimpleTestCase):
+    def wait_for_io(self):
+        time.sleep(0.05)
+
+    def test_the_stacks_of_the_profiled_thread_are_sampled(self):
+        with SamplingProfiler(interval=0.001) as profiler:
+            self.wait_for_io()
+
+        self.assertGreater(profiler.samples, 0)
+        self.assertGreaterEqual(profiler.duration, 0.05)
+        self.assertTrue(
+            any(
+                "chats.core.tests.test_profiling:wait_for_io" in stack
+                for stack in profiler.stacks
+            )
+        )
+
+    def test_only_signed_tokens_are_valid(self):
+        self.assertTrue(valid_profile_token(profile_token()))
+        self.assertFalse(valid_profile_token("profile-me"))
+
+
+@override_settings(
+    USE_PROFILER=True, PROFILER_SAMPLE_RATE=0, MEDIA_ROOT=tempfile.mkdtemp()
+)
+class ProfilerMiddlewareTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        self.user = User.objects.get(email="brucebanner@chats.weni.ai")
+        token = Token.objects.get_or_create(user=self.user)[0]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+        self.url = "/v1/dashboard/34a93b52-231e-11ed-861d-0242ac120002/general/"
+
+    def test_requests_with_a_signed_header_are_profiled(self):
+        profiles = len(list_profiles())
+
+        self.client.get(self.url)
+        self.assertEqual(len(list_profiles()), profiles)
+
+        response = self.client.get(self.url, HTTP_X_CHATS_PROFILE=profile_token())
+
+        self.assertEqual(response.status_code, 200)
+        newest = list_profiles()[0]
+        self.assertEqual(len(list_profiles()), profiles + 1)
+        self.assertEqual(newest["kind"], "http")
+        self.assertEqual(newest["endpoint"], "DashboardLiveViewset.general")
+
+    def test_profiles_are_listed_for_staff_users_only(self):
+        self.client.get(self.url, HTTP_X_CHATS_PROFILE=profile_token())
+
+        response = self.client.get("/v1/profiles/")
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.get("/v1/profiles/")
+        self.assertEqual(response.status_code, 200)
+        name = response.json()["results"][0]["name"]
+
+        response = self.client.get(f"/v1/profiles/{name}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["method"], "GET")
+        self.assertIn("stacks", response.json())
+
+        response = self.client.get("/v1/profiles/../settings.py")
+        self.assertEqual(response.status_code, 404)
+
+
+class ProfiledTestConsumer(ConsumerProfilerMixin, AsyncJsonWebsocketConsumer):
+    channel_layer_alias = "unconfigured"
+
+    async def receive_json(self, content, **kwargs):
+        await self.send_json({"type": "pong"})
+
+
+@override_settings(
+    USE_PROFILER=True, PROFILER_SAMPLE_RATE=0, MEDIA_ROOT=tempfile.mkdtemp()
+)
+class ConsumerProfilerTests(SimpleTestCase):
+    async def receive(self, headers: list):
+        communicator = ApplicationCommunicator(
+            ProfiledTestConsumer.as_asgi(),
+            {"type": "websocket", "path": "/ws", "headers": headers},
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        await communicator.receive_output()
+        await communicator.send_input(
+            {
+                "type": "websocket.receive",
+                "text": '{"type": "method", "action": "join"}',
+            }
+        )
+        self.assertEqual(
+            await communicator.receive_output(),
+            {"type": "websocket.send", "text": '{"type": "pong"}'},
+        )
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait()
+
+    async def test_connections_with_a_signed_header_are_profiled(self):
+        await self.receive([])
+        self.assertEqual(list_profiles(), [])
+
+        await self.receive([(b"x-chats-profile", profile_token().encode())])
+
+        profiles = list_profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]["kind"], "websocket")
+        self.assertEqual(profiles[0]["endpoint"], "ProfiledTestConsumer.join")
@@ -0,0 +1,85 @@
+from django.db import connection
+from django.test import override_settings
+from django_redis import get_redis_connection
+from prometheus_client import REGISTRY
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from chats.apps.accounts.models import User
+from chats.core.slow_queries import (
+    SlowQueryLog,
+    log_slow_queries,
+    normalize_sql,
+    query_context,
+)
+
+
+@override_settings(USE_SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD=0)
+class SlowQueryLogTests(APITestCase):
+    fixtures = ["chats/fixtures/fixture_app.json"]
+
+    def setUp(self):
+        redis = get_redis_connection()
+        keys = redis.keys("slow_queries:*")
+        if keys:
+            redis.delete(*keys)
+        self.user = User.objects.get(email="brucebanner@chats.weni.ai")
+        token = Token.objects.get_or_create(user=self.user)[0]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+
+    def count_staff(self):
+        return User.objects.filter(is_staff=True, email__startswith="bruce").count()
+
+    def test_literals_are_removed_from_the_fingerprinted_sql(self):
+        self.assertEqual(
+            normalize_sql(
+                "SELECT * FROM t0 WHERE id IN (%s, %s,  %s) AND name = 'a''b' LIMIT 21"
+            ),
+            "SELECT * FROM t0 WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+
+    def test_slow_queries_are_aggregated_with_their_callsite_and_context(self):
+        with connection.execute_wrapper(log_slow_queries):
+            with query_context("SlowQueryTests.run"):
+                self.count_staff()
+                self.count_staff()
+
+        query = SlowQueryLog().top()[0]
+        self.assertEqual(query["count"], 2)
+        self.assertIn("accounts_user", query["sql"])
+        self.assertEqual(list(query["contexts"].items()), [("SlowQueryTests.run", 2)])
+        [(callsite, count)] = query["callsites"].items()
+        self.assertTrue(callsite.startswith("SlowQueryLogTests.count_staff ("))
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                "chats_db_slow_queries_total",
+                {
+                    "fingerprint": query["fingerprint"],
+                    "callsite": "SlowQueryLogTests.count_staff",
+                },
+            ),
+            2,
+        )
+
+    def test_request_queries_are_named_after_the_view(self):
+        url = "/v1/dashboard/34a93b52-231e-11ed-861d-0242ac120002/general/"
+        with connection.execute_wrapper(log_slow_queries):
+            self.client.get(url)
+
+        contexts = set()
+        for query in SlowQueryLog().top(limit=500):
+            contexts.update(query["contexts"])
+        self.assertIn("DashboardLiveViewset.general", contexts)
+
+    def test_slow_queries_are_listed_for_staff_users_only(self):
+        with connection.execute_wrapper(log_slow_queries):
+            self.count_staff()
+
+        response = self.client.get("/v1/slow-queries/")
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.get("/v1/slow-queries/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 1)
@@ -0,0 +1,149 @@
+from asgiref.testing import ApplicationCommunicator
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import InMemoryChannelLayer
+from django.test import SimpleTestCase, override_settings
+from prometheus_client import REGISTRY
+
+from chats.core.websockets.metrics import (
+    ConsumerMetricsMixin,
+    timed_database_sync_to_async,
+)
+from chats.utils.websockets import send_channels_groups
+
+
+def sample(name: str, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTestConsumer(ConsumerMetricsMixin, AsyncJsonWebsocketConsumer):
+    channel_layer_alias = "unconfigured"
+
+    async def connect(self):
+        if not await self.get_allowed():
+            await self.close()
+            return
+        await self.accept()
+        await self.send_json({"type": "hello"})
+
+    def metrics_project(self) -> str:
+        return "project-a"
+
+    @timed_database_sync_to_async
+    def get_allowed(self):
+        return self.scope["path"] == "/allowed"
+
+
+class ConsumerMetricsTests(SimpleTestCase):
+    consumer = "MetricsTestConsumer"
+
+    async def connect(self, path: str):
+        communicator = ApplicationCommunicator(
+            MetricsTestConsumer.as_asgi(),
+            {"type": "websocket", "path": path, "headers": [], "subprotocols": []},
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        handshake = await communicator.receive_output()
+        return communicator, handshake["type"] == "websocket.accept"
+
+    async def test_accepted_connections_are_counted_until_disconnected(self):
+        accepted = sample(
+            "chats_ws_connects_total", consumer=self.consumer, result="accepted"
+        )
+        disconnects = sample("chats_ws_disconnects_total", consumer=self.consumer)
+        sends = sample("chats_ws_send_seconds_count", consumer=self.consumer)
+        helpers = sample(
+            "chats_ws_db_seconds_count", consumer=self.consumer, helper="get_allowed"
+        )
+        active_labels = {"consumer": self.consumer, "project": "project-a"}
+        active = sample("chats_ws_active_connections", **active_labels)
+
+        communicator, connected = await self.connect("/allowed")
+        self.assertTrue(connected)
+        self.assertEqual(
+            await communicator.receive_output(),
+            {"type": "websocket.send", "text": '{"type": "hello"}'},
+        )
+
+        self.assertEqual(
+            sample(
+                "chats_ws_connects_total", consumer=self.consumer, result="accepted"
+            ),
+            accepted + 1,
+        )
+        self.assertEqual(
+            sample("chats_ws_active_connections", **active_labels), active + 1
+        )
+        self.assertEqual(
+            sample("chats_ws_send_seconds_count", consumer=self.consumer), sends + 1
+        )
+        self.assertEqual(
+            sample(
+                "chats_ws_db_seconds_count",
+                consumer=self.consumer,
+                helper="get_allowed",
+            ),
+            helpers + 1,
+        )
+
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait()
+
+        self.assertEqual(sample("chats_ws_active_connections", **active_labels), active)
+        self.assertEqual(
+            sample("chats_ws_disconnects_total", consumer=self.consumer),
+            disconnects + 1,
+        )
+
+    async def test_rejected_connections_are_not_active(self):
+        rejected = sample(
+            "chats_ws_connects_total", consumer=self.consumer, result="rejected"
+        )
+        active_labels = {"consumer": self.consumer, "project": "project-a"}
+        active = sample("chats_ws_active_connections", **active_labels)
+
+        _, connected = await self.connect("/denied")
+
+        self.assertFalse(connected)
+        self.assertEqual(
+            sample(
+                "chats_ws_connects_total", consumer=self.consumer, result="rejected"
+            ),
+            rejected + 1,
+        )
+        self.assertEqual(sample("chats_ws_active_connections", **active_labels), active)
+
+
+class FailingChannelLayer(InMemoryChannelLayer):
+    async def group_send(self, group, message):
+        raise ConnectionError("channel layer is down")
+
+
+@override_settings(WEBSOCKET_RETRY_SLEEP=0)
+class SendChannelsGroupsMetricsTests(SimpleTestCase):
+    messages = [("room_1", {"type": "notify"}), ("room_2", {"type": "notify"})]
+
+    def test_sent_messages_are_timed(self):
+        sends = sample("chats_channels_group_send_seconds_count")
+        failures = sample("chats_channels_group_send_failures_total")
+
+        send_channels_groups(self.messages, channel_layer=InMemoryChannelLayer())
+
+        self.assertEqual(sample("chats_channels_group_send_seconds_count"), sends + 1)
+        self.assertEqual(sample("chats_channels_group_send_failures_total"), failures)
+
+    def test_failed_messages_are_retried_then_dropped(self):
+        sends = sample("chats_channels_group_send_seconds_count")
+        failures = sample("chats_channels_group_send_failures_total")
+        retries = sample("chats_channels_group_send_retries_total")
+        dropped = sample("chats_channels_group_send_dropped_total")
+
+        send_channels_groups(
+            self.messages, retry=2, channel_layer=FailingChannelLayer()
+        )
+
+        self.assertEqual(sample("chats_channels_group_send_seconds_count"), sends + 3)
+        self.assertEqual(
+            sample("chats_channels_group_send_failures_total"), failures + 6
+        )
+        self.assertEqual(sample("chats_channels_group_send_retries_total"), retries + 4)
+        self.assertEqual(sample("chats_channels_group_send_dropped_total"), dropped + 2)
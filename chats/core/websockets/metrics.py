@@ -0,0 +1,93 @@
+import functools
+import time
+
+from channels.db import database_sync_to_async
+
+from chats.apps.api.v1.prometheus.metrics import (
+    chats_ws_active_connections,
+    chats_ws_connects,
+    chats_ws_db_seconds,
+    chats_ws_disconnects,
+    chats_ws_send_seconds,
+)
+from chats.core.slow_queries import query_context
+
+
+def timed_database_sync_to_async(func):
+    """
+    database_sync_to_async for the consumer methods, observing the time spent
+    on the helper, thread pool wait included, on chats_ws_db_seconds and naming
+    its queries as Consumer.helper on the slow query log
+    """
+    sync_to_async_func = database_sync_to_async(func)
+
+    @functools.wraps(func)
+    async def wrapper(consumer, *args, **kwargs):
+        consumer_name = type(consumer).__name__
+        started = time.perf_counter()
+        try:
+            with query_context(f"{consumer_name}.{func.__name__}"):
+                return await sync_to_async_func(consumer, *args, **kwargs)
+        finally:
+            chats_ws_db_seconds.labels(
+                consumer=consumer_name, helper=func.__name__
+            ).observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+class ConsumerMetricsMixin:
+    """
+    Counts the handshakes, disconnects and open connections of a consumer
+    and times its sends. Must come before the channels consumer class.
+    """
+
+    metrics_accepted = False
+    metrics_rejected = False
+
+    @property
+    def metrics_consumer(self) -> str:
+        return type(self).__name__
+
+    def metrics_project(self) -> str:
+        """Project label of the open connections, read once the connection is accepted"""
+        permission = getattr(self, "permission", None)
+        return str(permission.project_id) if permission else ""
+
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        if not self.metrics_accepted:
+            self.metrics_accepted = True
+            self.metrics_project_label = self.metrics_project()
+            chats_ws_connects.labels(
+                consumer=self.metrics_consumer, result="accepted"
+            ).inc()
+            chats_ws_active_connections.labels(
+                consumer=self.metrics_consumer, project=self.metrics_project_label
+            ).inc()
+
+    async def close(self, *args, **kwargs):
+        if not self.metrics_accepted and not self.metrics_rejected:
+            self.metrics_rejected = True
+            chats_ws_connects.labels(
+                consumer=self.metrics_consumer, result="rejected"
+            ).inc()
+        await super().close(*args, **kwargs)
+
+    async def websocket_disconnect(self, message):
+        if self.metrics_accepted:
+            self.metrics_accepted = False
+            chats_ws_disconnects.labels(consumer=self.metrics_consumer).inc()
+            chats_ws_active_connections.labels(
+                consumer=self.metrics_consumer, project=self.metrics_project_label
+            ).dec()
+        await super().websocket_disconnect(message)
+
+    async def send_json(self, content, close=False):
+        started = time.perf_counter()
+        try:
+            await super().send_json(content, close=close)
+        finally:
+            chats_ws_send_seconds.labels(consumer=self.metrics_consumer).observe(
+                time.perf_counter() - started
+            )
@@ -0,0 +1,53 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from chats.core.profiling import (
+    PROFILE_HEADER,
+    SamplingProfiler,
+    save_profile,
+    should_profile,
+)
+
+
+class ConsumerProfilerMixin:
+    """
+    Profile the sampled receive_json calls of a consumer, PROFILER_SAMPLE_RATE
+    of them and all of a connection opened with a signed X-Chats-Profile header.
+    The event loop thread is sampled, so the time awaiting shows up as loop frames.
+    """
+
+    profiler_token = None
+
+    async def websocket_connect(self, message):
+        if settings.USE_PROFILER:
+            header = PROFILE_HEADER.lower().encode()
+            for name, value in self.scope.get("headers", []):
+                if name == header:
+                    self.profiler_token = value.decode()
+        await super().websocket_connect(message)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if not settings.USE_PROFILER or not should_profile(self.profiler_token):
+            return await super().receive(text_data, bytes_data, **kwargs)
+
+        with SamplingProfiler() as profiler:
+            await super().receive(text_data, bytes_data, **kwargs)
+        await sync_to_async(save_profile)(
+            profiler,
+            kind="websocket",
+            endpoint=self.profiler_endpoint(text_data),
+            path=self.scope.get("path", ""),
+        )
+
+    def profiler_endpoint(self, text_data) -> str:
+        """Consumer.type of the received payload, the action for the method calls"""
+        try:
+            content = json.loads(text_data)
+        except (TypeError, ValueError):
+            content = None
+        command = content.get("type") if isinstance(content, dict) else None
+        if command == "method":
+            command = content.get("action")
+        return f"{type(self).__name__}.{command or 'unknown'}"
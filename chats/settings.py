@@ -79,6 +79,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "chats.core.middleware.RequestMetricsMiddleware",
+    "chats.core.middleware.ProfilerMiddleware",
+    "chats.core.middleware.QueryContextMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -87,6 +90,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "chats.core.middleware.WebsocketNotificationMiddleware",
 ]
 
 ROOT_URLCONF = "chats.urls"
@@ -346,6 +350,9 @@ PROMETHEUS_AUTH_TOKEN = env.str("PROMETHEUS_AUTH_TOKEN")
 ACTIVATE_CALC_METRICS = env.bool("ACTIVATE_CALC_METRICS", default=True)
 
 USE_PROMETHEUS_METRICS = env.bool("USE_PROMETHEUS_METRICS", default=False)
+PROMETHEUS_TOTALS_REFRESH_INTERVAL = env.int(
+    "PROMETHEUS_TOTALS_REFRESH_INTERVAL", default=5 * 60
+)
 
 FILE_CHECK_CONTENT_TYPE = env.str(
     "FILE_CHECK_CONTENT_TYPE", default="application/octet-stream"
@@ -374,6 +381,28 @@ CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-rooms-unread-msgs": {
+        "task": "reconcile_rooms_unread_msgs",
+        "schedule": env.int("UNREAD_MSGS_RECONCILE_INTERVAL", default=10 * 60),
+    },
+    "sync-agents-presence": {
+        "task": "sync_agents_presence",
+        "schedule": env.int("AGENT_PRESENCE_SYNC_INTERVAL", default=10),
+    },
+    "distribute-queued-rooms": {
+        "task": "distribute_queued_rooms",
+        "schedule": env.int("ROOMS_DISTRIBUTION_INTERVAL", default=60),
+    },
+    "refresh-dashboard-rollup": {
+        "task": "refresh_dashboard_rollup",
+        "schedule": env.int("DASHBOARD_ROLLUP_REFRESH_INTERVAL", default=60),
+    },
+    "refresh-prometheus-totals": {
+        "task": "refresh_prometheus_totals",
+        "schedule": PROMETHEUS_TOTALS_REFRESH_INTERVAL,
+    },
+}
 
 # Event Driven Architecture configurations
 
@@ -407,3 +436,60 @@ if USE_EDA:
 
 WS_MESSAGE_RETRIES = env.int("WS_MESSAGE_RETRIES", default=5)
 WEBSOCKET_RETRY_SLEEP = env.int("WEBSOCKET_RETRY_SLEEP", default=0.5)
+
+# Agent presence
+
+AGENT_PRESENCE_TTL = env.int("AGENT_PRESENCE_TTL", default=90)
+AGENT_PRESENCE_BATCH_SIZE = env.int("AGENT_PRESENCE_BATCH_SIZE", default=500)
+AGENT_PRESENCE_RESTORE_TTL = env.int("AGENT_PRESENCE_RESTORE_TTL", default=60 * 60)
+USE_AGENT_PRESENCE_READS = env.bool("USE_AGENT_PRESENCE_READS", default=False)
+
+# Room routing
+
+USE_AGENT_LOAD_INDEX = env.bool("USE_AGENT_LOAD_INDEX", default=False)
+USE_ROOMS_DISTRIBUTION = env.bool("USE_ROOMS_DISTRIBUTION", default=False)
+ROOMS_DISTRIBUTION_BATCH_SIZE = env.int("ROOMS_DISTRIBUTION_BATCH_SIZE", default=100)
+ROOMS_DISTRIBUTION_CUSTOM_QUEUE = env(
+    "ROOMS_DISTRIBUTION_CUSTOM_QUEUE", default="celery"
+)
+# one rooms.bulk_update per agent on each distribution pass, the clients must handle it
+USE_ROOMS_BULK_NOTIFICATIONS = env.bool("USE_ROOMS_BULK_NOTIFICATIONS", default=False)
+
+# Callbacks
+
+CALLBACKS_CUSTOM_QUEUE = env("CALLBACKS_CUSTOM_QUEUE", default="celery")
+CALLBACK_TIMEOUT = env.int("CALLBACK_TIMEOUT", default=10)
+CALLBACK_POOL_MAXSIZE = env.int("CALLBACK_POOL_MAXSIZE", default=10)
+CALLBACK_MAX_RETRIES = env.int("CALLBACK_MAX_RETRIES", default=5)
+CALLBACK_RETRY_BACKOFF = env.int("CALLBACK_RETRY_BACKOFF", default=2)
+
+# Dashboard
+
+USE_DASHBOARD_ROLLUP = env.bool("USE_DASHBOARD_ROLLUP", default=False)
+DASHBOARD_ROLLUP_LOCK_TIMEOUT = env.int("DASHBOARD_ROLLUP_LOCK_TIMEOUT", default=30)
+DASHBOARD_ROLLUP_BATCH_SIZE = env.int("DASHBOARD_ROLLUP_BATCH_SIZE", default=1000)
+USE_DASHBOARD_CACHE = env.bool("USE_DASHBOARD_CACHE", default=True)
+DASHBOARD_CACHE_LOCK_TIMEOUT = env.int("DASHBOARD_CACHE_LOCK_TIMEOUT", default=30)
+DASHBOARD_EXPORT_CHUNK_SIZE = env.int("DASHBOARD_EXPORT_CHUNK_SIZE", default=2000)
+DASHBOARD_EXPORT_MAX_CSV_ROWS = env.int("DASHBOARD_EXPORT_MAX_CSV_ROWS", default=10000)
+DASHBOARD_EXPORT_DEDUP_WINDOW = env.int("DASHBOARD_EXPORT_DEDUP_WINDOW", default=5 * 60)
+DASHBOARD_EXPORT_URL_EXPIRE = env.int("DASHBOARD_EXPORT_URL_EXPIRE", default=60 * 60)
+DASHBOARD_EXPORT_LOCK_TIMEOUT = env.int(
+    "DASHBOARD_EXPORT_LOCK_TIMEOUT", default=10 * 60
+)
+EXPORTS_CUSTOM_QUEUE = env("EXPORTS_CUSTOM_QUEUE", default="celery")
+USE_DASHBOARD_LIVE = env.bool("USE_DASHBOARD_LIVE", default=False)
+
+# Profiling
+
+USE_PROFILER = env.bool("USE_PROFILER", default=False)
+PROFILER_SAMPLE_RATE = env.float("PROFILER_SAMPLE_RATE", default=0.0)
+PROFILER_INTERVAL = env.float("PROFILER_INTERVAL", default=0.005)
+PROFILER_STORAGE_PATH = env.str("PROFILER_STORAGE_PATH", default="profiles")
+PROFILER_TOKEN_MAX_AGE = env.int("PROFILER_TOKEN_MAX_AGE", default=24 * 60 * 60)
+
+# Slow queries
+
+USE_SLOW_QUERY_LOG = env.bool("USE_SLOW_QUERY_LOG", default=False)
+SLOW_QUERY_THRESHOLD = env.float("SLOW_QUERY_THRESHOLD", default=0.5)
+SLOW_QUERY_LOG_TTL = env.int("SLOW_QUERY_LOG_TTL", default=24 * 60 * 60)
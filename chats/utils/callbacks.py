@@ -0,0 +1,51 @@
+import json
+import threading
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from requests.adapters import HTTPAdapter
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def serialize_callback(event_type: str, content: dict) -> str:
+    """
+    helper function that builds the body sent to the callback urls
+    """
+    return json.dumps(
+        {"type": event_type, "content": content},
+        sort_keys=True,
+        indent=1,
+        cls=DjangoJSONEncoder,
+    )
+
+
+def get_callback_session(url: str) -> requests.Session:
+    """
+    Returns a session shared by every callback sent to the url host,
+    so the connections are kept alive and reused between deliveries
+    """
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({"content-type": "application/json"})
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=settings.CALLBACK_POOL_MAXSIZE
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+    return session
+
+
+def post_callback(url: str, data: str) -> requests.Response:
+    response = get_callback_session(url).post(
+        url, data=data, timeout=settings.CALLBACK_TIMEOUT
+    )
+    response.raise_for_status()
+    return response
@@ -0,0 +1,147 @@
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer
+from channels_redis.pubsub import RedisPubSubChannelLayer, RedisPubSubLoopLayer
+from django.test import SimpleTestCase, override_settings
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+from chats.utils.websockets import (
+    _send_channels_groups,
+    channels_group_message,
+    send_channels_groups,
+)
+
+
+class ChannelsGroupsFanOutTests(SimpleTestCase):
+    def setUp(self):
+        self.channel_layer = InMemoryChannelLayer()
+
+    def receive(self, channel_name):
+        return async_to_sync(self.channel_layer.receive)(channel_name)
+
+    def test_messages_are_sent_to_every_group(self):
+        channels = []
+        for index in range(3):
+            channel_name = async_to_sync(self.channel_layer.new_channel)()
+            async_to_sync(self.channel_layer.group_add)(f"group_{index}", channel_name)
+            channels.append(channel_name)
+
+        send_channels_groups(
+            [
+                (f"group_{index}", channels_group_message("notify", index, "test"))
+                for index in range(3)
+            ],
+            channel_layer=self.channel_layer,
+        )
+
+        for index, channel_name in enumerate(channels):
+            self.assertEqual(self.receive(channel_name)["content"], str(index))
+
+    @override_settings(WEBSOCKET_RETRY_SLEEP=0)
+    def test_failed_messages_are_retried(self):
+        group_send = self.channel_layer.group_send
+        attempts = []
+
+        async def flaky_group_send(group_name, message):
+            attempts.append(group_name)
+            if len(attempts) == 1:
+                raise ConnectionError()
+            await group_send(group_name, message)
+
+        channel_name = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)("group", channel_name)
+        self.channel_layer.group_send = flaky_group_send
+
+        send_channels_groups(
+            [("group", channels_group_message("notify", {}, "test"))],
+            retry=1,
+            channel_layer=self.channel_layer,
+        )
+
+        self.assertEqual(attempts, ["group", "group"])
+        self.assertEqual(self.receive(channel_name)["action"], "test")
+
+
+@override_settings(WEBSOCKET_RETRY_SLEEP=0)
+class PubSubPipelinesTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeServer()
+        self.channel_layer = RedisPubSubChannelLayer(
+            hosts=["redis://shard-a:6379/0", "redis://shard-b:6379/0"]
+        )
+        # the rooms and the queues groups are on different shards
+        self.messages = [
+            (group_name, channels_group_message("notify", group_name, "test"))
+            for group_name in ("room_1", "room_2", "queue_1", "queue_2")
+        ]
+
+    def send(self, retry=0, setup_layer=None):
+        """Send the messages on a fake redis and return the ones published"""
+
+        async def send_and_receive():
+            layer = self.channel_layer._get_layer()
+            for shard in layer._shards:
+                shard._redis = FakeRedis(server=self.server)
+            if setup_layer:
+                setup_layer(layer)
+            subscriber = FakeRedis(server=self.server).pubsub()
+            await subscriber.subscribe(
+                *[layer._get_group_channel_name(group) for group, _ in self.messages]
+            )
+
+            await _send_channels_groups(self.channel_layer, self.messages, retry)
+
+            published = []
+            # the subscribe confirmations are skipped and read as None
+            for _ in range(len(self.messages) * 2):
+                message = await subscriber.get_message(
+                    ignore_subscribe_messages=True, timeout=0.1
+                )
+                if message is not None:
+                    published.append(self.channel_layer.deserialize(message["data"]))
+            await subscriber.close()
+            return published
+
+        return async_to_sync(send_and_receive)()
+
+    def test_messages_are_published_in_a_pipeline_per_shard(self):
+        with patch.object(
+            FakeRedis, "pipeline", autospec=True, side_effect=FakeRedis.pipeline
+        ) as pipeline:
+            published = self.send()
+
+        self.assertEqual(pipeline.call_count, 2)
+        self.assertCountEqual(published, [message for _, message in self.messages])
+
+    def test_only_the_messages_of_the_failed_shard_are_retried(self):
+        def break_first_shard(layer):
+            shard = layer._shards[0]
+            pipeline = shard._redis.pipeline
+            calls = []
+
+            def flaky_pipeline(*args, **kwargs):
+                calls.append(1)
+                if len(calls) == 1:
+                    raise ConnectionError()
+                return pipeline(*args, **kwargs)
+
+            shard._redis.pipeline = flaky_pipeline
+
+        published = self.send(retry=1, setup_layer=break_first_shard)
+
+        self.assertEqual(len(published), len(self.messages))
+        self.assertCountEqual(published, [message for _, message in self.messages])
+
+    def test_missing_layer_internals_fall_back_to_group_send(self):
+        renamed_internals = ("_lock", "_ensure_redis", "_connection")
+        with patch(
+            "chats.utils.websockets.PUBSUB_SHARD_INTERNALS", renamed_internals
+        ), patch.object(
+            RedisPubSubLoopLayer, "group_send", new_callable=AsyncMock
+        ) as group_send:
+            published = self.send()
+
+        self.assertEqual(published, [])
+        self.assertEqual(group_send.await_count, len(self.messages))
@@ -1,12 +1,34 @@
+import asyncio
 import json
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from channels_redis.pubsub import RedisPubSubChannelLayer
 from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
 from sentry_sdk import capture_exception
 
+from chats.apps.api.v1.prometheus.metrics import (
+    chats_channels_group_send_dropped,
+    chats_channels_group_send_failures,
+    chats_channels_group_send_retries,
+    chats_channels_group_send_seconds,
+)
+
+_notification_collector = ContextVar("notification_collector", default=None)
+
+
+def channels_group_message(call_type: str, content, action: str) -> dict:
+    return {
+        "type": call_type,
+        "action": action,
+        "content": json.dumps(content, cls=DjangoJSONEncoder),
+    }
+
 
 def send_channels_group(
     group_name: str,
@@ -18,20 +40,210 @@ def send_channels_group(
     """
     helper function that sends data to channels groups
     """
+    send_channels_groups(
+        [(group_name, channels_group_message(call_type, content, action))],
+        retry=retry,
+    )
+
+
+def send_channels_groups(
+    messages: list, retry=settings.WS_MESSAGE_RETRIES, channel_layer=None
+):
+    """
+    Send many (group_name, message) pairs in a single trip to the channel layer.
+    On redis pub/sub layers the messages of each shard are published in one pipeline,
+    the messages that failed are retried without blocking the event loop.
+    """
+    if not messages:
+        return
+    channel_layer = channel_layer or get_channel_layer()
+    async_to_sync(_send_channels_groups)(channel_layer, list(messages), retry)
+
+
+async def _send_channels_groups(channel_layer, messages: list, retry: int):
+    while True:
+        started = time.perf_counter()
+        messages, error = await _publish_channels_groups(channel_layer, messages)
+        chats_channels_group_send_seconds.observe(time.perf_counter() - started)
+        if not messages:
+            return
+        chats_channels_group_send_failures.inc(len(messages))
+        if retry <= 0:
+            chats_channels_group_send_dropped.inc(len(messages))
+            capture_exception(error)
+            return
+        chats_channels_group_send_retries.inc(len(messages))
+        retry -= 1
+        await asyncio.sleep(settings.WEBSOCKET_RETRY_SLEEP)
+
+
+async def _publish_channels_groups(channel_layer, messages: list):
+    """Returns the messages that could not be sent and the last error raised"""
+    if isinstance(channel_layer, RedisPubSubChannelLayer):
+        shards = _pubsub_shards(channel_layer, messages)
+        if shards is not None:
+            return await _publish_pubsub_pipelines(channel_layer, shards)
+
+    results = await asyncio.gather(
+        *[
+            channel_layer.group_send(group_name, message)
+            for group_name, message in messages
+        ],
+        return_exceptions=True,
+    )
+    failed, error = [], None
+    for group_message, result in zip(messages, results):
+        if isinstance(result, Exception):
+            failed.append(group_message)
+            error = result
+    return failed, error
+
+
+# channels_redis has no public api to publish many messages at once, so the pipelines
+# are built on the internals of its pub/sub layer (checked against channels-redis 4.1)
+PUBSUB_LAYER_INTERNALS = ("_get_group_channel_name", "_get_shard")
+PUBSUB_SHARD_INTERNALS = ("_lock", "_ensure_redis", "_redis")
+
+
+def _pubsub_shards(channel_layer, messages: list):
+    """
+    Group the messages by the shard of the pub/sub layer they are published on.
+    Returns None when the layer internals are not the expected ones,
+    so the messages are sent through group_send instead.
+    """
     try:
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                "type": call_type,
-                "action": action,
-                "content": json.dumps(content, cls=DjangoJSONEncoder),
-            },
-        )
-    except Exception as err:
-        if retry > 0:
-            time.sleep(settings.WEBSOCKET_RETRY_SLEEP)
-            return send_channels_group(
-                group_name, call_type, content, action, retry - 1
+        layer = channel_layer._get_layer()
+    except AttributeError:
+        return None
+    if not all(hasattr(layer, name) for name in PUBSUB_LAYER_INTERNALS):
+        return None
+
+    shards = {}
+    for group_name, message in messages:
+        group_channel = layer._get_group_channel_name(group_name)
+        shard = layer._get_shard(group_channel)
+        if not all(hasattr(shard, name) for name in PUBSUB_SHARD_INTERNALS):
+            return None
+        shards.setdefault(shard, []).append((group_name, message, group_channel))
+    return shards
+
+
+async def _publish_pubsub_pipelines(channel_layer, shards: dict):
+    async def publish(shard, shard_messages):
+        async with shard._lock:
+            shard._ensure_redis()
+            async with shard._redis.pipeline(transaction=False) as pipe:
+                for _, message, group_channel in shard_messages:
+                    pipe.publish(group_channel, channel_layer.serialize(message))
+                await pipe.execute()
+
+    results = await asyncio.gather(
+        *[publish(shard, shard_messages) for shard, shard_messages in shards.items()],
+        return_exceptions=True,
+    )
+    failed, error = [], None
+    for shard_messages, result in zip(shards.values(), results):
+        if isinstance(result, Exception):
+            failed.extend(
+                (group_name, message) for group_name, message, _ in shard_messages
             )
-        capture_exception(err)
+            error = result
+    return failed, error
+
+
+class NotificationCollector:
+    """
+    Buffers the channels group notifications of a request or transaction.
+    Repeated (group, action, object) events are sent once and each
+    object is serialized once, when the buffer is flushed.
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.instances = {}
+
+    def add(
+        self,
+        group_name: str,
+        call_type: str,
+        action: str,
+        content: dict = None,
+        instance=None,
+        extra: dict = None,
+    ):
+        if instance is not None:
+            object_key = (instance._meta.label, str(instance.pk))
+            self.instances[object_key] = instance
+        else:
+            object_key = json.dumps(content, sort_keys=True, cls=DjangoJSONEncoder)
+        extra_key = json.dumps(extra, sort_keys=True, cls=DjangoJSONEncoder)
+
+        key = (group_name, call_type, action, object_key, extra_key)
+        if key not in self.events:
+            self.events[key] = (content, extra)
+
+    def flush(self):
+        serialized_instances = {}
+        messages = []
+        events, self.events = self.events, {}
+        for (group_name, call_type, action, object_key, _), (
+            content,
+            extra,
+        ) in events.items():
+            if content is None:
+                if object_key not in serialized_instances:
+                    instance = self.instances[object_key]
+                    serialized_instances[object_key] = instance.serialized_ws_data
+                content = dict(serialized_instances[object_key])
+            if extra:
+                content = {**content, **extra}
+            messages.append(
+                (group_name, channels_group_message(call_type, content, action))
+            )
+        self.instances = {}
+        send_channels_groups(messages)
+
+
+@contextmanager
+def coalesce_notifications():
+    """
+    Collect the notifications sent inside the block and send them on commit.
+    Nested blocks join the outermost one.
+    """
+    if _notification_collector.get() is not None:
+        yield _notification_collector.get()
+        return
+
+    collector = NotificationCollector()
+    token = _notification_collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _notification_collector.reset(token)
+    transaction.on_commit(collector.flush)
+
+
+def notify_channels_group(
+    group_name: str,
+    call_type: str,
+    action: str,
+    content: dict = None,
+    instance=None,
+    extra: dict = None,
+):
+    """
+    Send a notification to a channels group, or buffer it when notifications are being coalesced.
+    Pass the instance instead of the content to have its serialized_ws_data sent.
+    """
+    collector = _notification_collector.get()
+    if collector is not None:
+        collector.add(group_name, call_type, action, content, instance, extra)
+        return
+
+    if content is None:
+        content = instance.serialized_ws_data
+    if extra:
+        content = {**content, **extra}
+    send_channels_group(
+        group_name=group_name, call_type=call_type, content=content, action=action
+    )